@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils.html import escape
 from models import *
 
 
@@ -106,3 +107,25 @@ class VisitorAdmin(admin.ModelAdmin):
     inlines = [VisitorScoreInLine]
 admin.site.register(Visitor,VisitorAdmin)
 admin.site.register(VisitorScore,VisitorScoreAdmin)
+
+
+def compact_visitor_results(self):
+    visitor, answers, scores = self.expand()
+    lines = [u'<h4>%s</h4>' % escape(answer.question_text) + u'<p>%s (%s)</p>' % (escape(answer.answer_text), answer.answer_importance)
+             for answer in answers]
+    for visitor_score, category_scores in scores:
+        lines.append(u'<h4>%s: %s</h4>' % (escape(visitor_score.candidate_name), visitor_score.score))
+        lines.extend(u'<p>%s: %s</p>' % (escape(category_score.category_name), category_score.category_score)
+                     for category_score in category_scores)
+    return u''.join(lines)
+
+compact_visitor_results.short_description = 'Results'
+compact_visitor_results.allow_tags = True
+
+
+class CompactVisitorAdmin(admin.ModelAdmin):
+    list_display = ('datestamp', 'election', 'election_url')
+    list_filter = ('election__name',)
+    exclude = ('snapshot', 'answers', 'importances', 'scores')
+    readonly_fields = ('election', 'election_url', 'datestamp', compact_visitor_results)
+admin.site.register(CompactVisitor, CompactVisitorAdmin)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import F
+
+from elections.cache import LRUCache
+from elections.models import Election, Candidate, touch_election
+
+
+def iter_bits(bitset):
+    '''
+    Yields the position of every bit set in bitset, lowest first.
+    '''
+    while bitset:
+        lowest = bitset & -bitset
+        yield lowest.bit_length() - 1
+        bitset ^= lowest
+
+
+class AnswerIndex(object):
+    '''
+    Inverted answer -> candidates index of an election.
+
+    Candidates are numbered by pk and every answer maps to an integer used
+    as a bitset, with bit n set if the candidate in position n chose it.
+    '''
+
+    def __init__(self, election_id, version):
+        self.election_id = election_id
+        self.version = version
+        candidate_ids = Candidate.objects.filter(election=election_id).order_by('pk').values_list('pk', flat=True)
+        self.positions = dict((candidate_id, position) for position, candidate_id in enumerate(candidate_ids))
+        self.bitsets = {}
+        links = Candidate.answers.through.objects.filter(candidate__election=election_id)
+        for candidate_id, answer_id in links.values_list('candidate_id', 'answer_id'):
+            self.bitsets[answer_id] = self.bitsets.get(answer_id, 0) | (1 << self.positions[candidate_id])
+
+    def copy(self):
+        index = AnswerIndex.__new__(AnswerIndex)
+        index.election_id = self.election_id
+        index.version = self.version
+        index.positions = self.positions
+        index.bitsets = dict(self.bitsets)
+        return index
+
+    def get(self, answer_id):
+        return self.bitsets.get(answer_id, 0)
+
+    def add(self, candidate_id, answer_ids):
+        bit = 1 << self.positions[candidate_id]
+        for answer_id in answer_ids:
+            self.bitsets[answer_id] = self.bitsets.get(answer_id, 0) | bit
+
+    def remove(self, candidate_id, answer_ids):
+        bit = 1 << self.positions[candidate_id]
+        for answer_id in answer_ids:
+            bitset = self.bitsets.get(answer_id, 0) & ~bit
+            if bitset:
+                self.bitsets[answer_id] = bitset
+            else:
+                self.bitsets.pop(answer_id, None)
+
+    def clear(self, candidate_id):
+        self.remove(candidate_id, list(self.bitsets))
+
+
+_indexes = LRUCache(settings.ANSWER_INDEX_CACHE_SIZE)
+
+
+def get_answer_index(election):
+    '''
+    Returns the AnswerIndex of the election, built at most once per worker
+    and election version.
+    '''
+    index = _indexes.get(election.pk)
+    if index is None or index.version != election.version:
+        index = AnswerIndex(election.pk, election.version)
+        _indexes.set(election.pk, index)
+    return index
+
+
+def patch_answer_index(election_id, patch=None):
+    '''
+    Bumps the version of the election after a change that patch(index) can
+    replay on its AnswerIndex, e.g. a candidate choosing an answer.
+
+    If the index cached by this worker is still current it is patched and
+    moves to the new version with the election, in a single compare and set
+    on the version, so it is not rebuilt on the next visitor. Otherwise the
+    election is just touched and the index rebuilt when needed.
+    '''
+    index = _indexes.get(election_id)
+    if index is not None:
+        if Election.objects.filter(pk=election_id, version=index.version).update(
+                version=F('version') + 1, updated_at=datetime.now()):
+            # Copy on write, other threads may be scoring with the current index
+            index = index.copy()
+            try:
+                if patch is not None:
+                    patch(index)
+            except KeyError:
+                # A candidate the index does not know about
+                _indexes.pop(election_id)
+                return
+            index.version += 1
+            _indexes.set(election_id, index)
+            return
+        _indexes.pop(election_id)
+    touch_election(pk=election_id)
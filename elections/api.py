@@ -1,9 +1,10 @@
 # myapp/api.py
-from tastypie.authentication import ApiKeyAuthentication
+from elections.authentication import CachedApiKeyAuthentication
 from tastypie.constants import ALL, ALL_WITH_RELATIONS
 from tastypie.resources import ModelResource
 from elections.models import Election, Candidate, Category, Question, Answer, \
-							PersonalData, PersonalDataCandidate, Link, Background, BackgroundCandidate
+							PersonalData, PersonalDataCandidate, Link, Background, BackgroundCandidate, \
+							prefetch_answers
 from tastypie import fields
 from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
@@ -20,33 +21,94 @@ class BackgroundResource(ModelResource):
 	class Meta:
 		queryset = Background.objects.all()
 
-class CandidateResource(ModelResource):
-	personal_data = fields.ManyToManyField(PersonalDataResource, 'personal_data', null=True, full=True)
-	links = fields.ToManyField(LinkResource, 'link_set', full=True)
-	background = fields.ManyToManyField(BackgroundResource, 'background', full=True)
+def prefetch_candidates(candidates):
+	'''
+	Loads everything CandidateResource shows of the candidates, their
+	answers, personal data, backgrounds and links and the questionnaires of
+	their elections, with a fixed number of queries. Returns the candidates
+	as a list.
+	'''
+	candidates = prefetch_answers(candidates)
+	candidate_ids = [candidate.pk for candidate in candidates]
+	election_ids = set(candidate.election_id for candidate in candidates)
+
+	questions_by_category = {}
+	for question in Question.objects.filter(category__election__in=election_ids).order_by('pk'):
+		questions_by_category.setdefault(question.category_id, []).append(question)
+	categories_by_election = {}
+	for category in Category.objects.filter(election__in=election_ids):
+		categories_by_election.setdefault(category.election_id, []).append(
+			(category, questions_by_category.get(category.pk, [])))
+
+	for candidate in candidates:
+		candidate._api_data = {
+			'categories': categories_by_election.get(candidate.election_id, []),
+			'personal_data': [],
+			'background': [],
+			'links': [],
+		}
+	candidates_by_pk = dict((candidate.pk, candidate) for candidate in candidates)
+	for personal_data_candidate in PersonalDataCandidate.objects.filter(candidate__in=candidate_ids)\
+			.select_related('personal_data').order_by('personal_data'):
+		candidates_by_pk[personal_data_candidate.candidate_id]._api_data['personal_data'].append(
+			(personal_data_candidate.personal_data, personal_data_candidate.value))
+	for background_candidate in BackgroundCandidate.objects.filter(candidate__in=candidate_ids)\
+			.select_related('background').order_by('background'):
+		candidates_by_pk[background_candidate.candidate_id]._api_data['background'].append(
+			(background_candidate.background, background_candidate.value))
+	for link in Link.objects.filter(candidate__in=candidate_ids).order_by('pk'):
+		candidates_by_pk[link.candidate_id]._api_data['links'].append(link)
+	return candidates
 
+class CandidateResource(ModelResource):
 	class Meta:
 		queryset = Candidate.objects.all()
 		resource_name = 'candidate'
-		authentication = ApiKeyAuthentication()
+		authentication = CachedApiKeyAuthentication()
 
 	def authorized_read_list(self, object_list, bundle):
 		return object_list.filter(election__owner=bundle.request.user)
 
+	def get_list(self, request, **kwargs):
+		'''
+		Same as ModelResource.get_list, but the whole page of candidates is
+		loaded at once with prefetch_candidates before dehydrating it.
+		'''
+		base_bundle = self.build_bundle(request=request)
+		objects = self.obj_get_list(bundle=base_bundle, **self.remove_api_resource_names(kwargs))
+		sorted_objects = self.apply_sorting(objects, options=request.GET)
+
+		paginator = self._meta.paginator_class(request.GET, sorted_objects, resource_uri=self.get_resource_uri(), limit=self._meta.limit, max_limit=self._meta.max_limit, collection_name=self._meta.collection_name)
+		to_be_serialized = paginator.page()
+
+		candidates = prefetch_candidates(to_be_serialized[self._meta.collection_name])
+		to_be_serialized[self._meta.collection_name] = [self.full_dehydrate(self.build_bundle(obj=candidate, request=request), for_list=True)
+		                                                for candidate in candidates]
+		to_be_serialized = self.alter_list_data_to_serialize(request, to_be_serialized)
+		return self.create_response(request, to_be_serialized)
+
+	def dehydrate_related(self, resource, obj, request, value=None):
+		bundle = resource.full_dehydrate(resource.build_bundle(obj=obj, request=request))
+		if value is not None:
+			bundle.data['value'] = value
+		return bundle
+
 	def dehydrate(self, bundle):
 		candidate = bundle.obj
-		categories = bundle.obj.election.category_set.all()
+		if not hasattr(candidate, '_api_data'):
+			prefetch_candidates([candidate])
+		answers_by_question = candidate.get_answers_by_question()
 		bundle.data["categories"] = []
 		
-		for category in categories:
+		for category, questions in candidate._api_data['categories']:
 			questions_array = []
-			for question in category.question_set.all():
-				answers = Answer.objects.filter(question=question).filter(candidate=candidate)
+			for question in questions:
+				answer = answers_by_question.get(question.id)
 				the_answer = None
-				if len(answers)==1:
+				if answer is not None:
 					the_answer = {
-						"id":answers[0].id,
-						"caption":answers[0].caption
+						"id":answer.id,
+						"caption":answer.caption
 					}
 				questions_array.append({
 						"id": question.id,
@@ -62,15 +124,16 @@ class CandidateResource(ModelResource):
 
 			bundle.data["categories"].append(category_dict)
 
-
-		for pdata in bundle.data['personal_data']:
-			personal_data_candidate = PersonalDataCandidate.objects.get(candidate=bundle.obj, personal_data=pdata.obj)
-			pdata.data['value'] = personal_data_candidate.value
+		bundle.data['personal_data'] = []
+		for personal_data, value in candidate._api_data['personal_data']:
+			pdata = self.dehydrate_related(PersonalDataResource(), personal_data, bundle.request, value)
 			del pdata.data['resource_uri']
-		
-		for data in bundle.data['background']:
-			background_candidate = BackgroundCandidate.objects.get(candidate=bundle.obj, background=data.obj)
-			data.data['value'] = background_candidate.value
+			bundle.data['personal_data'].append(pdata)
+
+		bundle.data['background'] = [self.dehydrate_related(BackgroundResource(), background, bundle.request, value)
+		                             for background, value in candidate._api_data['background']]
+		bundle.data['links'] = [self.dehydrate_related(LinkResource(), link, bundle.request)
+		                        for link in candidate._api_data['links']]
 
 		return bundle
 
@@ -84,14 +147,14 @@ class QuestionResource(ModelResource):
 	class Meta:
 		queryset= Question.objects.all()
 		resource_name = 'question'
-		authentication = ApiKeyAuthentication()
+		authentication = CachedApiKeyAuthentication()
 
 class CategoryResource(ModelResource):
 	questions = fields.ToManyField(QuestionResource, 'question_set', null=True, full=True)
 	class Meta:
 		queryset = Category.objects.all()
 		resource_name = 'category'
-		authentication = ApiKeyAuthentication()
+		authentication = CachedApiKeyAuthentication()
 
 class ElectionResource(ModelResource):
 	candidates = fields.ToManyField(CandidateResource, 'candidate_set', null=True, full=False)
@@ -104,7 +167,7 @@ class ElectionResource(ModelResource):
 		filtering = {"slug": ALL_WITH_RELATIONS, "name": ALL_WITH_RELATIONS }
 		
 		excludes = ['custom_style']
-		authentication = ApiKeyAuthentication()
+		authentication = CachedApiKeyAuthentication()
 
 	def authorized_read_list(self, object_list, bundle):
 		return object_list.filter(owner=bundle.request.user)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+'''
+Sparse fieldsets and inline expansion of relations for the v2 API:
+
+    /api/v2/election/1/?fields=name,slug,candidates.name&expand=candidates.answers
+
+fields lists what to return, dotted names select the fields of expanded
+relations. expand lists relations to return as objects instead of URIs.
+Each expanded relation costs one or two queries for the whole page,
+whatever the number of objects in it.
+'''
+from django.db.models import ForeignKey, ManyToManyField
+from django.db.models.fields import FieldDoesNotExist
+from tastypie.exceptions import BadRequest
+from tastypie.fields import RelatedField
+
+
+def parse_paths(value):
+    '''
+    'a,b.c,b.d' -> {'a': {}, 'b': {'c': {}, 'd': {}}}
+    '''
+    tree = {}
+    for path in value.split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for name in path.split('.'):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def get_through_pairs(field, source_name, target_name, pks):
+    return field.rel.through.objects.filter(**{source_name + '__in': pks}).values_list(source_name, target_name)
+
+
+def fetch_related(model, attribute, objects, queryset):
+    '''
+    Loads the objects of queryset related to every object in objects
+    through attribute, a foreign key, many to many field or the accessor of
+    a reverse relation of model. Returns {object pk: related object} for
+    foreign keys and {object pk: [related objects]} otherwise.
+    '''
+    pks = [obj.pk for obj in objects]
+    try:
+        field = model._meta.get_field(attribute)
+    except FieldDoesNotExist:
+        field = None
+
+    if isinstance(field, ForeignKey):
+        ids = set(getattr(obj, field.attname) for obj in objects)
+        related = dict((related_object.pk, related_object) for related_object in queryset.filter(pk__in=ids))
+        return dict((obj.pk, related.get(getattr(obj, field.attname))) for obj in objects)
+
+    groups = dict((pk, []) for pk in pks)
+    if isinstance(field, ManyToManyField):
+        pairs = get_through_pairs(field, field.m2m_field_name(), field.m2m_reverse_field_name(), pks)
+    else:
+        for relation in model._meta.get_all_related_objects():
+            if relation.get_accessor_name() == attribute:
+                for related_object in queryset.filter(**{relation.field.name + '__in': pks}):
+                    groups[getattr(related_object, relation.field.attname)].append(related_object)
+                return groups
+        for relation in model._meta.get_all_related_many_to_many_objects():
+            if relation.get_accessor_name() == attribute:
+                pairs = get_through_pairs(relation.field, relation.field.m2m_reverse_field_name(),
+                                          relation.field.m2m_field_name(), pks)
+                break
+        else:
+            raise BadRequest(u"%s can not be expanded" % attribute)
+
+    targets_by_source = {}
+    for source_id, target_id in pairs:
+        targets_by_source.setdefault(target_id, []).append(source_id)
+    for related_object in queryset.filter(pk__in=list(targets_by_source)):
+        for source_id in targets_by_source[related_object.pk]:
+            groups[source_id].append(related_object)
+    return groups
+
+
+class FieldsetsMixin(object):
+    '''
+    Adds the fields and expand parameters to a ModelResource. Fields that
+    are not selected are not dehydrated at all, so unselected relations
+    cost no queries.
+    '''
+
+    def get_selection(self, bundle):
+        '''
+        (fields, expand) trees for bundle: set on the bundles of expanded
+        objects, read from the request for the others. fields is None when
+        every field is wanted.
+        '''
+        if hasattr(bundle, 'selection'):
+            return bundle.selection
+        fields = expand = None
+        if bundle.request is not None:
+            fields = bundle.request.GET.get('fields')
+            expand = bundle.request.GET.get('expand')
+        return (parse_paths(fields) if fields else None), parse_paths(expand or '')
+
+    def full_dehydrate(self, bundle, for_list=False):
+        fields, expand = self.get_selection(bundle)
+        if fields is None and not expand:
+            return super(FieldsetsMixin, self).full_dehydrate(bundle, for_list=for_list)
+        use_in = ['all', 'list' if for_list else 'detail']
+
+        for field_name, field_object in self.fields.items():
+            if field_name in expand:
+                # Filled in by expand_bundles, for every bundle at once
+                continue
+            if fields is not None and field_name not in fields:
+                continue
+            field_use_in = getattr(field_object, 'use_in', 'all')
+            if callable(field_use_in):
+                if not field_use_in(bundle):
+                    continue
+            elif field_use_in not in use_in:
+                continue
+
+            if getattr(field_object, 'dehydrated_type', None) == 'related':
+                field_object.api_name = self._meta.api_name
+                field_object.resource_name = self._meta.resource_name
+
+            bundle.data[field_name] = field_object.dehydrate(bundle, for_list=for_list)
+
+            method = getattr(self, "dehydrate_%s" % field_name, None)
+            if method:
+                bundle.data[field_name] = method(bundle)
+
+        bundle = self.dehydrate(bundle)
+        if fields is not None:
+            for key in bundle.data.keys():
+                if key not in fields and key not in expand:
+                    del bundle.data[key]
+        return bundle
+
+    def expand_bundles(self, bundles, fields, expand):
+        '''
+        Replaces the URIs of the relations in expand by the related objects,
+        loading them for all the bundles together.
+        '''
+        if not bundles:
+            return
+        for field_name, nested_expand in expand.items():
+            field_object = self.fields.get(field_name)
+            if not isinstance(field_object, RelatedField) or not isinstance(field_object.attribute, basestring):
+                raise BadRequest(u"%s can not be expanded" % field_name)
+            related_resource = field_object.get_related_resource(None)
+            related = fetch_related(self._meta.queryset.model, field_object.attribute, [bundle.obj for bundle in bundles],
+                                    related_resource._meta.queryset._clone())
+
+            nested_fields = (fields or {}).get(field_name) or None
+            related_bundles = {}
+            for value in related.values():
+                for related_object in (value if isinstance(value, list) else [value]):
+                    if related_object is not None and related_object.pk not in related_bundles:
+                        related_bundle = related_resource.build_bundle(obj=related_object, request=bundles[0].request)
+                        related_bundle.selection = (nested_fields, nested_expand)
+                        related_bundles[related_object.pk] = related_resource.full_dehydrate(related_bundle, for_list=True)
+            if nested_expand:
+                related_resource.expand_bundles(related_bundles.values(), nested_fields, nested_expand)
+
+            for bundle in bundles:
+                value = related[bundle.obj.pk]
+                if isinstance(value, list):
+                    bundle.data[field_name] = [related_bundles[related_object.pk] for related_object in value]
+                else:
+                    bundle.data[field_name] = related_bundles[value.pk] if value is not None else None
+
+    def alter_list_data_to_serialize(self, request, data):
+        bundles = data.get(self._meta.collection_name)
+        if bundles and request.GET.get('expand'):
+            fields, expand = self.get_selection(bundles[0])
+            self.expand_bundles(bundles, fields, expand)
+        return super(FieldsetsMixin, self).alter_list_data_to_serialize(request, data)
+
+    def alter_detail_data_to_serialize(self, request, data):
+        if request.GET.get('expand') and getattr(data, 'obj', None) is not None:
+            fields, expand = self.get_selection(data)
+            self.expand_bundles([data], fields, expand)
+        return super(FieldsetsMixin, self).alter_detail_data_to_serialize(request, data)
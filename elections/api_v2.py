@@ -1,13 +1,31 @@
 # -*- coding: utf-8 -*-
+from django.conf import settings
+from django.conf.urls.defaults import url
+from django.core.urlresolvers import reverse
+from django.http import HttpResponse
+from django.utils import simplejson as json
 from tastypie.resources import ModelResource, ALL, ALL_WITH_RELATIONS, Resource
 from elections.models import Election, Category, Question, Answer, Candidate, PersonalData,\
                             PersonalDataCandidate, Link, Background, BackgroundCandidate, BackgroundCategory,\
                             InformationSource
-from tastypie.authentication import ApiKeyAuthentication
+from elections.authentication import CachedApiKeyAuthentication
 from tastypie import fields
 from tastypie.serializers import Serializer
-
-class ElectionV2Resource(ModelResource):
+from tastypie.exceptions import BadRequest
+from tastypie.bundle import Bundle
+from tastypie.http import HttpUnauthorized, HttpNotFound, HttpForbidden
+from tastypie.utils import trailing_slash
+from elections.api_fieldsets import FieldsetsMixin
+from elections.compare_index import get_compare_index, get_agreement
+from elections.exceptions import InvalidAnswersError
+from elections.graph_export import stream_election
+from elections.paginator import KeysetPaginator
+from elections.questionnaire import get_questionnaire
+from elections.scoring import ScoringMatrix, get_scores_and_candidates
+from elections import telemetry
+from elections.telemetry import build_visitor_record
+
+class ElectionV2Resource(FieldsetsMixin, ModelResource):
     candidates = fields.ToManyField('candidator.elections.api_v2.CandidateV2Resource', 'candidate_set', null=True)
     categories = fields.ToManyField('candidator.elections.api_v2.CategoryV2Resource', 'category_set', null=True)
     background_categories = fields.ToManyField('candidator.elections.api_v2.BackgroundCategoryV2Resource', 'backgroundcategory_set', null=True)
@@ -15,49 +33,111 @@ class ElectionV2Resource(ModelResource):
     
     class Meta:
         queryset = Election.objects.all()
+        paginator_class = KeysetPaginator
         resource_name = 'election'
-        authentication = ApiKeyAuthentication()
+        authentication = CachedApiKeyAuthentication()
 
     def authorized_read_list(self, object_list, bundle):
         return object_list.filter(owner=bundle.request.user)
 
-class PersonalDataV2Resource(ModelResource):
+    def prepend_urls(self):
+        return [
+            url(r"^(?P<resource_name>%s)/(?P<pk>\d+)/compare/(?P<first_candidate_id>\d+)/(?P<second_candidate_id>\d+)%s$"
+                % (self._meta.resource_name, trailing_slash()), self.wrap_view('compare'), name="api_election_compare"),
+            url(r"^(?P<resource_name>%s)/(?P<pk>\d+)/export%s$" % (self._meta.resource_name, trailing_slash()),
+                self.wrap_view('export'), name="api_election_export"),
+        ]
+
+    def export(self, request, **kwargs):
+        '''
+        Streams the whole election as JSON lines, see
+        elections.graph_export.stream_election.
+        '''
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        elections = self.authorized_read_list(Election.objects.filter(pk=kwargs['pk']), Bundle(request=request))
+        try:
+            election = elections.select_related('owner').get()
+        except Election.DoesNotExist:
+            return HttpNotFound()
+        return HttpResponse(stream_election(election), content_type='application/x-json-stream')
+
+    def compare(self, request, **kwargs):
+        '''
+        Agreement score of two candidates of the election, overall and by
+        category, with their answer to every question.
+        '''
+        self.method_check(request, allowed=['get'])
+        self.is_authenticated(request)
+        elections = self.authorized_read_list(Election.objects.filter(pk=kwargs['pk']), Bundle(request=request))
+        candidate_ids = [int(kwargs['first_candidate_id']), int(kwargs['second_candidate_id'])]
+        try:
+            election = elections.get()
+        except Election.DoesNotExist:
+            return HttpNotFound()
+        if candidate_ids[0] == candidate_ids[1] or election.candidate_set.filter(pk__in=candidate_ids).count() != 2:
+            return HttpNotFound()
+        index = get_compare_index(election)
+        categories = []
+        for category in election.category_set.all():
+            rows, same = index.compare(candidate_ids[0], candidate_ids[1], category.pk)
+            categories.append({
+                'category': category.pk,
+                'name': category.name,
+                'agreement': get_agreement(same, len(rows)),
+                'answers': [{'question': question_id, 'first_answer': first_answer_id, 'second_answer': second_answer_id}
+                            for question_id, first_answer_id, second_answer_id in rows],
+            })
+        data = {
+            'first_candidate': candidate_ids[0],
+            'second_candidate': candidate_ids[1],
+            'agreement': index.get_agreement(candidate_ids[0], candidate_ids[1]),
+            'categories': categories,
+        }
+        return self.create_response(request, data)
+
+class PersonalDataV2Resource(FieldsetsMixin, ModelResource):
     class Meta:
         queryset = PersonalData.objects.all()
+        paginator_class = KeysetPaginator
         resource_name = 'personal_data'
-        authentication = ApiKeyAuthentication()
+        authentication = CachedApiKeyAuthentication()
 
-class LinkV2Resource(ModelResource):
+class LinkV2Resource(FieldsetsMixin, ModelResource):
     class Meta:
         queryset = Link.objects.all()
+        paginator_class = KeysetPaginator
         resource_name = 'link'
-        authentication = ApiKeyAuthentication()
+        authentication = CachedApiKeyAuthentication()
 
-class BackgroundV2Resource(ModelResource):
+class BackgroundV2Resource(FieldsetsMixin, ModelResource):
     background_category = fields.ToOneField('candidator.elections.api_v2.BackgroundCategoryV2Resource','category')
 
     class Meta:
         queryset = Background.objects.all()
+        paginator_class = KeysetPaginator
         resource_name = 'background'
-        authentication = ApiKeyAuthentication()
+        authentication = CachedApiKeyAuthentication()
 
-class PersonalDataCandidateV2Resource(ModelResource):
+class PersonalDataCandidateV2Resource(FieldsetsMixin, ModelResource):
     candidate = fields.ToOneField('candidator.elections.api_v2.CandidateV2Resource','candidate')
     personal_data = fields.ToOneField('candidator.elections.api_v2.PersonalDataV2Resource','personal_data')
 
     class Meta:
         resource_name = 'personal_data_candidate'
         queryset = PersonalDataCandidate.objects.all()
-        authentication = ApiKeyAuthentication()
+        paginator_class = KeysetPaginator
+        authentication = CachedApiKeyAuthentication()
 
-class BackgroundsCandidateV2Resource(ModelResource):
+class BackgroundsCandidateV2Resource(FieldsetsMixin, ModelResource):
     background = fields.ToOneField('candidator.elections.api_v2.BackgroundV2Resource','background')
 
     class Meta:
         resource_name = 'backgrounds_candidate'
         queryset = BackgroundCandidate.objects.all()
+        paginator_class = KeysetPaginator
 
-class CandidateV2Resource(ModelResource):
+class CandidateV2Resource(FieldsetsMixin, ModelResource):
     # personal_data = fields.ManyToManyField(PersonalDataV2Resource, 'personal_data', null=True, full=True)
     links = fields.ToManyField(LinkV2Resource, 'link_set', null=True)
     personal_data_candidate = fields.ToManyField('candidator.elections.api_v2.PersonalDataCandidateV2Resource','personaldatacandidate_set', null=True)
@@ -66,52 +146,67 @@ class CandidateV2Resource(ModelResource):
 
     class Meta:
         queryset = Candidate.objects.all()
+        paginator_class = KeysetPaginator
         resource_name = 'candidate'
-        authentication = ApiKeyAuthentication()
+        authentication = CachedApiKeyAuthentication()
         filtering = {
             'id' : ALL
         }
 
-class AnswerV2Resource(ModelResource):
+class AnswerV2Resource(FieldsetsMixin, ModelResource):
     question = fields.ToOneField('candidator.elections.api_v2.QuestionV2Resource', 'question')
     candidates = fields.ToManyField(CandidateV2Resource, 'candidate_set', null=True)
 
     class Meta:
         queryset = Answer.objects.all()
+        paginator_class = KeysetPaginator
         resource_name = 'answer'
-        authentication = ApiKeyAuthentication()
+        authentication = CachedApiKeyAuthentication()
         filtering = {
             'question' : ALL,
             'candidate' : ALL
         }
 
-class QuestionV2Resource(ModelResource):
+class QuestionV2Resource(FieldsetsMixin, ModelResource):
     category = fields.ToOneField('candidator.elections.api_v2.CategoryV2Resource', 'category', null=True)
     answers = fields.ToManyField(AnswerV2Resource, 'answer_set', null=True)
     information_sources = fields.ToManyField('candidator.elections.api_v2.InformationSourceResource', 'informationsource_set', null=True)
 
     class Meta:
         queryset = Question.objects.all()
+        paginator_class = KeysetPaginator
         resource_name = 'question'
-        authentication = ApiKeyAuthentication()
+        authentication = CachedApiKeyAuthentication()
 
-class CategoryV2Resource(ModelResource):
+class CategoryV2Resource(FieldsetsMixin, ModelResource):
     questions = fields.ToManyField(QuestionV2Resource, 'question_set', null=True)
 
     class Meta:
         queryset = Category.objects.all()
+        paginator_class = KeysetPaginator
         resource_name = 'category'
-        authentication = ApiKeyAuthentication()
+        authentication = CachedApiKeyAuthentication()
 
-class BackgroundCategoryV2Resource(ModelResource):
+class BackgroundCategoryV2Resource(FieldsetsMixin, ModelResource):
     background = fields.ToManyField('candidator.elections.api_v2.BackgroundV2Resource', 'background_set', null=True)
 
     class Meta:
         queryset = BackgroundCategory.objects.all()
+        paginator_class = KeysetPaginator
         resource_name = 'background_category'
-        authentication = ApiKeyAuthentication()
+        authentication = CachedApiKeyAuthentication()
+
+from candidator.elections.views import strip_elements_from_dictionary, medianaranja2, get_ranking_size
+
+
+def score_to_dict(score_and_candidate, categories):
+    global_score, category_scores, candidate = score_and_candidate
+    return {
+        'global_score': global_score,
+        'category_score': [{'category': category.name, 'score': score} for category, score in zip(categories, category_scores)],
+        'candidate': candidate.id
+    }
 
-from candidator.elections.views import strip_elements_from_dictionary, medianaranja2
 
 class MediaNaranjaResource(Resource):
     class Meta:
@@ -119,12 +214,95 @@ class MediaNaranjaResource(Resource):
         object_class = dict
         always_return_data = True
         serializer = Serializer(formats=['jsonp', 'json'])
+        # Only the batch endpoint requires an api key
+        batch_authentication = CachedApiKeyAuthentication()
+
+    def prepend_urls(self):
+        return [
+            url(r"^(?P<resource_name>%s)/batch%s$" % (self._meta.resource_name, trailing_slash()),
+                self.wrap_view('batch'), name="api_medianaranja_batch"),
+        ]
+
+    def batch(self, request, **kwargs):
+        '''
+        Scores a list of answer sets against one election and streams one
+        JSON line per answer set back:
+
+            {"election-id": 1, "answers": [{"question-0": ..., ...}, ...],
+             "k": 3, "telemetry": "skip"}
+
+        Answer sets use the same fields as the single media naranja
+        endpoint. Unpublished elections can only be scored by their owner.
+        With "telemetry": "record" answer sets are also stored as visitors,
+        which only the owner of the election may do.
+        '''
+        self.method_check(request, allowed=['post'])
+        if self._meta.batch_authentication.is_authenticated(request) is not True:
+            return HttpUnauthorized()
+        data = self.deserialize(request, request.raw_post_data, format=request.META.get('CONTENT_TYPE', 'application/json'))
+        try:
+            election = Election.objects.get(id=int(data["election-id"]))
+        except (KeyError, TypeError, ValueError, Election.DoesNotExist):
+            raise BadRequest(u"Unknown election")
+        is_owner = election.owner_id == request.user.pk
+        if not (election.published or is_owner):
+            raise BadRequest(u"Unknown election")
+        answer_sets = data.get("answers")
+        if not isinstance(answer_sets, list):
+            raise BadRequest(u"answers must be a list")
+        if len(answer_sets) > settings.MEDIANARANJA_BATCH_MAX_SIZE:
+            raise BadRequest(u"At most %d answer sets per batch" % settings.MEDIANARANJA_BATCH_MAX_SIZE)
+        if data.get("telemetry", "skip") not in ("skip", "record"):
+            raise BadRequest(u"telemetry must be skip or record")
+        if data.get("telemetry") == "record" and not is_owner:
+            return HttpForbidden()
+        try:
+            k = get_ranking_size(data.get("k"))
+        except InvalidAnswersError, e:
+            raise BadRequest(e.args[0])
+        lines = self.score_batch(election, answer_sets, k, data.get("telemetry") == "record")
+        return HttpResponse(lines, content_type='application/x-json-stream')
+
+    def score_batch(self, election, answer_sets, k, record):
+        questionnaire = get_questionnaire(election)
+        matrix = ScoringMatrix(election)
+        if record:
+            election_url = reverse("election_detail", kwargs={'username': election.owner.username, 'slug': election.slug})
+        records = []
+        for index, answer_set in enumerate(answer_sets):
+            try:
+                if not isinstance(answer_set, dict):
+                    raise InvalidAnswersError(u"Answer sets must be objects")
+                elements = strip_elements_from_dictionary(answer_set, election)
+            except InvalidAnswersError, e:
+                yield json.dumps({'index': index, 'error': e.args[0]}) + '\n'
+                continue
+            scores_and_candidates, ranking = get_scores_and_candidates(election, elements['answers'], elements['importances'],
+                                                                       k=k or elements['k'], matrix=matrix)
+            if record:
+                records.append(build_visitor_record(election, election_url, elements['answers'], elements['importances'],
+                                                    elements['questions'], questionnaire.categories, scores_and_candidates))
+                if len(records) >= telemetry.writer.batch_size:
+                    telemetry.writer.write(records)
+                    records = []
+            result = {
+                'index': index,
+                'winner': score_to_dict(ranking[0], questionnaire.categories) if ranking else None,
+                'others': [score_to_dict(other, questionnaire.categories) for other in ranking[1:]]
+            }
+            yield json.dumps(result) + '\n'
+        if records:
+            telemetry.writer.write(records)
 
     def obj_create(self,bundle,**kwargs):
         election = Election.objects.get(id=bundle.data["election-id"])
 
-        elements = strip_elements_from_dictionary(bundle.data["data"],election)
-        result = medianaranja2(elements["answers"], elements['importances'], elements['questions'], elements['candidates'], elements['categories'], election)
+        try:
+            elements = strip_elements_from_dictionary(bundle.data["data"],election)
+            k = get_ranking_size(bundle.data.get("k")) or elements['k']
+        except InvalidAnswersError, e:
+            raise BadRequest(e.args[0])
+        result = medianaranja2(elements["answers"], elements['importances'], elements['questions'], elements['candidates'], elements['categories'], election, k)
         bundle.obj = result
         bundle.data = result
         return bundle
@@ -133,6 +311,9 @@ class MediaNaranjaResource(Resource):
         return {}
 
     def serialize(self, request, data, format, options=None):
+        if not isinstance(data, Bundle):
+            # Error responses
+            return super(MediaNaranjaResource, self).serialize(request, data, format, options)
         winner = data.data["winner"]
         others = data.data["others"]
         data.data["winner"] = {
@@ -181,12 +362,13 @@ class MediaNaranjaResource(Resource):
 
         return serialized
 
-class InformationSourceResource(ModelResource):
+class InformationSourceResource(FieldsetsMixin, ModelResource):
     candidate = fields.ToOneField('candidator.elections.api_v2.CandidateV2Resource','candidate')
     question = fields.ToOneField('candidator.elections.api_v2.QuestionV2Resource', 'question')
 
 
     class Meta:
         queryset = InformationSource.objects.all()
+        paginator_class = KeysetPaginator
         resource_name = 'information_source'
-        authentication = ApiKeyAuthentication()
\ No newline at end of file
+        authentication = CachedApiKeyAuthentication()
\ No newline at end of file
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from tastypie.authentication import ApiKeyAuthentication
+from tastypie.models import ApiKey
+
+from elections.cache import LRUCache
+
+
+# username -> (user id, api key, expiry) of the keys that were accepted
+_api_keys = LRUCache(settings.API_KEY_CACHE_SIZE)
+
+
+class CachedApiKeyAuthentication(ApiKeyAuthentication):
+    '''
+    ApiKeyAuthentication that remembers the keys it accepted for
+    API_KEY_CACHE_TIMEOUT seconds, so that clients sending the same key on
+    every request do not look up their user and key every time.
+
+    On a cache hit request.user only has its id and username loaded, which
+    is what the resources filter on.
+
+    Entries live in each worker. Changing, renaming or deleting a user or
+    their key forgets the entry of the worker that made the change only:
+    other workers keep accepting the old key until their entry expires.
+    '''
+
+    def is_authenticated(self, request, **kwargs):
+        try:
+            username, api_key = self.extract_credentials(request)
+        except ValueError:
+            return self._unauthorized()
+        if not username or not api_key:
+            return self._unauthorized()
+
+        cached = _api_keys.get(username)
+        if cached is not None:
+            user_id, cached_key, expires = cached
+            if cached_key == api_key and expires > time.time():
+                request.user = User(id=user_id, username=username, is_active=True)
+                return True
+
+        authenticated = super(CachedApiKeyAuthentication, self).is_authenticated(request, **kwargs)
+        if authenticated is True:
+            _api_keys.set(username, (request.user.pk, api_key, time.time() + settings.API_KEY_CACHE_TIMEOUT))
+        return authenticated
+
+
+@receiver(pre_save, sender=User)
+def user_renamed(sender, instance, **kwargs):
+    # The entry is keyed by the username the user had before this save
+    if instance.pk is not None:
+        for username in User.objects.filter(pk=instance.pk).values_list('username', flat=True):
+            _api_keys.pop(username)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    _api_keys.pop(instance.username)
+
+@receiver(post_save, sender=ApiKey)
+@receiver(post_delete, sender=ApiKey)
+def api_key_changed(sender, instance, **kwargs):
+    try:
+        username = User.objects.filter(pk=instance.user_id).values_list('username', flat=True)[0]
+    except IndexError:
+        return
+    _api_keys.pop(username)
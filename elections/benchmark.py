@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+'''
+Synthetic elections and timings for the media naranja path.
+
+See the medianaranja_benchmark management command, which runs all of
+this against a throwaway test database.
+'''
+import random
+import resource
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import connection, reset_queries
+from django.test.client import Client
+from django.utils import simplejson as json
+
+from elections import answer_index, compare_index, questionnaire, scoring
+from elections.models import Election, Candidate, Category, Question, Answer
+from elections.telemetry import bulk_insert
+
+
+# (candidates, categories, questions per category, answers per question)
+DEFAULT_SIZES = ((10, 3, 5, 3), (50, 5, 10, 4), (200, 10, 10, 5))
+
+
+def create_synthetic_election(candidates, categories, questions, answers, seed=0):
+    '''
+    Creates an election with the given number of candidates and categories,
+    `questions` questions per category and `answers` answers per question.
+    Every candidate answers every question at random.
+    '''
+    rng = random.Random(seed)
+    owner, created = User.objects.get_or_create(username='benchmark')
+    slug = 'benchmark-%d-%d-%d-%d' % (candidates, categories, questions, answers)
+    Election.objects.filter(owner=owner, slug=slug).delete()
+    election = Election.objects.create(name=slug, slug=slug, owner=owner, published=True)
+    election.category_set.all().delete()
+
+    answer_ids_by_question = []
+    for c in range(categories):
+        category = Category.objects.create(name=u'Category %d' % c, election=election, order=c)
+        for q in range(questions):
+            question = Question.objects.create(question=u'Question %d.%d' % (c, q), category=category)
+            answer_ids_by_question.append([Answer.objects.create(question=question, caption=u'Answer %d' % a).pk
+                                           for a in range(answers)])
+
+    rows = []
+    for n in range(candidates):
+        candidate = Candidate.objects.create(name=u'Candidate %d' % n, election=election)
+        rows.extend((candidate.pk, rng.choice(answer_ids)) for answer_ids in answer_ids_by_question)
+    bulk_insert(connection.cursor(), Candidate.answers.through, ('candidate', 'answer'), rows)
+    return Election.objects.get(pk=election.pk)
+
+
+def random_form_data(election, rng):
+    '''
+    Media naranja form fields for a visitor that answers at random and skips
+    about one question out of five.
+    '''
+    data = {}
+    for number, question in enumerate(questionnaire.get_questionnaire(election).questions):
+        data['question-id-%d' % number] = question.pk
+        data['importance-%d' % number] = rng.randint(1, 5)
+        answers = list(question.answer_set.values_list('pk', flat=True))
+        if answers and rng.random() > 0.2:
+            data['question-%d' % number] = rng.choice(answers)
+    return data
+
+
+def reset_peak_rss():
+    '''
+    Resets the peak resident memory of the process (VmHWM), on Linux.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except IOError:
+        pass
+
+
+def get_peak_rss_kb():
+    '''
+    Peak resident memory of the process since the last reset_peak_rss().
+    Without /proc it falls back to ru_maxrss, the peak since the process
+    started.
+    '''
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (IOError, IndexError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on OS X, kB elsewhere
+    return peak / 1024 if sys.platform == 'darwin' else peak
+
+
+def measure(function, repeat):
+    '''
+    Calls function() repeat times and returns its timings, query count and
+    the peak resident memory of the process meanwhile.
+    '''
+    timings = []
+    queries = []
+    reset_peak_rss()
+    for i in range(repeat):
+        reset_queries()
+        start = time.time()
+        function()
+        timings.append(time.time() - start)
+        queries.append(len(connection.queries))
+    return {
+        'repeat': repeat,
+        'min_seconds': min(timings),
+        'mean_seconds': sum(timings) / len(timings),
+        'max_seconds': max(timings),
+        'queries': max(queries),
+        'peak_rss_kb': get_peak_rss_kb(),
+    }
+
+
+def benchmark_election(election, repeat=10, seed=0):
+    rng = random.Random(seed)
+    # Stay away from the debug toolbar, which only shows up for INTERNAL_IPS
+    client = Client(REMOTE_ADDR='10.0.0.1')
+    url = reverse('medianaranja1', kwargs={'username': election.owner.username, 'election_slug': election.slug})
+    form_data = []
+
+    def check(response):
+        if response.status_code >= 400:
+            raise RuntimeError(u"%s answered %d" % (response.request['PATH_INFO'], response.status_code))
+
+    def get_form():
+        check(client.get(url))
+
+    def post_scoring():
+        check(client.post(url, form_data.pop()))
+
+    def api():
+        data = {'election-id': election.pk, 'data': form_data.pop()}
+        check(client.post('/api/v2/medianaranja/', json.dumps(data), content_type='application/json'))
+
+    def get_score():
+        # The original one candidate at a time scoring, without the views
+        data = form_data.pop()
+        answers = []
+        importances = []
+        for number, question in enumerate(questionnaire.get_questionnaire(election).questions):
+            answer_id = data.get('question-%d' % number)
+            answers.append([Answer.objects.get(pk=answer_id)] if answer_id else [])
+            importances.append(data['importance-%d' % number])
+        for candidate in election.candidate_set.all():
+            candidate.get_score(answers, importances)
+
+    results = {}
+    for name, function in (('get_form', get_form), ('post_scoring', post_scoring), ('api', api), ('get_score', get_score)):
+        form_data[:] = [random_form_data(election, rng) for i in range(repeat)]
+        # Every case starts with cold per-worker caches
+        questionnaire._questionnaires.clear()
+        scoring._results.clear()
+        answer_index._indexes.clear()
+        compare_index._indexes.clear()
+        results[name] = measure(function, repeat)
+    return results
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, repeat=10, seed=0):
+    '''
+    Returns a list with the measures of every size, ready to be dumped as JSON.
+    '''
+    debug = settings.DEBUG
+    use_debug_cursor = connection.use_debug_cursor
+    settings.DEBUG = False
+    connection.use_debug_cursor = True
+    try:
+        report = []
+        for candidates, categories, questions, answers in sizes:
+            election = create_synthetic_election(candidates, categories, questions, answers, seed)
+            report.append({
+                'candidates': candidates,
+                'categories': categories,
+                'questions_per_category': questions,
+                'answers_per_question': answers,
+                'results': benchmark_election(election, repeat, seed),
+            })
+        return report
+    finally:
+        settings.DEBUG = debug
+        connection.use_debug_cursor = use_debug_cursor
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+
+from elections.cache import LRUCache
+from elections.models import Candidate, Question, Answer
+
+
+def get_agreement(same, questions):
+    '''
+    Percentage of the questions two candidates answered the same way.
+    '''
+    if not questions:
+        return None
+    return 100.0 * same / questions
+
+
+class CompareIndex(object):
+    '''
+    Answer of every candidate to every question of an election, grouped by
+    category, with the comparison of every candidate pair and category
+    computed the first time it is asked for and kept with the index.
+    '''
+
+    def __init__(self, election_id, version):
+        self.election_id = election_id
+        self.version = version
+        self.questions = {}
+        questions = Question.objects.filter(category__election=election_id).order_by('category__order', 'category', 'pk')
+        for question_id, category_id in questions.values_list('pk', 'category_id'):
+            self.questions.setdefault(category_id, []).append(question_id)
+        self.choices = {}
+        links = Candidate.answers.through.objects.filter(candidate__election=election_id).order_by('answer')
+        for candidate_id, answer_id, question_id in links.values_list('candidate_id', 'answer_id', 'answer__question_id'):
+            # The first answer wins, as in Candidate.get_answer_by_question
+            self.choices.setdefault(candidate_id, {}).setdefault(question_id, answer_id)
+        self.pairs = {}
+
+    def compare(self, first_candidate_id, second_candidate_id, category_id):
+        '''
+        Returns ([(question_id, first answer_id, second answer_id), ...], same)
+        where unanswered questions have None as answer and same is the
+        number of questions both candidates answered with the same answer.
+        '''
+        key = (first_candidate_id, second_candidate_id, category_id)
+        comparison = self.pairs.get(key)
+        if comparison is None:
+            first_choices = self.choices.get(first_candidate_id, {})
+            second_choices = self.choices.get(second_candidate_id, {})
+            rows = []
+            same = 0
+            for question_id in self.questions.get(category_id, ()):
+                first_answer_id = first_choices.get(question_id)
+                second_answer_id = second_choices.get(question_id)
+                if first_answer_id is not None and first_answer_id == second_answer_id:
+                    same += 1
+                rows.append((question_id, first_answer_id, second_answer_id))
+            comparison = self.pairs[key] = (rows, same)
+        return comparison
+
+    def get_agreement(self, first_candidate_id, second_candidate_id, category_id=None):
+        '''
+        Agreement between two candidates in a category, or in the whole
+        election if category_id is None.
+        '''
+        if category_id is not None:
+            rows, same = self.compare(first_candidate_id, second_candidate_id, category_id)
+            return get_agreement(same, len(rows))
+        same = questions = 0
+        for category_id in self.questions:
+            rows, category_same = self.compare(first_candidate_id, second_candidate_id, category_id)
+            same += category_same
+            questions += len(rows)
+        return get_agreement(same, questions)
+
+
+_indexes = LRUCache(settings.COMPARE_INDEX_CACHE_SIZE)
+
+
+def get_compare_index(election):
+    '''
+    Returns the CompareIndex of the election, built at most once per worker
+    and election version, so it is rebuilt after any candidate answer changes.
+    '''
+    index = _indexes.get(election.pk)
+    if index is None or index.version != election.version:
+        index = CompareIndex(election.pk, election.version)
+        _indexes.set(election.pk, index)
+    return index
+
+
+def get_answers_two_candidates(election, first_candidate, second_candidate, category):
+    '''
+    Same rows as Candidate.get_answers_two_candidates, with two queries,
+    plus the agreement of the candidates in the category.
+    '''
+    rows, same = get_compare_index(election).compare(first_candidate.pk, second_candidate.pk, category.pk)
+    questions = Question.objects.in_bulk([question_id for question_id, first_answer_id, second_answer_id in rows])
+    answers = Answer.objects.in_bulk([answer_id for row in rows for answer_id in row[1:] if answer_id is not None])
+    answers[None] = "no answer"
+    answers = [(questions[question_id], answers[first_answer_id], answers[second_answer_id])
+               for question_id, first_answer_id, second_answer_id in rows]
+    return answers, get_agreement(same, len(rows))
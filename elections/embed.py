@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+'''
+The whole public content of an election as one JSON document, for the
+embeddable widget in static/js/candideitorg-embed.js.
+'''
+from django.core.urlresolvers import reverse
+
+from elections.models import Candidate, PersonalData, PersonalDataCandidate, BackgroundCategory, Background,\
+                             BackgroundCandidate, Link, prefetch_answers
+from elections.questionnaire import get_questionnaire
+
+
+def get_file_url(field_file):
+    if not field_file:
+        return None
+    return field_file.url
+
+
+def get_embed_bundle(election):
+    '''
+    Returns the election, its questionnaire, personal data and background
+    definitions and every candidate with their values, as plain values.
+
+    Candidate values are keyed by the id of what they answer: personal data
+    by PersonalData id, backgrounds by Background id and answers by
+    Question id, with the Answer id as value.
+    '''
+    username = election.owner.username
+    questionnaire = get_questionnaire(election)
+    categories = [{
+        'id': category.pk,
+        'name': category.name,
+        'questions': [{
+            'id': question.pk,
+            'question': question.question,
+            'answers': [{'id': answer.pk, 'caption': answer.caption} for answer in answers],
+        } for number, question, answers in questions],
+    } for category, questions in questionnaire.stt]
+
+    backgrounds_by_category = {}
+    for background_id, category_id, name in Background.objects.filter(
+            category__election=election).order_by('pk').values_list('pk', 'category_id', 'name'):
+        backgrounds_by_category.setdefault(category_id, []).append({'id': background_id, 'name': name})
+    background_categories = [{'id': category_id, 'name': name, 'backgrounds': backgrounds_by_category.get(category_id, [])}
+                             for category_id, name in BackgroundCategory.objects.filter(
+                                 election=election).order_by('pk').values_list('pk', 'name')]
+
+    candidates = prefetch_answers(Candidate.objects.filter(election=election).order_by('pk'))
+    values = dict((candidate.pk, {'personal_data': {}, 'backgrounds': {}, 'links': []}) for candidate in candidates)
+    for candidate_id, personal_data_id, value in PersonalDataCandidate.objects.filter(
+            candidate__election=election).values_list('candidate_id', 'personal_data_id', 'value'):
+        values[candidate_id]['personal_data'][personal_data_id] = value
+    for candidate_id, background_id, value in BackgroundCandidate.objects.filter(
+            candidate__election=election).values_list('candidate_id', 'background_id', 'value'):
+        values[candidate_id]['backgrounds'][background_id] = value
+    for candidate_id, name, url in Link.objects.filter(
+            candidate__election=election).order_by('pk').values_list('candidate_id', 'name', 'url'):
+        values[candidate_id]['links'].append({'name': name, 'url': url})
+
+    return {
+        'election': {
+            'id': election.pk,
+            'name': election.name,
+            'slug': election.slug,
+            'owner': username,
+            'description': election.description,
+            'information_source': election.information_source,
+            'date': election.date,
+            'logo': get_file_url(election.logo),
+            'url': reverse('election_detail', kwargs={'username': username, 'slug': election.slug}),
+            'medianaranja_url': reverse('medianaranja1_embeded', kwargs={'username': username, 'election_slug': election.slug}),
+        },
+        'categories': categories,
+        'personal_data': [{'id': personal_data_id, 'label': label} for personal_data_id, label in
+                          PersonalData.objects.filter(election=election).order_by('pk').values_list('pk', 'label')],
+        'background_categories': background_categories,
+        'candidates': [dict(values[candidate.pk], **{
+            'id': candidate.pk,
+            'name': candidate.name,
+            'slug': candidate.slug,
+            'photo': get_file_url(candidate.photo),
+            'answers': dict((question_id, answer.pk) for question_id, answer in candidate.get_answers_by_question().items()),
+        }) for candidate in candidates],
+    }
@@ -2,4 +2,7 @@
 class NoCandidateError(Exception):
     def __init__(self, message, Errors):
         Exception.__init__(self, message)
-        self.Errors = Errors
\ No newline at end of file
+        self.Errors = Errors
+
+class InvalidAnswersError(Exception):
+    pass
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+'''
+Static export of the public pages of a published election.
+
+See the elections_exporter management command.
+'''
+import hashlib
+import os
+import re
+from multiprocessing import Pool
+
+from django.contrib.sites.models import Site
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.client import Client
+from django.utils import simplejson as json
+
+from elections.thumbnails import generator
+
+MANIFEST_NAME = 'manifest.json'
+
+# Pages are rendered for this host, so absolute URLs to it are self links
+RENDER_HOST = 'testserver'
+RENDER_ORIGIN = 'http://' + RENDER_HOST
+
+# Quoted root relative or absolute URLs, with the attribute they are in
+LINK_RE = re.compile(r'''(?P<attribute>\b(?:href|src|action)=)?(?P<quote>["'])(?P<origin>https?://[^/"'\s]+)?'''
+                     r'''(?P<url>/[^"'\s?#]*)(?P<rest>[?#][^"']*)?(?P=quote)''')
+
+
+def get_public_urls(election):
+    '''
+    Returns the path of every public page of the election: detail, profiles,
+    about, candidates, every compare combination and the embedded variant
+    of each of them. The media naranja form posts back to its page, so it
+    stays on the Django site.
+    '''
+    username = election.owner.username
+    kwargs = {'username': username, 'slug': election.slug}
+    urls = []
+    for name in ('election_detail', 'election_detail_profiles', 'election_about', 'election_compare'):
+        urls.append(reverse(name, kwargs=kwargs))
+        urls.append(reverse(name + '_embeded', kwargs=kwargs))
+    urls.append(reverse('candidate_list_json', kwargs={'username': username, 'election_slug': election.slug}))
+
+    candidate_slugs = list(election.candidate_set.order_by('pk').values_list('slug', flat=True))
+    category_slugs = list(election.category_set.order_by('pk').values_list('slug', flat=True))
+    for candidate_slug in candidate_slugs:
+        candidate_kwargs = {'username': username, 'election_slug': election.slug, 'slug': candidate_slug}
+        urls.append(reverse('candidate_detail', kwargs=candidate_kwargs))
+        urls.append(reverse('candidate_detail_embeded', kwargs=candidate_kwargs))
+        urls.append(reverse('election_compare_asynchronous_call', kwargs=dict(kwargs, candidate_slug=candidate_slug)))
+        for suffix in ('', '_embeded'):
+            urls.append(reverse('election_compare_one_candidate' + suffix, kwargs=dict(kwargs, first_candidate_slug=candidate_slug)))
+            for second_candidate_slug in candidate_slugs:
+                if second_candidate_slug == candidate_slug:
+                    continue
+                pair_kwargs = dict(kwargs, first_candidate_slug=candidate_slug, second_candidate_slug=second_candidate_slug)
+                urls.append(reverse('election_compare_two_candidates_and_no_category' + suffix, kwargs=pair_kwargs))
+                for category_slug in category_slugs:
+                    urls.append(reverse('election_compare_two_candidates' + suffix,
+                                        kwargs=dict(pair_kwargs, category_slug=category_slug)))
+    return urls
+
+
+def get_file_name(url):
+    '''
+    Every page is stored as the index file of a directory named after its
+    path, so /joe/election/about becomes joe/election/about/index.html.
+    JSON pages too: the compare scripts request them by directory URL.
+    '''
+    return os.path.join(url.strip('/'), 'index.html')
+
+
+def rewrite_links(content, file_names, base_url, origin, all_strings=False):
+    '''
+    Points every link to an exported page to its file under base_url, and
+    every other link to the site to origin, where the Django site is served.
+
+    Absolute URLs to the render host are rewritten wherever they are, root
+    relative ones only in href, src and action attributes, as scripts build
+    URLs from quoted paths, unless all_strings is True.
+    '''
+    def replace(match):
+        if match.group('origin') not in (None, RENDER_ORIGIN):
+            return match.group(0)
+        if match.group('origin') is None and match.group('attribute') is None and not all_strings:
+            return match.group(0)
+        url = match.group('url')
+        file_name = file_names.get(url) or file_names.get(url.rstrip('/')) or file_names.get(url + '/')
+        if file_name is None:
+            target = origin.rstrip('/') + url
+        else:
+            target = u'%s/%s' % (base_url.rstrip('/'), file_name)
+        return u'%s%s%s%s%s' % (match.group('attribute') or '', match.group('quote'), target,
+                                match.group('rest') or '', match.group('quote'))
+    return LINK_RE.sub(replace, content)
+
+
+# State of every worker process, see init_worker
+_worker = {}
+
+
+def init_worker(file_names, output_dir, base_url, origin, hashes):
+    # Pages are written once: a thumbnail still queued when they are
+    # rendered would be exported as the original image, and the queue is
+    # lost when a worker process exits
+    generator.mode = 'immediate'
+    _worker.update(file_names=file_names, output_dir=output_dir, base_url=base_url, origin=origin, hashes=hashes,
+                   client=Client(REMOTE_ADDR='10.0.0.1', SERVER_NAME=RENDER_HOST))
+
+
+def init_pool_worker(*args):
+    # Forked workers must not share the database connection of the parent
+    connection.close()
+    init_worker(*args)
+
+
+def export_page(url):
+    '''
+    Renders url and writes it unless it is identical to the last export.
+    Returns (url, file name, content hash, written) or (url, None, status, False)
+    when the page could not be rendered.
+    '''
+    response = _worker['client'].get(url)
+    if response.status_code != 200:
+        return url, None, response.status_code, False
+    content = rewrite_links(response.content.decode('utf-8'), _worker['file_names'], _worker['base_url'],
+                            _worker['origin'], all_strings='json' in response.get('Content-Type', ''))
+    content = content.encode('utf-8')
+    file_name = get_file_name(url)
+    content_hash = hashlib.sha1(content).hexdigest()
+    path = os.path.join(_worker['output_dir'], file_name)
+    if _worker['hashes'].get(file_name) == content_hash and os.path.exists(path):
+        return url, file_name, content_hash, False
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as page:
+        page.write(content)
+    return url, file_name, content_hash, True
+
+
+def read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as manifest:
+            return json.load(manifest)
+    except (IOError, ValueError):
+        return {}
+
+
+def export_election(election, output_dir, base_url='', origin=None, processes=None, incremental=False):
+    '''
+    Renders every public page of the election into output_dir, to be served
+    from base_url, with links to the rest of the site pointing to origin
+    (http://<domain of the current Site> by default). Pages are rendered by
+    `processes` worker processes (all CPUs by default, 1 renders in this
+    process). With incremental=True nothing is rendered if the election did
+    not change since the last export, and otherwise only the pages whose
+    content changed are written. An export to another base_url or origin
+    rewrites every page.
+
+    Returns a dict with the lists of 'written', 'unchanged', 'deleted' and
+    'failed' pages.
+    '''
+    if origin is None:
+        origin = 'http://%s' % Site.objects.get_current().domain
+    manifest = read_manifest(output_dir) if incremental else {}
+    version = election.version
+    old_hashes = manifest.get('pages', {})
+    same_links = manifest.get('base_url') == base_url and manifest.get('origin') == origin
+    if incremental and same_links and manifest.get('version') == version:
+        return {'written': [], 'unchanged': sorted(old_hashes), 'deleted': [], 'failed': []}
+
+    urls = get_public_urls(election)
+    file_names = dict((url, get_file_name(url)) for url in urls)
+    initargs = (file_names, output_dir, base_url, origin, old_hashes if same_links else {})
+    mode = generator.mode
+    try:
+        if processes == 1:
+            init_worker(*initargs)
+            results = map(export_page, urls)
+        else:
+            pool = Pool(processes, init_pool_worker, initargs)
+            try:
+                results = pool.map(export_page, urls, chunksize=16)
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        generator.mode = mode
+
+    report = {'written': [], 'unchanged': [], 'deleted': [], 'failed': []}
+    hashes = {}
+    for url, file_name, content_hash, written in results:
+        if file_name is None:
+            report['failed'].append(url)
+            continue
+        hashes[file_name] = content_hash
+        report['written' if written else 'unchanged'].append(file_name)
+    for file_name in old_hashes:
+        if file_name not in hashes:
+            path = os.path.join(output_dir, file_name)
+            if os.path.exists(path):
+                os.remove(path)
+            report['deleted'].append(file_name)
+
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as manifest_file:
+        json.dump({'version': version, 'base_url': base_url, 'origin': origin, 'pages': hashes}, manifest_file, indent=2, sort_keys=True)
+    return report
@@ -2,6 +2,7 @@ from django import forms
 from django.forms import formsets, ImageField, FileInput
 from django.forms.formsets import formset_factory
 from elections.models import Candidate, Link, BackgroundCandidate, PersonalDataCandidate, Answer
+from elections.thumbnails import enqueue_candidate_thumbnails
 
 class CandidateForm(forms.ModelForm):
     class Meta:
@@ -27,6 +28,7 @@ class CandidatePhotoForm(forms.ModelForm):
         self.candidate.photo = self.cleaned_data['photo']
         if commit:
             self.candidate.save()
+            enqueue_candidate_thumbnails(self.candidate)
         return self.candidate
 
 class CandidateUpdateForm(forms.ModelForm):
@@ -6,6 +6,7 @@ from django.forms.formsets import formset_factory
 from elections.models import Category, Election, PersonalData,\
                 BackgroundCategory, Background, Question, Answer,\
                 PersonalDataCandidate, BackgroundCandidate
+from elections.thumbnails import enqueue_election_thumbnails
 
 
 class ElectionForm(forms.ModelForm):
@@ -46,6 +47,7 @@ class ElectionLogoUpdateForm(forms.ModelForm):
         self.election.logo = self.cleaned_data['logo']
         if commit:
             self.election.save()
+            enqueue_election_thumbnails(self.election)
         return self.election
     
 
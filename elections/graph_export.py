@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+'''
+A whole election as JSON lines, one line per object, for clients that
+mirror elections instead of crawling the v2 resources one by one.
+'''
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import simplejson as json
+
+from elections.models import Category, Question, Answer, Candidate, PersonalData, PersonalDataCandidate,\
+                             BackgroundCategory, Background, BackgroundCandidate, Link, InformationSource
+
+# (type, model, lookup of the election, fields) in the order they are
+# streamed: every object comes after the objects it points to.
+ELECTION_GRAPH = (
+    ('category', Category, 'election', ('id', 'name', 'slug', 'order')),
+    ('question', Question, 'category__election', ('id', 'category', 'question')),
+    ('answer', Answer, 'question__category__election', ('id', 'question', 'caption')),
+    ('personal_data', PersonalData, 'election', ('id', 'label')),
+    ('background_category', BackgroundCategory, 'election', ('id', 'name')),
+    ('background', Background, 'category__election', ('id', 'category', 'name')),
+    ('candidate', Candidate, 'election', ('id', 'name', 'slug', 'photo', 'has_answered')),
+    ('candidate_answer', Candidate.answers.through, 'candidate__election', ('id', 'candidate', 'answer')),
+    ('personal_data_candidate', PersonalDataCandidate, 'candidate__election', ('id', 'candidate', 'personal_data', 'value')),
+    ('background_candidate', BackgroundCandidate, 'candidate__election', ('id', 'candidate', 'background', 'value')),
+    ('link', Link, 'candidate__election', ('id', 'candidate', 'name', 'url')),
+    ('information_source', InformationSource, 'candidate__election', ('id', 'candidate', 'question', 'content')),
+)
+ELECTION_FIELDS = ('id', 'name', 'slug', 'description', 'information_source', 'date', 'logo', 'published',
+                   'highlighted', 'created_at', 'updated_at')
+
+
+def iterate_values(queryset, fields, chunk_size):
+    '''
+    Yields the values of every row of queryset, reading chunk_size rows at
+    a time ordered by primary key, so that only one chunk is ever in memory.
+    '''
+    last_pk = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        rows = list(chunk.values(*fields)[:chunk_size])
+        for row in rows:
+            yield row
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1]['id']
+
+
+def to_line(object_type, values):
+    values['type'] = object_type
+    return json.dumps(values, cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_election(election, chunk_size=None):
+    '''
+    Yields the election and everything in it as JSON lines, each with a
+    "type" key naming what it is and the ids of the objects it points to.
+    '''
+    chunk_size = chunk_size or settings.ELECTION_STREAM_CHUNK_SIZE
+    election_values = dict((field, getattr(election, field)) for field in ELECTION_FIELDS)
+    election_values['logo'] = election.logo.name
+    election_values['owner'] = election.owner.username
+    yield to_line('election', election_values)
+    for object_type, model, lookup, fields in ELECTION_GRAPH:
+        queryset = model.objects.filter(**{lookup: election})
+        for values in iterate_values(queryset, fields, chunk_size):
+            yield to_line(object_type, values)
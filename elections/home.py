@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+'''
+The elections the home page lists, kept in the cache so the home page
+does not query the database. Their version is read from the database at
+most every HOME_ELECTIONS_VERSION_CACHE_TIMEOUT seconds.
+'''
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+
+from elections.models import Election, CacheVersion
+
+HOME_ELECTIONS_CACHE_KEY = 'home-elections'
+
+# Name of the CacheVersion bumped whenever an election is saved or deleted
+HOME_ELECTIONS_VERSION = 'home-elections'
+HOME_ELECTIONS_VERSION_CACHE_KEY = 'home-elections-version'
+
+
+def get_home_elections_version():
+    if not settings.HOME_ELECTIONS_VERSION_CACHE_TIMEOUT:
+        return CacheVersion.get(HOME_ELECTIONS_VERSION)
+    version = cache.get(HOME_ELECTIONS_VERSION_CACHE_KEY)
+    if version is None:
+        version = CacheVersion.get(HOME_ELECTIONS_VERSION)
+        cache.set(HOME_ELECTIONS_VERSION_CACHE_KEY, version, settings.HOME_ELECTIONS_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def bump_home_elections_version():
+    '''
+    Called whenever an election is saved or deleted. This worker sees the
+    change right away, the others once their copy of the version expires.
+    '''
+    CacheVersion.bump(HOME_ELECTIONS_VERSION)
+    cache.delete(HOME_ELECTIONS_VERSION_CACHE_KEY)
+
+
+def refresh_home_elections(version):
+    '''
+    Stores every published and highlighted election, to sample from, and
+    the last five published ones, as of version.
+    '''
+    published = Election.objects.filter(published=True).select_related('owner')
+    home_elections = {
+        'highlighted': list(published.filter(highlighted=True).order_by('pk')),
+        'last': list(published.order_by('-created_at')[:5]),
+    }
+    home_elections['version'] = version
+    cache.set(HOME_ELECTIONS_CACHE_KEY, home_elections, settings.HOME_ELECTIONS_CACHE_TIMEOUT)
+    return home_elections
+
+
+def get_home_elections():
+    '''
+    The cached home elections, recomputed if any election changed since,
+    whichever worker changed it.
+    '''
+    version = get_home_elections_version()
+    home_elections = cache.get(HOME_ELECTIONS_CACHE_KEY)
+    if home_elections is None or home_elections['version'] != version:
+        home_elections = refresh_home_elections(version)
+    return home_elections
+
+
+def get_highlighted_elections(home_elections, count=5):
+    '''
+    count highlighted elections of home_elections picked at random.
+    '''
+    highlighted = home_elections['highlighted']
+    return random.sample(highlighted, min(count, len(highlighted)))
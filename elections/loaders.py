@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+
+def get_candidate_profile(context, candidate):
+    '''
+    Returns the CandidateProfile of the candidate shared by every template
+    tag rendered for the same request, so a page that asks for many values
+    of one candidate loads each kind of value only once.
+    '''
+    profile = getattr(candidate, '_profile', None)
+    if profile is not None:
+        return profile
+    request = context.get('request')
+    if request is None:
+        return candidate.get_profile()
+    if not hasattr(request, '_candidate_profiles'):
+        request._candidate_profiles = {}
+    profile = request._candidate_profiles.get(candidate.pk)
+    if profile is None:
+        profile = request._candidate_profiles[candidate.pk] = candidate.get_profile()
+    return profile
+
+
+def get_candidate_answers(context, candidate):
+    '''
+    Returns the {question id: Answer} index of the candidate shared by every
+    template tag rendered for the same request.
+    '''
+    if hasattr(candidate, '_answers_by_question'):
+        return candidate._answers_by_question
+    request = context.get('request')
+    if request is None:
+        return candidate.get_answers_by_question()
+    if not hasattr(request, '_candidate_answers'):
+        request._candidate_answers = {}
+    answers = request._candidate_answers.get(candidate.pk)
+    if answers is None:
+        answers = request._candidate_answers[candidate.pk] = candidate.get_answers_by_question()
+    return answers
@@ -0,0 +1,24 @@
+# coding= utf-8
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from elections.models import Election
+from elections.telemetry import compact_visitors
+
+
+class Command(BaseCommand):
+    args = '[<election_id> ...]'
+    help = 'Stores the media naranja visitors of the elections (all of them by default) as CompactVisitor rows'
+    option_list = BaseCommand.option_list + (
+        make_option('--delete', action='store_true', dest='delete', default=False,
+                    help='Delete the Visitor rows once they are compacted'),
+    )
+
+    def handle(self, *args, **options):
+        elections = Election.objects.order_by('pk')
+        if args:
+            elections = elections.filter(pk__in=args)
+        for election in elections:
+            count = compact_visitors(election, delete=options['delete'])
+            if count:
+                self.stdout.write('%s: %d visitors\n' % (election.slug, count))
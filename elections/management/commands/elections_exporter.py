@@ -0,0 +1,37 @@
+# coding= utf-8
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from elections.exporter import export_election
+from elections.models import Election
+
+
+class Command(BaseCommand):
+    args = '<username> <election_slug> <output_dir>'
+    help = 'Renders every public page of a published election to static HTML and JSON files'
+    option_list = BaseCommand.option_list + (
+        make_option('--processes', type='int', dest='processes', default=None,
+                    help='Number of processes rendering pages, all CPUs by default'),
+        make_option('--base-url', dest='base_url', default='',
+                    help='URL the output directory is served from, internal links are rewritten to it'),
+        make_option('--origin', dest='origin', default=None,
+                    help='URL of the Django site, for links to pages that are not exported. '
+                         'http://<domain of the current Site> by default'),
+        make_option('--incremental', action='store_true', dest='incremental', default=False,
+                    help='Only write the pages that changed since the last export to output_dir'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 3:
+            raise CommandError('Usage: elections_exporter %s' % self.args)
+        username, election_slug, output_dir = args
+        try:
+            election = Election.objects.get(owner__username=username, slug=election_slug, published=True)
+        except Election.DoesNotExist:
+            raise CommandError('There is no published election %s/%s' % (username, election_slug))
+        report = export_election(election, output_dir, base_url=options['base_url'], origin=options['origin'],
+                                 processes=options['processes'], incremental=options['incremental'])
+        for key in ('written', 'unchanged', 'deleted', 'failed'):
+            self.stdout.write('%s: %d\n' % (key, len(report[key])))
+        for url in report['failed']:
+            self.stderr.write('Could not render %s\n' % url)
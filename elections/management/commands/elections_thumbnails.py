@@ -0,0 +1,28 @@
+# coding= utf-8
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from elections.models import Election
+from elections.thumbnails import ThumbnailGenerator, CANDIDATE_PHOTO_THUMBNAILS, ELECTION_LOGO_THUMBNAILS
+
+
+class Command(BaseCommand):
+    args = '[<election_id> ...]'
+    help = 'Generates the missing thumbnails of the candidate photos and logos of the elections (all of them by default)'
+    option_list = BaseCommand.option_list + (
+        make_option('--workers', type='int', dest='workers', default=4,
+                    help='Number of threads generating thumbnails'),
+    )
+
+    def handle(self, *args, **options):
+        elections = Election.objects.order_by('pk')
+        if args:
+            elections = elections.filter(pk__in=args)
+        generator = ThumbnailGenerator(mode='pool', workers=options['workers'])
+        for election in elections:
+            generator.enqueue_thumbnails(election.logo, ELECTION_LOGO_THUMBNAILS)
+            candidates = election.candidate_set.exclude(photo='')
+            for candidate in candidates:
+                generator.enqueue_thumbnails(candidate.photo, CANDIDATE_PHOTO_THUMBNAILS)
+            self.stdout.write('%s: %d photos\n' % (election.slug, len(candidates)))
+        generator.shutdown()
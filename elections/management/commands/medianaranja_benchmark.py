@@ -0,0 +1,41 @@
+# coding= utf-8
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import simplejson as json
+from elections.benchmark import DEFAULT_SIZES, run_benchmark
+
+
+class Command(BaseCommand):
+    args = '[<candidates>,<categories>,<questions per category>,<answers per question> ...]'
+    help = 'Times the media naranja views on synthetic elections created in a throwaway test database'
+    option_list = BaseCommand.option_list + (
+        make_option('--repeat', type='int', dest='repeat', default=10,
+                    help='Number of requests measured for every view and size'),
+        make_option('--seed', type='int', dest='seed', default=0),
+        make_option('--output', dest='output', default=None,
+                    help='Write the JSON report to this file instead of the standard output'),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [tuple(int(value) for value in size.split(',')) for size in args] or DEFAULT_SIZES
+        except ValueError:
+            raise CommandError('Sizes look like 50,5,10,4')
+        if any(len(size) != 4 for size in sizes):
+            raise CommandError('Sizes look like 50,5,10,4')
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0)
+        try:
+            report = run_benchmark(sizes, options['repeat'], options['seed'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = open(options['output'], 'w') if options['output'] else sys.stdout
+        json.dump(report, output, indent=2, sort_keys=True)
+        output.write('\n')
+        if options['output']:
+            output.close()
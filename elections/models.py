@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 
 import os
+import random
 import re
+import time
+from datetime import datetime
 from django.db import models
 from django.conf import settings
 from django.forms import ModelForm
@@ -10,8 +13,9 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
 from django.utils.translation import ugettext_lazy as _
 from django.template.defaultfilters import slugify
-from django.db.models.signals import  post_save
+from django.db.models.signals import  post_save, post_delete, m2m_changed
 from django.dispatch.dispatcher import receiver
+from django.utils import simplejson as json
 from unidecode import unidecode
 
 
@@ -20,6 +24,14 @@ twitter_regexp = re.compile(r"^https?://[^/]*(t\.co|twitter\.com)(/.*|/?)")
 http_regexp = re.compile(r"^(ht|f)tps?://.*")
 
 
+def new_election_version():
+    '''
+    Versions of new elections start at the current time in microseconds, so
+    they do not repeat the versions of a deleted election with the same id.
+    '''
+    return int(time.time() * 1000000)
+
+
 # Create your models here.
 class Election(models.Model):
     name = models.CharField(max_length=255, verbose_name=_(u"NOMBRE DE LA ELECCIÓN:"))
@@ -30,6 +42,10 @@ class Election(models.Model):
     logo = models.ImageField(upload_to = 'logos/', blank = True, verbose_name=_(u"por último escoge una imagen que la represente:"))
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True, editable=False)
+    # Goes up by one on every change to the election or anything in it (see
+    # touch_election). Everything cached for an election is keyed on it:
+    # updated_at can not be, MySQL drops its microseconds.
+    version = models.BigIntegerField(default=new_election_version, editable=False)
     date = models.CharField(max_length=255, verbose_name=_(u"fecha en que ocurrirá:"), blank=True)
     published = models.BooleanField(default=False)
     custom_style = models.TextField(blank=True)
@@ -63,6 +79,15 @@ class Election(models.Model):
     def __init__(self, *args, **kwargs):
         super(Election, self).__init__(*args, **kwargs)
         self.set_slug()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            # Incremented in the database, so a version read before a
+            # concurrent touch_election is never written back
+            self.version = models.F('version') + 1
+        super(Election, self).save(*args, **kwargs)
+        if not isinstance(self.version, (int, long)):
+            self.version = Election.objects.filter(pk=self.pk).values_list('version', flat=True)[0]
         
         
         
@@ -104,13 +129,14 @@ class Candidate(models.Model):
         unique_together = (('slug', 'election'), ('name', 'election'))
 
     def associate_answer(self, answer):
-        old_answers = self.answers.filter(question=answer.question).all()
-        new_answers = []
-        for ans in self.answers.all():
-            if ans not in old_answers:
-                new_answers.append(ans)
-        new_answers.append(answer)
-        self.answers = new_answers
+        chosen_answers = list(self.answers.filter(question=answer.question_id))
+        if chosen_answers == [answer]:
+            return
+        old_answers = [chosen_answer for chosen_answer in chosen_answers if chosen_answer != answer]
+        if old_answers:
+            self.answers.remove(*old_answers)
+        if answer not in chosen_answers:
+            self.answers.add(answer)
         self.save()
 
     def get_number_of_questions_by_category(self):
@@ -186,51 +212,49 @@ class Candidate(models.Model):
         personal_data = PersonalDataCandidate(personal_data=personal_data, candidate=self, value=value)
         personal_data.save()
 
+    def get_profile(self):
+        '''
+        Returns the CandidateProfile attached by load_profile, or a fresh one.
+        '''
+        profile = getattr(self, '_profile', None)
+        if profile is None:
+            profile = CandidateProfile(self)
+        return profile
+
+    def load_profile(self):
+        '''
+        Loads the personal data and backgrounds of the candidate once and
+        keeps them for the rest of the life of this instance, for views that
+        read them many times while rendering.
+        '''
+        self._profile = CandidateProfile(self)
+        return self._profile
+
     @property
     def get_background(self):
-        backgrounds = {}
-        category_counter = 0
-        for backgroundcategory in self.election.backgroundcategory_set.all():
-            category_counter = category_counter + 1
-            backgrounds[category_counter] = {'name':backgroundcategory.name, 'backgrounds':None}
-            temporary_backgrounds = {}
-            backgrounds_counter = 0
-            for background in backgroundcategory.background_set.all():
-                backgrounds_counter = backgrounds_counter + 1
-                what_the_candidate_answered = self.get_answer_for_background(background)
-                temporary_backgrounds[backgrounds_counter] = {
-                                                    'name':background.name, 
-                                                    'value':what_the_candidate_answered
-                                                    }
-            backgrounds[category_counter]['backgrounds'] = temporary_backgrounds
-        return backgrounds
-        
-        
+        return self.get_profile().background
+
     def get_answer_for_background(self, background):
-        try:
-            return self.backgroundcandidate_set.get(background=background).value
-        except:
-            return None
+        return self.get_profile().background_values.get(background.pk)
 
     @property
     def get_personal_data(self):
-        pd_dict = {}
-        for pd in self.election.personaldata_set.all():
-            try:
-                pd_dict[pd.label] = self.personaldatacandidate_set.get(personal_data = pd).value
-            except :
-                pd_dict[pd.label] = None
-        return pd_dict
+        return self.get_profile().personal_data
 
     def get_questions_by_category(self, category):
         return category.question_set.all()
 
+    def get_answers_by_question(self):
+        '''
+        Returns {question id: Answer} with the answers of the candidate,
+        loaded once per instance unless prefetch_answers already did.
+        '''
+        if not hasattr(self, '_answers_by_question'):
+            prefetch_answers([self])
+        return self._answers_by_question
+
     def get_answer_by_question(self, question):
-        candidate_answers = self.answers
-        for answer in candidate_answers.all():
-            if answer.question == question:
-                return answer
-        return "no answer"
+        return self.get_answers_by_question().get(question.pk, "no answer")
 
     def get_all_answers_by_category(self, category):
         all_answers = []
@@ -253,6 +277,82 @@ class Candidate(models.Model):
         return self.name
 
 
+def prefetch_answers(candidates):
+    '''
+    Loads the answers of all the candidates with a single query, see
+    Candidate.get_answers_by_question. Returns the candidates as a list.
+    '''
+    candidates = list(candidates)
+    candidates_by_pk = {}
+    for candidate in candidates:
+        candidate._answers_by_question = {}
+        candidates_by_pk.setdefault(candidate.pk, []).append(candidate)
+    links = Candidate.answers.through.objects.filter(candidate__in=list(candidates_by_pk)).select_related('answer')
+    for link in links.order_by('answer'):
+        # The lowest answer wins if a candidate chose more than one for a question
+        for candidate in candidates_by_pk[link.candidate_id]:
+            candidate._answers_by_question.setdefault(link.answer.question_id, link.answer)
+    return candidates
+
+
+class CandidateProfile(object):
+    '''
+    Personal data and backgrounds of a candidate, joined in memory against
+    the definitions of its election. Each of them is loaded with one to
+    three queries the first time it is read.
+    '''
+
+    def __init__(self, candidate):
+        self.candidate_id = candidate.pk
+        self.election_id = candidate.election_id
+
+    def get_values(self, pairs):
+        # Values stored more than once are ambiguous and read as None
+        values = {}
+        for key, value in pairs:
+            values[key] = None if key in values else value
+        return values
+
+    @property
+    def personal_data_values(self):
+        if not hasattr(self, '_personal_data_values'):
+            self._personal_data_values = self.get_values(PersonalDataCandidate.objects.filter(
+                candidate=self.candidate_id).values_list('personal_data_id', 'value'))
+        return self._personal_data_values
+
+    @property
+    def personal_data(self):
+        if not hasattr(self, '_personal_data'):
+            self._personal_data = {}
+            for personal_data_id, label in PersonalData.objects.filter(
+                    election=self.election_id).order_by('pk').values_list('pk', 'label'):
+                self._personal_data[label] = self.personal_data_values.get(personal_data_id)
+        return self._personal_data
+
+    @property
+    def background_values(self):
+        if not hasattr(self, '_background_values'):
+            self._background_values = self.get_values(BackgroundCandidate.objects.filter(
+                candidate=self.candidate_id).values_list('background_id', 'value'))
+        return self._background_values
+
+    @property
+    def background(self):
+        if not hasattr(self, '_background'):
+            backgrounds_by_category = {}
+            for background_id, category_id, name in Background.objects.filter(
+                    category__election=self.election_id).order_by('pk').values_list('pk', 'category_id', 'name'):
+                backgrounds_by_category.setdefault(category_id, []).append((background_id, name))
+            self._background = {}
+            categories = BackgroundCategory.objects.filter(election=self.election_id).order_by('pk').values_list('pk', 'name')
+            for category_counter, (category_id, category_name) in enumerate(categories):
+                backgrounds = {}
+                for background_counter, (background_id, name) in enumerate(backgrounds_by_category.get(category_id, ())):
+                    backgrounds[background_counter + 1] = {'name': name, 'value': self.background_values.get(background_id)}
+                self._background[category_counter + 1] = {'name': category_name, 'backgrounds': backgrounds}
+        return self._background
+
+
 class PersonalData(models.Model):
     label = models.CharField(_('Nuevo dato personal'),max_length=255)
     election = models.ForeignKey('Election')
@@ -393,6 +493,112 @@ class CategoryScore(models.Model):
     category_score = models.IntegerField()
     category_name = models.CharField(max_length=255)       
 
+
+def pack_integers(values):
+    return u','.join(unicode(int(value)) for value in values)
+
+def unpack_integers(packed):
+    if not packed:
+        return []
+    return [int(value) for value in packed.split(',')]
+
+
+class ElectionSnapshot(models.Model):
+    """
+    Questions, answers, candidates and categories of an election as they
+    were when the CompactVisitor rows pointing to it were stored.
+    """
+    election = models.ForeignKey('Election')
+    fingerprint = models.CharField(max_length=40)
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+
+    class Meta:
+        unique_together = ('election', 'fingerprint')
+
+    def get_content(self):
+        if not hasattr(self, '_content'):
+            self._content = json.loads(self.content)
+        return self._content
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.election, self.created_at)
+
+
+class CompactVisitor(models.Model):
+    """
+    One media naranja submission in a single row. answers and importances
+    are packed in the order of the snapshot questions (-1 for a skipped
+    question); scores holds, for every snapshot candidate, the global score
+    followed by one score per snapshot category.
+    """
+    election = models.ForeignKey('Election')
+    snapshot = models.ForeignKey('ElectionSnapshot')
+    election_url = models.CharField(max_length=255)
+    datestamp = models.DateTimeField()
+    answers = models.TextField()
+    importances = models.TextField()
+    scores = models.TextField()
+    # Id of the Visitor this row was compacted from by compact_visitors,
+    # None for submissions stored compact in the first place
+    source_visitor_id = models.IntegerField(null=True, blank=True, db_index=True, editable=False)
+
+    def expand(self):
+        """
+        Returns the submission as unsaved Visitor, VisitorAnswer, VisitorScore
+        and CategoryScore objects: (visitor, answers, [(score, category_scores), ...])
+        """
+        content = self.snapshot.get_content()
+        visitor = Visitor(election_id=self.election_id, election_url=self.election_url, datestamp=self.datestamp)
+        answers = []
+        for question, answer_id, importance in zip(content['questions'], unpack_integers(self.answers), unpack_integers(self.importances)):
+            answers.append(VisitorAnswer(visitor=visitor,
+                                         answer_text=question['answers'].get(unicode(answer_id), u''),
+                                         question_text=question['question'],
+                                         question_category_text=question['category'],
+                                         answer_importance=importance))
+        scores = []
+        values = unpack_integers(self.scores)
+        width = len(content['categories']) + 1
+        for i, candidate_name in enumerate(content['candidates']):
+            row = values[i * width:(i + 1) * width]
+            visitor_score = VisitorScore(visitor=visitor, candidate_name=candidate_name, score=row[0])
+            category_scores = [CategoryScore(visitor_score=visitor_score, category_name=category_name, category_score=category_score)
+                               for category_name, category_score in zip(content['categories'], row[1:])]
+            scores.append((visitor_score, category_scores))
+        return visitor, answers, scores
+
+    def __unicode__(self):
+        return unicode(self.datestamp) + u' - ' + self.election_url
+
+
+class CacheVersion(models.Model):
+    """
+    Version of data every worker caches on its own that does not belong to
+    a single election, e.g. the home page elections. Kept in the database
+    so a change made by one worker is seen by all of them.
+
+    Versions are only compared for equality. Every bump picks a random one,
+    so a bump rolled back with its transaction is not repeated by the next.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    @classmethod
+    def get(cls, name):
+        for version in cls.objects.filter(name=name).values_list('version', flat=True):
+            return version
+        return 0
+
+    @classmethod
+    def bump(cls, name):
+        version = random.randint(1, 2 ** 62)
+        if not cls.objects.filter(name=name).update(version=version):
+            cls.objects.get_or_create(name=name, defaults={'version': version})
+
+    def __unicode__(self):
+        return u'%s: %d' % (self.name, self.version)
+
     
 
 
@@ -421,8 +627,95 @@ def create_default_questions(sender, instance, created, **kwargs):
                 for default_answer in default_question['answers']:
                     Answer.objects.create(question=question, caption=default_answer)
 
+@receiver(post_save, sender=Election)
+@receiver(post_delete, sender=Election)
+def home_elections_changed(sender, instance, **kwargs):
+    from elections.home import bump_home_elections_version
+    bump_home_elections_version()
+
+def touch_election(**filters):
+    '''
+    Bumps the version of the matching elections so everything cached
+    against their previous version (compiled questionnaires, media naranja
+    results, rendered pages...) is rebuilt.
+
+    Every model that hangs off Election touches it when saved or deleted.
+    '''
+    Election.objects.filter(**filters).update(version=models.F('version') + 1, updated_at=datetime.now())
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    touch_election(pk=instance.election_id)
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    touch_election(category=instance.category_id)
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def answer_changed(sender, instance, **kwargs):
+    touch_election(category__question=instance.question_id)
+
+@receiver(post_save, sender=Candidate)
+def candidate_saved(sender, instance, created, **kwargs):
+    from elections.answer_index import patch_answer_index
+    if created:
+        touch_election(pk=instance.election_id)
+    else:
+        # The answers of the candidate did not change
+        patch_answer_index(instance.election_id)
+
+@receiver(post_delete, sender=Candidate)
+def candidate_deleted(sender, instance, **kwargs):
+    touch_election(pk=instance.election_id)
+
+@receiver(m2m_changed, sender=Candidate.answers.through)
+def candidate_answers_changed(sender, instance, action, pk_set, **kwargs):
+    from elections.answer_index import patch_answer_index
+    if not action.startswith('post_'):
+        return
+    if not isinstance(instance, Candidate):
+        touch_election(category__question=instance.question_id)
+        return
+    # The answers loaded by get_answers_by_question are stale now
+    instance.__dict__.pop('_answers_by_question', None)
+    if action == 'post_add':
+        patch_answer_index(instance.election_id, lambda index: index.add(instance.pk, pk_set))
+    elif action == 'post_remove':
+        patch_answer_index(instance.election_id, lambda index: index.remove(instance.pk, pk_set))
+    else:
+        patch_answer_index(instance.election_id, lambda index: index.clear(instance.pk))
+
+@receiver(post_save, sender=PersonalData)
+@receiver(post_delete, sender=PersonalData)
+@receiver(post_save, sender=BackgroundCategory)
+@receiver(post_delete, sender=BackgroundCategory)
+def election_data_changed(sender, instance, **kwargs):
+    touch_election(pk=instance.election_id)
+
+@receiver(post_save, sender=Background)
+@receiver(post_delete, sender=Background)
+def background_changed(sender, instance, **kwargs):
+    touch_election(backgroundcategory=instance.category_id)
+
+@receiver(post_save, sender=PersonalDataCandidate)
+@receiver(post_delete, sender=PersonalDataCandidate)
+@receiver(post_save, sender=BackgroundCandidate)
+@receiver(post_delete, sender=BackgroundCandidate)
+@receiver(post_save, sender=Link)
+@receiver(post_delete, sender=Link)
+def candidate_data_changed(sender, instance, **kwargs):
+    touch_election(candidate=instance.candidate_id)
+
 
 class InformationSource(models.Model):
     question = models.ForeignKey(Question)
     candidate = models.ForeignKey(Candidate)
-    content = models.TextField()
\ No newline at end of file
+    content = models.TextField()
+
+@receiver(post_save, sender=InformationSource)
+@receiver(post_delete, sender=InformationSource)
+def information_source_changed(sender, instance, **kwargs):
+    touch_election(candidate=instance.candidate_id)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+from elections.models import Election
+from elections.thumbnails import reset_pending_thumbnails, rendered_pending_thumbnails
+
+
+def get_page_cache_key(election_id, version, request):
+    # Pages hold absolute URLs, so the host and scheme are part of the key
+    url = u'%s://%s%s' % ('https' if request.is_secure() else 'http', request.get_host(), request.get_full_path())
+    return 'election-page:%d:%d:%s' % (election_id, version, hashlib.md5(url.encode('utf-8')).hexdigest())
+
+
+def get_election_version(request, kwargs):
+    '''
+    Returns (id, version, updated_at, published) of the election the public
+    URL kwargs point to, or None. It is looked up once per request.
+    '''
+    if not hasattr(request, '_election_version'):
+        request._election_version = None
+        slug = kwargs.get('election_slug', kwargs.get('slug'))
+        elections = Election.objects.filter(owner__username=kwargs.get('username'), slug=slug)
+        for election_version in elections.values_list('pk', 'version', 'updated_at', 'published')[:1]:
+            request._election_version = election_version
+    return request._election_version
+
+
+def get_published_election_version(request, kwargs):
+    '''
+    Returns (id, version) of the published election the public URL
+    kwargs point to, or None.
+    '''
+    election_version = get_election_version(request, kwargs)
+    if election_version is None or not election_version[3]:
+        return None
+    return election_version[:2]
+
+
+def election_etag(request, *args, **kwargs):
+    election_version = get_election_version(request, kwargs)
+    if election_version is None:
+        return None
+    return '%d-%d' % election_version[:2]
+
+
+def election_last_modified(request, *args, **kwargs):
+    election_version = get_election_version(request, kwargs)
+    if election_version is None:
+        return None
+    return election_version[2]
+
+
+# Conditional GET for the public JSON endpoints: every change to an
+# election, its candidates included, bumps its version
+condition_on_election_version = condition(etag_func=election_etag, last_modified_func=election_last_modified)
+
+
+def cache_election_page(view):
+    '''
+    Caches the pages of published elections rendered for anonymous GET
+    requests, keyed by the election version, so every edit to the election
+    shows up on the next request.
+
+    Responses that set cookies, hand out a CSRF token or show an image in
+    place of a thumbnail still being generated are never cached.
+    '''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated() or not settings.ELECTION_PAGE_CACHE_TIMEOUT:
+            return view(request, *args, **kwargs)
+        election_version = get_published_election_version(request, kwargs)
+        if election_version is None:
+            return view(request, *args, **kwargs)
+
+        key = get_page_cache_key(election_version[0], election_version[1], request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content)
+            for header, value in headers:
+                response[header] = value
+            return response
+
+        reset_pending_thumbnails()
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        if response.status_code == 200 and not response.cookies and not request.META.get('CSRF_COOKIE_USED') \
+                and not rendered_pending_thumbnails():
+            cache.set(key, (response.content, response.items()), settings.ELECTION_PAGE_CACHE_TIMEOUT)
+        return response
+    return wrapper
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import base64
+from urllib import urlencode
+
+from tastypie.exceptions import BadRequest
+from tastypie.paginator import Paginator
+
+
+def encode_cursor(pk):
+    return base64.urlsafe_b64encode(str(pk)).rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(str(cursor) + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError, UnicodeEncodeError):
+        raise BadRequest("Invalid cursor provided.")
+
+
+class KeysetPaginator(Paginator):
+    '''
+    Paginator that pages by primary key when the client asks for it with a
+    "cursor" parameter, empty for the first page:
+
+        /api/v2/answer/?cursor=&limit=100
+
+    Pages come ordered by primary key, without a total count, and meta.next
+    holds the url of the next page, or None after the last one. Every page
+    costs the same whatever its depth, unlike offset pages. Without a cursor
+    it pages with limit and offset like tastypie's Paginator.
+    '''
+
+    def page(self):
+        if 'cursor' not in self.request_data:
+            return super(KeysetPaginator, self).page()
+        limit = self.get_limit()
+        objects = self.objects.order_by('pk')
+        cursor = self.request_data['cursor']
+        if cursor:
+            objects = objects.filter(pk__gt=decode_cursor(cursor))
+        if limit:
+            objects = list(objects[:limit + 1])
+            has_next = len(objects) > limit
+            objects = objects[:limit]
+        else:
+            objects = list(objects)
+            has_next = False
+        return {
+            self.collection_name: objects,
+            'meta': {
+                'limit': limit,
+                'next': self.get_next_cursor_uri(limit, objects[-1].pk) if has_next else None,
+            },
+        }
+
+    def get_next_cursor_uri(self, limit, last_pk):
+        if self.resource_uri is None:
+            return None
+        request_params = dict((key, value.encode('utf-8') if isinstance(value, unicode) else value)
+                              for key, value in self.request_data.items())
+        request_params.update({'limit': limit, 'cursor': encode_cursor(last_pk)})
+        request_params.pop('offset', None)
+        return '%s?%s' % (self.resource_uri, urlencode(request_params))
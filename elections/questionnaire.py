@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+from django.conf import settings
+
+from elections.cache import LRUCache
+from elections.exceptions import InvalidAnswersError
+from elections.models import Category, Question, Answer
+
+
+# What a visitor answered, one position per question of the questionnaire.
+# answer_ids holds None for the questions the visitor skipped.
+AnswerVector = namedtuple('AnswerVector', ['question_ids', 'answer_ids', 'importances'])
+
+
+class Questionnaire(object):
+    '''
+    Read only snapshot of the category -> question -> answer tree of an
+    election, numbered the way the media naranja form numbers its questions.
+    '''
+
+    def __init__(self, election):
+        self.election_id = election.pk
+        self.version = election.version
+
+        categories = list(Category.objects.filter(election=election))
+        questions_by_category = dict((category.pk, []) for category in categories)
+        for question in Question.objects.filter(category__election=election).order_by('pk'):
+            questions_by_category[question.category_id].append(question)
+        answers_by_question = {}
+        for answer in Answer.objects.filter(question__category__election=election).order_by('pk'):
+            answers_by_question.setdefault(answer.question_id, []).append(answer)
+
+        categories_by_id = dict((category.pk, category) for category in categories)
+        questions = []
+        stt = []
+        for category in categories:
+            numbered_questions = []
+            for question in questions_by_category[category.pk]:
+                # The questions are already loaded, avoid a query per question
+                question._category_cache = categories_by_id[question.category_id]
+                answers = tuple(answers_by_question.get(question.pk, ()))
+                for answer in answers:
+                    answer._question_cache = question
+                numbered_questions.append((len(questions), question, answers))
+                questions.append(question)
+            stt.append((category, tuple(numbered_questions)))
+
+        self.categories = tuple(categories)
+        self.questions = tuple(questions)
+        self.questions_by_id = dict((question.pk, question) for question in questions)
+        self.answers_by_question = dict((question_id, tuple(answers)) for question_id, answers in answers_by_question.items())
+        self.answers_by_id = dict((answer.pk, answer) for answers in answers_by_question.values() for answer in answers)
+        # (category, ((number, question, answers), ...)) as the media naranja templates expect it
+        self.stt = tuple(stt)
+        self.check = len(questions) > 0
+        # ((question_text, category_text, ((answer_id, caption), ...)), ...) as plain values
+        self.outline = tuple((question.question, question.category.name,
+                              tuple((answer.pk, answer.caption) for answer in answers_by_question.get(question.pk, ())))
+                             for question in questions)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def decode(self, dictionary):
+        '''
+        Reads the question-N, question-id-N and importance-N fields sent by
+        the media naranja form into an AnswerVector.
+
+        Raises InvalidAnswersError if a field is missing or malformed, if
+        question-id-N is not the Nth question of this election or if an
+        answer is not an answer to its question.
+        '''
+        question_ids = []
+        answer_ids = []
+        importances = []
+        for number in range(len(self.questions)):
+            try:
+                question_id = int(dictionary['question-id-%d' % number])
+                importance = int(dictionary['importance-%d' % number])
+                answer_id = int(dictionary.get('question-%d' % number, -1))
+            except (KeyError, TypeError, ValueError):
+                raise InvalidAnswersError(u"Invalid value for question %d" % number)
+            if question_id != self.questions[number].pk:
+                # Importances and compact visitors go by position
+                raise InvalidAnswersError(u"Question %d is not question %d of this election" % (question_id, number))
+            if answer_id == -1:
+                answer_id = None
+            elif answer_id not in self.answers_by_id or self.answers_by_id[answer_id].question_id != question_id:
+                raise InvalidAnswersError(u"Answer %d is not an answer to question %d" % (answer_id, question_id))
+            question_ids.append(question_id)
+            answer_ids.append(answer_id)
+            importances.append(importance)
+        return AnswerVector(tuple(question_ids), tuple(answer_ids), tuple(importances))
+
+
+_questionnaires = LRUCache(settings.QUESTIONNAIRE_CACHE_SIZE)
+
+
+def get_questionnaire(election):
+    '''
+    Returns the Questionnaire of the election, compiled at most once per
+    worker and election version.
+
+    Saving or deleting a Category, Question or Answer bumps the
+    version of its election (see elections.models), which makes the
+    cached questionnaire stale in every worker.
+    '''
+    questionnaire = _questionnaires.get(election.pk)
+    if questionnaire is None or questionnaire.version != election.version:
+        questionnaire = Questionnaire(election)
+        _questionnaires.set(election.pk, questionnaire)
+    return questionnaire
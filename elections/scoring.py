@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import heapq
+
+from django.conf import settings
+
+from elections.answer_index import AnswerIndex, get_answer_index, iter_bits
+from elections.cache import LRUCache
+from elections.questionnaire import get_questionnaire
+
+
+class ScoringMatrix(object):
+    '''
+    Candidate x answer match matrix for one election.
+
+    It is built from the compiled questionnaire and the answer index of the
+    election, plus one query for the candidates, and then scores every
+    candidate at once, giving the same results as Candidate.get_score.
+    '''
+
+    def __init__(self, election, candidates=None):
+        if candidates is None:
+            candidates = election.candidate_set.all()
+        self.election = election
+        self.candidates = list(candidates)
+
+        questionnaire = get_questionnaire(election)
+        # Number of questions per category, in category order
+        self.category_sizes = [len(questions) for category, questions in questionnaire.stt]
+        # answer id -> position of the category it belongs to
+        self.answer_categories = {}
+        for position, (category, questions) in enumerate(questionnaire.stt):
+            for number, question, answers in questions:
+                for answer in answers:
+                    self.answer_categories[answer.pk] = position
+
+        self.index = get_answer_index(election)
+        if any(candidate.pk not in self.index.positions for candidate in self.candidates):
+            # Candidates created after the election was loaded
+            self.index = AnswerIndex(election.pk, None)
+        # Position in self.candidates of the candidate in every index position
+        self.matrix_positions = dict((self.index.positions[candidate.pk], position)
+                                     for position, candidate in enumerate(self.candidates))
+
+    def get_importances_by_category(self, importances):
+        importances_by_category = []
+        index = 0
+        for size in self.category_sizes:
+            category_importance = 0.0
+            for i in range(size):
+                category_importance += importances[index]
+                index += 1
+            importances_by_category.append(category_importance)
+        return importances_by_category
+
+    def get_sums_by_category(self, answers, importances):
+        '''
+        Returns one row per category holding, for every candidate, the sum
+        of the importances of the answers the candidate shares with the visitor.
+        '''
+        sums = [[0] * len(self.candidates) for size in self.category_sizes]
+        for answer, importance in zip(answers, importances):
+            if len(answer) == 0:
+                continue
+            answer_id = answer[0].pk
+            bitset = self.index.get(answer_id)
+            if not bitset:
+                continue
+            row = sums[self.answer_categories[answer_id]]
+            for index_position in iter_bits(bitset):
+                position = self.matrix_positions.get(index_position)
+                if position is not None:
+                    row[position] += importance
+        return sums
+
+    def score(self, answers, importances):
+        '''
+        Scores every candidate of the matrix against the answers and
+        importances of a visitor.
+
+        Returns a list of (global_score, scores_by_category) tuples in the
+        same order as self.candidates.
+        '''
+        importances_by_category = self.get_importances_by_category(importances)
+        sums = self.get_sums_by_category(answers, importances)
+        total_importance = sum(importances)
+        scores = []
+        for position in range(len(self.candidates)):
+            sum_by_category = [row[position] for row in sums]
+            scores_by_category = []
+            for i in range(len(sum_by_category)):
+                if importances_by_category[i] != 0:
+                    scores_by_category.append(sum_by_category[i] * 100.0 / importances_by_category[i])
+                else:
+                    scores_by_category.append(0)
+            if len(importances) > 0 and total_importance != 0:
+                global_score = sum(sum_by_category) * 100.0 / total_importance
+            else:
+                global_score = 0
+            scores.append((global_score, scores_by_category))
+        return scores
+
+
+def ranking_key(score_and_candidate):
+    # Best global score first, then best category scores, then the oldest candidate
+    global_score, scores_by_category, candidate = score_and_candidate
+    return (global_score, scores_by_category, -candidate.pk)
+
+
+def rank(scores_and_candidates, k=None):
+    '''
+    Returns the k best matches of scores_and_candidates, all of them if k
+    is None, from best to worst. Ties are always broken the same way.
+    '''
+    if k is None or k >= len(scores_and_candidates):
+        return sorted(scores_and_candidates, key=ranking_key, reverse=True)
+    return heapq.nlargest(k, scores_and_candidates, key=ranking_key)
+
+
+# (election id, election version, answer ids, importances) -> scores_and_candidates
+_results = LRUCache(settings.MEDIANARANJA_RESULT_CACHE_SIZE)
+
+
+def get_scores_and_candidates(election, answers, importances, k=None, matrix=None):
+    '''
+    Scores every candidate of the election against the answers and
+    importances of a visitor.
+
+    Returns ([global_score, scores_by_category, candidate], ...) in candidate
+    order and the k best of them (see rank). The scores are shared with
+    every other visitor that sent the same answers for the same election
+    version, so they must not be modified.
+
+    Callers scoring many visitors at once can pass a ScoringMatrix of all
+    the candidates of the election to avoid building one for every cache
+    miss.
+    '''
+    answer_ids = tuple(answer[0].pk if answer else None for answer in answers)
+    key = (election.pk, election.version, answer_ids, tuple(importances))
+    scores_and_candidates = _results.get(key)
+    if scores_and_candidates is None:
+        if matrix is None:
+            matrix = ScoringMatrix(election)
+        scores_and_candidates = []
+        for candidate, score in zip(matrix.candidates, matrix.score(answers, importances)):
+            scores_and_candidates.append([score[0], score[1], candidate])
+        _results.set(key, scores_and_candidates)
+    return scores_and_candidates, rank(scores_and_candidates, k)
@@ -0,0 +1,90 @@
+/*
+ * Renders an election from its embed bundle with a single request.
+ *
+ *   <div class="candideitorg-embed" data-bundle="http://candideit.org/joe/my-election/embeded/bundle.json"></div>
+ *   <script src="http://candideit.org/static/js/candideitorg-embed.js"></script>
+ *
+ * Every element with the candideitorg-embed class is filled with the
+ * candidates, their personal data and their answers to every question.
+ */
+(function () {
+    function escape(text) {
+        return String(text === null || text === undefined ? '' : text)
+            .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;').replace(/"/g, '&quot;');
+    }
+
+    function absolute(url, base) {
+        if (!url || /^https?:\/\//.test(url)) {
+            return url;
+        }
+        var origin = /^https?:\/\/[^\/]+/.exec(base);
+        return origin ? origin[0] + url : url;
+    }
+
+    function renderCandidate(candidate, bundle, base) {
+        var html = '<li class="candideitorg-candidate">';
+        if (candidate.photo) {
+            html += '<img src="' + escape(absolute(candidate.photo, base)) + '" alt="' + escape(candidate.name) + '">';
+        }
+        html += '<h3>' + escape(candidate.name) + '</h3><dl>';
+        for (var i = 0; i < bundle.personal_data.length; i++) {
+            var personalData = bundle.personal_data[i];
+            var value = candidate.personal_data[personalData.id];
+            if (value !== undefined) {
+                html += '<dt>' + escape(personalData.label) + '</dt><dd>' + escape(value) + '</dd>';
+            }
+        }
+        return html + '</dl></li>';
+    }
+
+    function renderCategory(category, bundle) {
+        var html = '<table class="candideitorg-category"><caption>' + escape(category.name) + '</caption><tr><th></th>';
+        for (var i = 0; i < bundle.candidates.length; i++) {
+            html += '<th>' + escape(bundle.candidates[i].name) + '</th>';
+        }
+        html += '</tr>';
+        for (var j = 0; j < category.questions.length; j++) {
+            var question = category.questions[j];
+            var captions = {};
+            for (var k = 0; k < question.answers.length; k++) {
+                captions[question.answers[k].id] = question.answers[k].caption;
+            }
+            html += '<tr><th>' + escape(question.question) + '</th>';
+            for (var l = 0; l < bundle.candidates.length; l++) {
+                html += '<td>' + escape(captions[bundle.candidates[l].answers[question.id]]) + '</td>';
+            }
+            html += '</tr>';
+        }
+        return html + '</table>';
+    }
+
+    function render(element, bundle, base) {
+        var html = '<h2>' + escape(bundle.election.name) + '</h2><ul class="candideitorg-candidates">';
+        for (var i = 0; i < bundle.candidates.length; i++) {
+            html += renderCandidate(bundle.candidates[i], bundle, base);
+        }
+        html += '</ul>';
+        for (var j = 0; j < bundle.categories.length; j++) {
+            html += renderCategory(bundle.categories[j], bundle);
+        }
+        html += '<a href="' + escape(absolute(bundle.election.medianaranja_url, base)) + '">Media naranja</a>';
+        element.innerHTML = html;
+    }
+
+    function load(element) {
+        var url = element.getAttribute('data-bundle');
+        var request = new XMLHttpRequest();
+        request.open('GET', url, true);
+        request.onreadystatechange = function () {
+            if (request.readyState === 4 && request.status === 200) {
+                render(element, JSON.parse(request.responseText), url);
+            }
+        };
+        request.send();
+    }
+
+    var elements = document.querySelectorAll('.candideitorg-embed');
+    for (var i = 0; i < elements.length; i++) {
+        load(elements[i]);
+    }
+})();
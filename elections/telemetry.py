@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+import atexit
+import hashlib
+import logging
+import threading
+import Queue
+from collections import namedtuple
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import simplejson as json
+
+from elections.models import Visitor, VisitorAnswer, VisitorScore, CategoryScore, ElectionSnapshot, CompactVisitor
+from elections.models import pack_integers
+from elections.questionnaire import get_questionnaire
+
+
+logger = logging.getLogger(__name__)
+
+# Keeps every INSERT below the 999 parameters sqlite accepts per statement
+MAX_PARAMETERS_PER_STATEMENT = 900
+
+
+# Everything needed to write the Visitor, VisitorAnswer, VisitorScore and
+# CategoryScore rows of one media naranja submission, as plain values.
+#   answers: ((answer_text, question_text, question_category_text, importance), ...)
+#   scores: ((candidate_name, score, ((category_name, category_score), ...)), ...)
+#   answer_ids: id of the chosen answer for every question, -1 if it was skipped
+#   outline: the questions of the election, see Questionnaire.outline
+VisitorRecord = namedtuple('VisitorRecord', ['election_id', 'election_url', 'datestamp', 'answers', 'scores',
+                                             'answer_ids', 'outline'])
+
+
+def build_visitor_record(election, election_url, answers, importances, questions, categories, scores_and_candidates):
+    visitor_answers = []
+    answer_ids = []
+    for i, importance in enumerate(importances):
+        if answers[i]:
+            answer = answers[i][0]
+            visitor_answers.append((answer.caption, answer.question.question, answer.question.category.name, importance))
+            answer_ids.append(answer.pk)
+        else:
+            visitor_answers.append(("", questions[i].question, questions[i].category.name, importance))
+            answer_ids.append(-1)
+    visitor_scores = []
+    for global_score, category_scores, candidate in scores_and_candidates:
+        by_category = tuple((categories[i].name, category_score) for i, category_score in enumerate(category_scores))
+        visitor_scores.append((candidate.name, global_score, by_category))
+    return VisitorRecord(election.pk, election_url, datetime.now(), tuple(visitor_answers), tuple(visitor_scores),
+                         tuple(answer_ids), get_questionnaire(election).outline)
+
+
+def bulk_insert(cursor, model, field_names, rows):
+    '''
+    Inserts rows (tuples of values for field_names) with multi-row INSERT
+    statements, since this version of Django has no bulk_create.
+    '''
+    qn = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in field_names]
+    placeholder = u'(%s)' % u', '.join([u'%s'] * len(fields))
+    statement = u'INSERT INTO %s (%s) VALUES ' % (qn(model._meta.db_table), u', '.join(qn(field.column) for field in fields))
+    rows_per_statement = max(1, MAX_PARAMETERS_PER_STATEMENT // len(fields))
+    for start in range(0, len(rows), rows_per_statement):
+        chunk = rows[start:start + rows_per_statement]
+        params = []
+        for row in chunk:
+            params.extend(field.get_db_prep_save(value, connection=connection) for field, value in zip(fields, row))
+        cursor.execute(statement + u', '.join([placeholder] * len(chunk)), params)
+
+
+def write_visitor_records(records):
+    '''
+    Writes the records with one INSERT per visitor plus a handful of
+    multi-row INSERTs for all their answers and scores.
+    '''
+    if not records:
+        return
+    qn = connection.ops.quote_name
+    visitor_fields = [Visitor._meta.get_field(name) for name in ('election', 'election_url', 'datestamp')]
+    visitor_insert = u'INSERT INTO %s (%s) VALUES (%%s, %%s, %%s)' % (
+        qn(Visitor._meta.db_table), u', '.join(qn(field.column) for field in visitor_fields))
+    with transaction.commit_on_success():
+        cursor = connection.cursor()
+        visitor_ids = []
+        for record in records:
+            values = (record.election_id, record.election_url, record.datestamp)
+            cursor.execute(visitor_insert, [field.get_db_prep_save(value, connection=connection)
+                                            for field, value in zip(visitor_fields, values)])
+            visitor_ids.append(connection.ops.last_insert_id(cursor, Visitor._meta.db_table, Visitor._meta.pk.column))
+
+        answer_rows = []
+        score_rows = []
+        for visitor_id, record in zip(visitor_ids, records):
+            for answer_text, question_text, category_text, importance in record.answers:
+                answer_rows.append((visitor_id, answer_text, question_text, category_text, importance))
+            for candidate_name, score, by_category in record.scores:
+                score_rows.append((visitor_id, candidate_name, score))
+        bulk_insert(cursor, VisitorAnswer,
+                    ('visitor', 'answer_text', 'question_text', 'question_category_text', 'answer_importance'),
+                    answer_rows)
+        bulk_insert(cursor, VisitorScore, ('visitor', 'candidate_name', 'score'), score_rows)
+
+        # Candidate names are unique within an election, which is enough to
+        # match the new VisitorScore rows with their category scores
+        score_ids = {}
+        new_scores = VisitorScore.objects.filter(visitor__in=visitor_ids).values_list('id', 'visitor_id', 'candidate_name')
+        for score_id, visitor_id, candidate_name in new_scores:
+            score_ids[(visitor_id, candidate_name)] = score_id
+        category_rows = []
+        for visitor_id, record in zip(visitor_ids, records):
+            for candidate_name, score, by_category in record.scores:
+                score_id = score_ids[(visitor_id, candidate_name)]
+                for category_name, category_score in by_category:
+                    category_rows.append((score_id, category_score, category_name))
+        bulk_insert(cursor, CategoryScore, ('visitor_score', 'category_score', 'category_name'), category_rows)
+
+
+def make_snapshot_content(outline, candidate_names, category_names):
+    questions = [{'question': question_text, 'category': category_text,
+                  'answers': dict((unicode(answer_id), caption) for answer_id, caption in answers)}
+                 for question_text, category_text, answers in outline]
+    return json.dumps({'questions': questions, 'candidates': list(candidate_names), 'categories': list(category_names)},
+                      sort_keys=True)
+
+
+def get_snapshot_id(election_id, content):
+    fingerprint = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    snapshot, created = ElectionSnapshot.objects.get_or_create(election_id=election_id, fingerprint=fingerprint,
+                                                               defaults={'content': content})
+    return snapshot.pk
+
+
+def get_snapshot_key(record):
+    candidate_names = tuple(candidate_name for candidate_name, score, by_category in record.scores)
+    category_names = tuple(category_name for category_name, category_score in record.scores[0][2]) if record.scores else ()
+    return (record.election_id, record.outline, candidate_names, category_names)
+
+
+def pack_scores(scores):
+    values = []
+    for candidate_name, score, by_category in scores:
+        values.append(score)
+        values.extend(category_score for category_name, category_score in by_category)
+    return pack_integers(values)
+
+
+COMPACT_VISITOR_FIELDS = ('election', 'snapshot', 'election_url', 'datestamp', 'answers', 'importances', 'scores',
+                          'source_visitor_id')
+
+
+def insert_compact_visitor_records(records, source_visitor_ids=None):
+    # Records of the same election version share their snapshot, look it up once
+    snapshot_ids = {}
+    rows = []
+    for record, source_visitor_id in zip(records, source_visitor_ids or [None] * len(records)):
+        key = get_snapshot_key(record)
+        if key not in snapshot_ids:
+            election_id, outline, candidate_names, category_names = key
+            snapshot_ids[key] = get_snapshot_id(election_id, make_snapshot_content(outline, candidate_names, category_names))
+        importances = [importance for answer_text, question_text, category_text, importance in record.answers]
+        rows.append((record.election_id, snapshot_ids[key], record.election_url, record.datestamp,
+                     pack_integers(record.answer_ids), pack_integers(importances), pack_scores(record.scores),
+                     source_visitor_id))
+    bulk_insert(connection.cursor(), CompactVisitor, COMPACT_VISITOR_FIELDS, rows)
+
+
+def write_compact_visitor_records(records):
+    '''
+    Writes every record as a single CompactVisitor row, all of them with
+    one multi-row INSERT.
+    '''
+    if not records:
+        return
+    with transaction.commit_on_success():
+        insert_compact_visitor_records(records)
+
+
+def compact_visitors(election, delete=False):
+    '''
+    Stores the Visitor rows of the election as CompactVisitor rows and, if
+    delete is True, removes the originals. Returns the number of visitors.
+    Visitors compacted by a previous run are skipped, so it can run again.
+
+    The original answer ids are unknown, so every visitor gets a snapshot
+    built from the texts it holds, with answers numbered by caption.
+    '''
+    compacted = CompactVisitor.objects.filter(election=election, source_visitor_id__isnull=False)
+    visitors = Visitor.objects.filter(election=election).exclude(pk__in=compacted.values('source_visitor_id'))
+    visitors = list(visitors.order_by('pk').values_list('id', 'election_url', 'datestamp'))
+    if not visitors:
+        return 0
+    visitor_ids = [visitor_id for visitor_id, election_url, datestamp in visitors]
+    answers = {}
+    for visitor_id, answer_text, question_text, category_text, importance in VisitorAnswer.objects.filter(
+            visitor__election=election).order_by('pk').values_list(
+            'visitor_id', 'answer_text', 'question_text', 'question_category_text', 'answer_importance'):
+        answers.setdefault(visitor_id, []).append((answer_text, question_text, category_text, importance))
+    category_scores = {}
+    for score_id, category_name, category_score in CategoryScore.objects.filter(
+            visitor_score__visitor__election=election).order_by('pk').values_list(
+            'visitor_score_id', 'category_name', 'category_score'):
+        category_scores.setdefault(score_id, []).append((category_name, category_score))
+    scores = {}
+    for score_id, visitor_id, candidate_name, score in VisitorScore.objects.filter(
+            visitor__election=election).order_by('pk').values_list('id', 'visitor_id', 'candidate_name', 'score'):
+        scores.setdefault(visitor_id, []).append((candidate_name, score, tuple(category_scores.get(score_id, ()))))
+
+    # Every distinct set of questions gets its own numbering of the captions
+    captions = {}
+    for visitor_id, election_url, datestamp in visitors:
+        for answer_text, question_text, category_text, importance in answers.get(visitor_id, ()):
+            if answer_text:
+                by_question = captions.setdefault((question_text, category_text), [])
+                if answer_text not in by_question:
+                    by_question.append(answer_text)
+
+    records = []
+    for visitor_id, election_url, datestamp in visitors:
+        visitor_answers = tuple(answers.get(visitor_id, ()))
+        outline = []
+        answer_ids = []
+        for answer_text, question_text, category_text, importance in visitor_answers:
+            by_question = captions.get((question_text, category_text), [])
+            outline.append((question_text, category_text, tuple((i + 1, caption) for i, caption in enumerate(by_question))))
+            answer_ids.append(by_question.index(answer_text) + 1 if answer_text else -1)
+        records.append(VisitorRecord(election.pk, election_url, datestamp, visitor_answers,
+                                     tuple(scores.get(visitor_id, ())), tuple(answer_ids), tuple(outline)))
+
+    with transaction.commit_on_success():
+        insert_compact_visitor_records(records, visitor_ids)
+        if delete:
+            CategoryScore.objects.filter(visitor_score__visitor__in=visitor_ids).delete()
+            VisitorScore.objects.filter(visitor__in=visitor_ids).delete()
+            VisitorAnswer.objects.filter(visitor__in=visitor_ids).delete()
+            Visitor.objects.filter(pk__in=visitor_ids).delete()
+    return len(records)
+
+
+class TelemetryWriter(object):
+    '''
+    Writes media naranja visitor records.
+
+    In 'immediate' mode every record is written right away, inside the
+    request. In 'buffered' mode records are queued in memory and written in
+    batches by a background thread; when more than max_pending records are
+    waiting, record() blocks for up to block_timeout seconds and then writes
+    the record itself, so a slow database slows submissions down instead of
+    growing the queue without bound. With background=False nothing is
+    written until flush() is called.
+
+    storage chooses between the Visitor, VisitorAnswer, VisitorScore and
+    CategoryScore rows ('rows') and a single CompactVisitor row ('compact').
+    '''
+
+    def __init__(self, mode='immediate', max_pending=10000, batch_size=200, flush_interval=1.0, block_timeout=0.5,
+                 background=True, storage='rows'):
+        self.mode = mode
+        self.storage = storage
+        self.background = background
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.queue = Queue.Queue(max_pending)
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def write(self, records):
+        if self.storage == 'compact':
+            write_compact_visitor_records(records)
+        else:
+            write_visitor_records(records)
+
+    def record(self, visitor_record):
+        if self.mode != 'buffered':
+            self.write([visitor_record])
+            return
+        if self.background:
+            self.start()
+        try:
+            self.queue.put(visitor_record, True, self.block_timeout)
+        except Queue.Full:
+            self.write([visitor_record])
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='medianaranja-telemetry')
+            self._thread.daemon = True
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _take_batch(self, timeout):
+        batch = []
+        try:
+            batch.append(self.queue.get(True, timeout))
+            while len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+        except Queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take_batch(self.flush_interval)
+            if not batch:
+                continue
+            try:
+                self.write(batch)
+            except Exception:
+                logger.exception(u"Could not write %d media naranja visitors", len(batch))
+            finally:
+                connection.close()
+
+    def flush(self):
+        '''
+        Writes every queued record from the calling thread.
+        '''
+        batch = self._take_batch(0)
+        while batch:
+            self.write(batch)
+            batch = self._take_batch(0)
+
+    def shutdown(self, timeout=10):
+        '''
+        Stops the background thread and writes whatever is still queued.
+        '''
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join(timeout)
+        self.flush()
+
+
+writer = TelemetryWriter(mode=settings.MEDIANARANJA_TELEMETRY_MODE,
+                         max_pending=settings.MEDIANARANJA_TELEMETRY_MAX_PENDING,
+                         batch_size=settings.MEDIANARANJA_TELEMETRY_BATCH_SIZE,
+                         flush_interval=settings.MEDIANARANJA_TELEMETRY_FLUSH_INTERVAL,
+                         storage=settings.MEDIANARANJA_VISITOR_STORAGE)
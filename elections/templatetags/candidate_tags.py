@@ -1,13 +1,13 @@
 #encoding=UTF-8
 from django import template
 from django.utils.translation import ugettext as _
-from elections.models import PersonalDataCandidate, BackgroundCandidate
+from elections.loaders import get_candidate_profile
 
 register = template.Library()
 
 
-@register.simple_tag
-def value_for_candidate_and_personal_data(candidate, personal_data):
+@register.simple_tag(takes_context=True)
+def value_for_candidate_and_personal_data(context, candidate, personal_data):
     '''
     Returns the answer for the given candidate and question pair.
 
@@ -15,14 +15,13 @@ def value_for_candidate_and_personal_data(candidate, personal_data):
     "answer"
     '''
 
-    try:
-        return PersonalDataCandidate.objects.get(candidate=candidate, personal_data=personal_data).value
-    except PersonalDataCandidate.DoesNotExist:
-        pass
-    return ''
+    value = get_candidate_profile(context, candidate).personal_data_values.get(personal_data.pk)
+    if value is None:
+        return ''
+    return value
 
-@register.simple_tag
-def value_for_candidate_and_background(candidate, background):
+@register.simple_tag(takes_context=True)
+def value_for_candidate_and_background(context, candidate, background):
     '''
     Returns the answer for the given candidate and question pair.
 
@@ -30,11 +29,10 @@ def value_for_candidate_and_background(candidate, background):
     "answer"
     '''
 
-    try:
-        return BackgroundCandidate.objects.get(candidate=candidate, background=background).value
-    except BackgroundCandidate.DoesNotExist:
-        pass
-    return ''
+    value = get_candidate_profile(context, candidate).background_values.get(background.pk)
+    if value is None:
+        return ''
+    return value
 
 # @register.simple_tag
 # def candidate_photo(candidate):
@@ -1,13 +1,13 @@
 #encoding=UTF-8
 from django import template
 from django.utils.translation import ugettext as _
-from elections.models import Answer
+from elections.loaders import get_candidate_answers
 
 register = template.Library()
 
 
-@register.simple_tag
-def answer_for_candidate_and_question(candidate, question):
+@register.simple_tag(takes_context=True)
+def answer_for_candidate_and_question(context, candidate, question):
     '''
     Returns the answer for the given candidate and question pair.
 
@@ -15,11 +15,10 @@ def answer_for_candidate_and_question(candidate, question):
     "answer"
     '''
 
-    try:
-        return question.answer_set.get(candidate=candidate).caption
-    except Answer.DoesNotExist:
-        pass
-    return _(u"Aún no hay respuesta")
+    answer = get_candidate_answers(context, candidate).get(question.pk)
+    if answer is None:
+        return _(u"Aún no hay respuesta")
+    return answer.caption
     
     
 @register.simple_tag
@@ -17,4 +17,14 @@ from election_loader import *
 from settings_variables import *
 from user import *
 from api_v2 import *
-from information_source import *
\ No newline at end of file
+from information_source import *
+from scoring import *
+from questionnaire import *
+from telemetry import *
+from benchmark import *
+from page_cache import *
+from exporter import *
+from compare_index import *
+from thumbnails import *
+from embed import *
+from authentication import *
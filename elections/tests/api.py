@@ -229,3 +229,24 @@ class ApiTestCase(ResourceTestCase):
         self.assertTrue("background" in candidate)
         self.assertEquals(candidate["background"][0]["name"],"background name")
         self.assertEquals(candidate["background"][0]["value"],"candidate background value")
+
+    def test_candidate_list_queries_do_not_grow_with_the_election(self):
+        url = '/api/v1/candidate/'
+        # Authenticates once, the key is not looked up again
+        self.api_client.get(url, data=self.data)
+        with self.assertNumQueries(8):
+            self.api_client.get(url, data=self.data)
+        for i in range(10):
+            candidate = Candidate.objects.create(name=u'Candidate %d' % i, election=self.election)
+            candidate.associate_answer(self.answer1)
+            candidate.associate_answer(self.answer4)
+            PersonalDataCandidate.objects.create(personal_data=self.personal_data1, candidate=candidate, value=u"%d" % i)
+            Link.objects.create(name=u'@candidate%d' % i, url='http://www.twitter.com/candidate%d' % i, candidate=candidate)
+        with self.assertNumQueries(8):
+            resp = self.api_client.get(url, data=self.data)
+        candidates = self.deserialize(resp)['objects']
+        self.assertEqual(len(candidates), 12)
+        self.assertEqual(candidates[2]['personal_data'][0]['value'], u"0")
+        self.assertEqual(candidates[2]['links'][0]['name'], u"@candidate0")
+        self.assertEqual(candidates[2]['categories'][0]['questions'][0]['answer']['id'], self.answer1.id)
+        self.assertEqual(candidates[2]['categories'][0]['questions'][1]['answer']['id'], self.answer4.id)
@@ -4,12 +4,13 @@ from django.contrib.auth.models import User
 from django.db import models
 from elections.models import Election, Candidate, Category, PersonalData, \
                              BackgroundCategory, Background, PersonalDataCandidate, \
-                             Question, Answer, Link, BackgroundCandidate, InformationSource
+                             Question, Answer, Link, BackgroundCandidate, InformationSource, Visitor
 from elections.api import BackgroundResource
 from tastypie.test import ResourceTestCase, TestApiClient
 from django.core import serializers
 from django.core.urlresolvers import reverse
 from django.utils.unittest import skip
+from django.utils import simplejson as json
 from django.contrib.sites.models import Site
 
 class ApiV2TestCase(ResourceTestCase):
@@ -525,6 +526,237 @@ class ApiV2TestCase(ResourceTestCase):
 
         content = content.strip("callback(")
 
+    def test_media_naranja_post_with_tampered_answers(self):
+        response = self.api_client.post('/api/v2/medianaranja/', 
+            format='json', 
+            authentication=self.get_credentials(),
+            data = {
+                'data' : {
+                    'question-0': self.answer_for_question_2.pk, 'question-1': self.answer_for_question_2.pk,
+                    'importance-0': 5, 'importance-1': 3,
+                    'question-id-0': self.question_category_1.id, 'question-id-1': self.question_category_2.id
+                    },
+                'election-id' : self.election.id
+            }
+        )
+        self.assertHttpBadRequest(response)
+
+    def test_media_naranja_post_top_k(self):
+        response = self.api_client.post('/api/v2/medianaranja/', 
+            format='json', 
+            authentication=self.get_credentials(),
+            data = {
+                'data' : {
+                    'question-0': self.answer_for_question_1.pk, 'question-1': self.answer_for_question_2.pk,
+                    'importance-0': 5, 'importance-1': 3,
+                    'question-id-0': self.question_category_1.id, 'question-id-1': self.question_category_2.id
+                    },
+                'election-id' : self.election.id,
+                'k' : 1
+            }
+        )
+        self.assertHttpCreated(response)
+        candidates = self.deserialize(response)
+        self.assertEquals(candidates['winner']['candidate'], self.candidate.id)
+        self.assertEquals(candidates['others'], [])
+
+    def test_media_naranja_batch(self):
+        answer_set = {
+            'question-0': self.answer_for_question_1.pk, 'question-1': self.answer_for_question_2.pk,
+            'importance-0': 5, 'importance-1': 3,
+            'question-id-0': self.question_category_1.id, 'question-id-1': self.question_category_2.id
+        }
+        tampered = dict(answer_set, **{'question-0': self.answer_for_question_2.pk})
+        response = self.api_client.post('/api/v2/medianaranja/batch/',
+            format='json',
+            authentication=self.get_credentials(),
+            data = {
+                'election-id' : self.election.id,
+                'answers' : [answer_set, tampered, answer_set],
+                'k' : 1,
+                'telemetry' : 'record'
+            }
+        )
+        self.assertHttpOK(response)
+        self.assertEquals(response['Content-Type'], 'application/x-json-stream')
+        lines = [json.loads(line) for line in response.content.splitlines()]
+        self.assertEquals(len(lines), 3)
+        self.assertEquals(lines[0]['index'], 0)
+        self.assertEquals(lines[0]['winner']['candidate'], self.candidate.id)
+        self.assertEquals(lines[0]['winner']['global_score'], 100.0)
+        self.assertEquals(lines[0]['others'], [])
+        self.assertIn('error', lines[1])
+        self.assertEquals(lines[2]['winner'], lines[0]['winner'])
+        self.assertEquals(Visitor.objects.filter(election=self.election).count(), 2)
+
+    def test_media_naranja_batch_requires_an_api_key(self):
+        response = self.api_client.post('/api/v2/medianaranja/batch/', format='json',
+                                        data={'election-id': self.election.id, 'answers': []})
+        self.assertHttpUnauthorized(response)
+
+    def test_media_naranja_batch_rejects_unknown_elections(self):
+        response = self.api_client.post('/api/v2/medianaranja/batch/', format='json',
+                                        authentication=self.get_credentials(),
+                                        data={'election-id': 0, 'answers': []})
+        self.assertHttpBadRequest(response)
+
+    def test_media_naranja_batch_of_another_users_election(self):
+        answer_set = {
+            'question-0': self.answer_for_question_1.pk, 'question-1': self.answer_for_question_2.pk,
+            'importance-0': 5, 'importance-1': 3,
+            'question-id-0': self.question_category_1.id, 'question-id-1': self.question_category_2.id
+        }
+        credentials = self.create_apikey(username=self.user2.username, api_key=self.user2.api_key.key)
+        data = {'election-id': self.election.id, 'answers': [answer_set], 'telemetry': 'record'}
+        response = self.api_client.post('/api/v2/medianaranja/batch/', format='json', authentication=credentials, data=data)
+        self.assertHttpForbidden(response)
+        self.assertEquals(Visitor.objects.filter(election=self.election).count(), 0)
+
+        data['telemetry'] = 'skip'
+        response = self.api_client.post('/api/v2/medianaranja/batch/', format='json', authentication=credentials, data=data)
+        self.assertHttpOK(response)
+        self.assertEquals(json.loads(response.content.splitlines()[0])['winner']['candidate'], self.candidate.id)
+
+        Election.objects.filter(pk=self.election.pk).update(published=False)
+        response = self.api_client.post('/api/v2/medianaranja/batch/', format='json', authentication=credentials, data=data)
+        self.assertHttpBadRequest(response)
+
+    def test_compare_two_candidates(self):
+        self.candidate2.associate_answer(self.answer_for_question_1)
+        self.candidate2.associate_answer(self.answer_for_question_4)
+        response = self.api_client.get(
+            '/api/v2/election/{0}/compare/{1}/{2}/'.format(self.election.id, self.candidate.id, self.candidate2.id),
+            format='json',
+            authentication=self.get_credentials())
+
+        self.assertHttpOK(response)
+        comparison = self.deserialize(response)
+        self.assertEquals(comparison['agreement'], 50.0)
+        self.assertEquals(comparison['categories'][0]['category'], self.category1.id)
+        self.assertEquals(comparison['categories'][0]['agreement'], 100.0)
+        self.assertEquals(comparison['categories'][0]['answers'], [{
+            'question': self.question_category_1.id,
+            'first_answer': self.answer_for_question_1.id,
+            'second_answer': self.answer_for_question_1.id}])
+        self.assertEquals(comparison['categories'][1]['agreement'], 0.0)
+
+    def test_compare_candidates_of_another_user(self):
+        response = self.api_client.get(
+            '/api/v2/election/{0}/compare/{1}/{2}/'.format(self.election.id, self.candidate.id, self.candidate2.id),
+            format='json',
+            authentication=self.create_apikey(username=self.user2.username, api_key=self.user2.api_key.key))
+        self.assertHttpNotFound(response)
+
+    def test_export_election(self):
+        response = self.api_client.get('/api/v2/election/{0}/export/'.format(self.election.id),
+                                       format='json', authentication=self.get_credentials())
+        self.assertHttpOK(response)
+        self.assertEquals(response['Content-Type'], 'application/x-json-stream')
+        lines = [json.loads(line) for line in response.content.splitlines()]
+        self.assertEquals(lines[0]['type'], 'election')
+        self.assertEquals(lines[0]['id'], self.election.id)
+        self.assertEquals(lines[0]['owner'], self.user.username)
+        by_type = {}
+        for line in lines[1:]:
+            by_type.setdefault(line.pop('type'), []).append(line)
+        self.assertEquals([category['id'] for category in by_type['category']], [self.category1.id, self.category2.id])
+        self.assertIn({'id': self.answer_for_question_2.id, 'question': self.question_category_2.id, 'caption': u"Talvez"},
+                      by_type['answer'])
+        self.assertEquals([candidate['name'] for candidate in by_type['candidate']], [self.candidate.name, self.candidate2.name])
+        self.assertEquals(sorted((row['candidate'], row['answer']) for row in by_type['candidate_answer']),
+                          [(self.candidate.id, self.answer_for_question_1.id), (self.candidate.id, self.answer_for_question_2.id)])
+        self.assertIn({'id': self.profession.id, 'candidate': self.candidate.id, 'personal_data': self.personal_data2.id,
+                       'value': u"Constructor"}, by_type['personal_data_candidate'])
+        self.assertEquals(by_type['background_candidate'][0]['value'], u"Primary High School Musical")
+        self.assertEquals(by_type['link'][0]['url'], self.link_twitter.url)
+        self.assertNotIn('information_source', by_type)
+
+    def test_export_election_reads_in_chunks(self):
+        from elections.graph_export import stream_election
+        self.assertEquals(list(stream_election(self.election, chunk_size=1)), list(stream_election(self.election)))
+
+    def test_export_election_of_another_user(self):
+        response = self.api_client.get('/api/v2/election/{0}/export/'.format(self.election.id), format='json',
+            authentication=self.create_apikey(username=self.user2.username, api_key=self.user2.api_key.key))
+        self.assertHttpNotFound(response)
+        response = self.api_client.get('/api/v2/election/{0}/export/'.format(self.election.id), format='json')
+        self.assertHttpUnauthorized(response)
+
+    def test_get_answers_by_cursor(self):
+        answer_ids = []
+        url = '/api/v2/answer/'
+        data = {'cursor': '', 'limit': 3}
+        while url:
+            response = self.api_client.get(url, format='json', authentication=self.get_credentials(), data=data)
+            self.assertHttpOK(response)
+            page = self.deserialize(response)
+            self.assertNotIn('total_count', page['meta'])
+            answer_ids.extend(answer['id'] for answer in page['objects'])
+            url, data = page['meta']['next'], {}
+        self.assertEquals(answer_ids, sorted(Answer.objects.values_list('id', flat=True)))
+        self.assertEquals(len(answer_ids), 4)
+
+    def test_get_answers_by_cursor_is_opt_in(self):
+        response = self.api_client.get('/api/v2/answer/', format='json', authentication=self.get_credentials(), data={'limit': 3})
+        page = self.deserialize(response)
+        self.assertEquals(page['meta']['total_count'], 4)
+        self.assertEquals(page['meta']['offset'], 0)
+
+    def test_get_answers_with_an_invalid_cursor(self):
+        response = self.api_client.get('/api/v2/answer/', format='json', authentication=self.get_credentials(), data={'cursor': 'nope'})
+        self.assertHttpBadRequest(response)
+
+    def test_get_election_fields(self):
+        response = self.api_client.get('/api/v2/election/{0}/'.format(self.election.id), format='json',
+                                       authentication=self.get_credentials(), data={'fields': 'name,slug'})
+        self.assertHttpOK(response)
+        self.assertEquals(self.deserialize(response), {'name': self.election.name, 'slug': self.election.slug})
+
+    def test_get_election_expanding_candidates_and_their_answers(self):
+        url = '/api/v2/election/{0}/'.format(self.election.id)
+        data = {'fields': 'name,candidates.name,candidates.answers', 'expand': 'candidates.answers,categories'}
+        response = self.api_client.get(url, format='json', authentication=self.get_credentials(), data=data)
+        self.assertHttpOK(response)
+        election = self.deserialize(response)
+        self.assertEquals(sorted(election.keys()), ['candidates', 'categories', 'name'])
+        self.assertEquals(election['candidates'][0]['name'], self.candidate.name)
+        self.assertEquals(sorted(election['candidates'][0].keys()), ['answers', 'name'])
+        self.assertEquals([answer['caption'] for answer in election['candidates'][0]['answers']],
+                          [self.answer_for_question_1.caption, self.answer_for_question_2.caption])
+        self.assertEquals(election['candidates'][0]['answers'][0]['question'],
+                          '/api/v2/question/{0}/'.format(self.question_category_1.id))
+        self.assertEquals(election['candidates'][1]['answers'], [])
+        self.assertEquals([category['name'] for category in election['categories']], [self.category1.name, self.category2.name])
+        self.assertEquals(election['categories'][0]['questions'], ['/api/v2/question/{0}/'.format(self.question_category_1.id)])
+
+    def test_expanding_does_not_query_each_object(self):
+        url = '/api/v2/election/{0}/'.format(self.election.id)
+        data = {'fields': 'name,candidates.name,candidates.answers.caption', 'expand': 'candidates.answers'}
+        self.api_client.get(url, format='json', authentication=self.get_credentials(), data=data)
+        with self.assertNumQueries(4):
+            self.api_client.get(url, format='json', authentication=self.get_credentials(), data=data)
+        for i in range(5):
+            candidate = Candidate.objects.create(name=u"Candidate %d" % i, election=self.election)
+            candidate.associate_answer(self.answer_for_question_3)
+        with self.assertNumQueries(4):
+            response = self.api_client.get(url, format='json', authentication=self.get_credentials(), data=data)
+        candidates = self.deserialize(response)['candidates']
+        self.assertEquals(len(candidates), 7)
+        self.assertEquals(candidates[6]['answers'], [{'caption': self.answer_for_question_3.caption}])
+
+    def test_get_questions_expanding_their_category(self):
+        response = self.api_client.get('/api/v2/question/', format='json', authentication=self.get_credentials(),
+                                       data={'fields': 'question,category.name', 'expand': 'category'})
+        self.assertHttpOK(response)
+        questions = self.deserialize(response)['objects']
+        self.assertEquals(questions[0], {'question': self.question_category_1.question, 'category': {'name': self.category1.name}})
+        self.assertEquals(questions[1]['category'], {'name': self.category2.name})
+
+    def test_expanding_something_that_is_not_a_relation(self):
+        response = self.api_client.get('/api/v2/election/{0}/'.format(self.election.id), format='json',
+                                       authentication=self.get_credentials(), data={'expand': 'name'})
+        self.assertHttpBadRequest(response)
+
     def test_get_information_source(self):
         information_source = InformationSource.objects.create(
             candidate=self.candidate,
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.contrib.auth.models import User
+from tastypie.test import ResourceTestCase
+
+from elections.models import Election
+
+
+class CachedApiKeyAuthenticationTest(ResourceTestCase):
+    def setUp(self):
+        super(CachedApiKeyAuthenticationTest, self).setUp()
+        self.user = User.objects.create_user(username='joe', password='joe', email='joe@example.net')
+        self.election = Election.objects.create(owner=self.user, name='Election', slug='election', published=True)
+        self.url = '/api/v2/election/{0}/'.format(self.election.id)
+
+    def get_credentials(self, key=None):
+        return self.create_apikey(username=self.user.username, api_key=key or self.user.api_key.key)
+
+    def test_accepted_keys_are_not_looked_up_again(self):
+        self.assertHttpOK(self.api_client.get(self.url, format='json', authentication=self.get_credentials()))
+        with self.assertNumQueries(5):
+            response = self.api_client.get(self.url, format='json', authentication=self.get_credentials())
+        self.assertHttpOK(response)
+        self.assertEquals(self.deserialize(response)['id'], self.election.id)
+
+    def test_wrong_keys_are_rejected(self):
+        self.assertHttpOK(self.api_client.get(self.url, format='json', authentication=self.get_credentials()))
+        self.assertHttpUnauthorized(self.api_client.get(self.url, format='json', authentication=self.get_credentials('wrong')))
+
+    def test_changing_the_key_forgets_the_old_one(self):
+        old_key = self.user.api_key.key
+        self.assertHttpOK(self.api_client.get(self.url, format='json', authentication=self.get_credentials()))
+        api_key = self.user.api_key
+        api_key.key = api_key.generate_key()
+        api_key.save()
+        self.assertHttpUnauthorized(self.api_client.get(self.url, format='json', authentication=self.get_credentials(old_key)))
+        self.assertHttpOK(self.api_client.get(self.url, format='json', authentication=self.get_credentials(api_key.key)))
+
+    def test_deactivating_the_user_forgets_the_key(self):
+        self.assertHttpOK(self.api_client.get(self.url, format='json', authentication=self.get_credentials()))
+        self.user.is_active = False
+        self.user.save()
+        response = self.api_client.get(self.url, format='json', authentication=self.get_credentials())
+        self.assertFalse(response.status_code == 200)
+
+    def test_renaming_the_user_forgets_the_old_username(self):
+        credentials = self.get_credentials()
+        self.assertHttpOK(self.api_client.get(self.url, format='json', authentication=credentials))
+        self.user.username = 'jim'
+        self.user.save()
+        self.assertHttpUnauthorized(self.api_client.get(self.url, format='json', authentication=credentials))
+        self.assertHttpOK(self.api_client.get(self.url, format='json', authentication=self.get_credentials()))
+
+    def test_keys_expire(self):
+        timeout = settings.API_KEY_CACHE_TIMEOUT
+        settings.API_KEY_CACHE_TIMEOUT = -1
+        try:
+            self.assertHttpOK(self.api_client.get(self.url, format='json', authentication=self.get_credentials()))
+            with self.assertNumQueries(7):
+                self.api_client.get(self.url, format='json', authentication=self.get_credentials())
+        finally:
+            settings.API_KEY_CACHE_TIMEOUT = timeout
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+
+from elections.benchmark import create_synthetic_election, run_benchmark
+from elections.questionnaire import get_questionnaire
+
+
+class BenchmarkTest(TestCase):
+    def test_create_synthetic_election(self):
+        election = create_synthetic_election(4, 2, 3, 5)
+        self.assertEqual(election.candidate_set.count(), 4)
+        self.assertEqual(len(get_questionnaire(election)), 6)
+        for candidate in election.candidate_set.all():
+            self.assertEqual(candidate.answers.count(), 6)
+
+    def test_run_benchmark(self):
+        report = run_benchmark([(3, 2, 2, 2)], repeat=2)
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0]['candidates'], 3)
+        self.assertEqual(sorted(report[0]['results']), ['api', 'get_form', 'get_score', 'post_scoring'])
+        for measures in report[0]['results'].values():
+            self.assertEqual(measures['repeat'], 2)
+            self.assertTrue(measures['queries'] > 0)
+            self.assertTrue(measures['peak_rss_kb'] > 0)
@@ -9,7 +9,7 @@ from django.utils import simplejson as json, simplejson
 
 from elections.models import Candidate, Election, BackgroundCategory, Background,\
                                 BackgroundCandidate, PersonalData, PersonalDataCandidate,\
-                                Category, Question, Answer
+                                Category, Question, Answer, prefetch_answers
 from elections.forms import CandidateUpdateForm, CandidateForm, CandidateLinkForm, BackgroundCandidateForm, PersonalDataCandidateForm, AnswerForm, CandidatePhotoForm
 
 dirname = os.path.dirname(os.path.abspath(__file__))
@@ -369,6 +369,75 @@ class CandidateModelTest(TestCase):
         expected_result = candidate1.get_answers_two_candidates(candidate2, category)
         self.assertEqual(real_result, expected_result)
 
+    def test_answers_by_question_are_loaded_once(self):
+        candidate = Candidate.objects.create(name='Juan Candidato', election=self.election)
+        category = Category.objects.create(name='FooCat', election=self.election, slug='foo-cat')
+        questions = [Question.objects.create(question='FooQuestion%d' % i, category=category) for i in range(3)]
+        answers = [Answer.objects.create(question=question, caption='BarAnswer') for question in questions]
+        for answer in answers:
+            candidate.associate_answer(answer)
+
+        with self.assertNumQueries(1):
+            for question, answer in zip(questions, answers):
+                self.assertEqual(candidate.get_answer_by_question(question), answer)
+        another_answer = Answer.objects.create(question=questions[0], caption='FooAnswer')
+        candidate.associate_answer(another_answer)
+        self.assertEqual(candidate.get_answer_by_question(questions[0]), another_answer)
+        self.assertEqual(list(candidate.answers.filter(question=questions[0])), [another_answer])
+
+    def test_prefetch_answers(self):
+        category = Category.objects.create(name='FooCat', election=self.election, slug='foo-cat')
+        question = Question.objects.create(question='FooQuestion', category=category)
+        answer = Answer.objects.create(question=question, caption='BarAnswer')
+        for name in ('Juan Candidato', 'Mario Candidato'):
+            Candidate.objects.create(name=name, election=self.election).associate_answer(answer)
+        Candidate.objects.create(name='Pedro Candidato', election=self.election)
+
+        with self.assertNumQueries(2):
+            candidates = prefetch_answers(Candidate.objects.filter(election=self.election).order_by('pk'))
+            answers = [candidate.get_answer_by_question(question) for candidate in candidates]
+        self.assertEqual(answers, [answer, answer, "no answer"])
+
+    def test_associating_the_same_answer_again_writes_nothing(self):
+        candidate = Candidate.objects.create(name='Juan Candidato', election=self.election)
+        category = Category.objects.create(name='FooCat', election=self.election, slug='foo-cat')
+        answer = Answer.objects.create(question=Question.objects.create(question='FooQuestion', category=category),
+                                       caption='BarAnswer')
+        candidate.associate_answer(answer)
+        with self.assertNumQueries(1):
+            candidate.associate_answer(answer)
+
+    def test_profile_queries_do_not_depend_on_the_election_fields(self):
+        candidate = Candidate.objects.create(name='Juan Candidato', election=self.election)
+        background_category = BackgroundCategory.objects.create(election=self.election, name='FooBar')
+        for i in range(5):
+            personal_data = PersonalData.objects.create(election=self.election, label='label %d' % i)
+            PersonalDataCandidate.objects.create(candidate=candidate, personal_data=personal_data, value='value %d' % i)
+            background = Background.objects.create(category=background_category, name='background %d' % i)
+            BackgroundCandidate.objects.create(candidate=candidate, background=background, value='value %d' % i)
+
+        with self.assertNumQueries(2):
+            personal_data = candidate.get_personal_data
+        self.assertEqual(personal_data['label 3'], 'value 3')
+        with self.assertNumQueries(3):
+            backgrounds = candidate.get_background
+        self.assertEqual(backgrounds[len(backgrounds)], {'name': 'FooBar',
+                                          'backgrounds': dict((i + 1, {'name': 'background %d' % i, 'value': 'value %d' % i})
+                                                              for i in range(5))})
+
+        candidate.load_profile()
+        candidate.get_background
+        with self.assertNumQueries(0):
+            candidate.get_background
+            candidate.get_answer_for_background(background)
+
+    def test_repeated_personal_data_values_are_none(self):
+        candidate = Candidate.objects.create(name='Juan Candidato', election=self.election)
+        personal_data = PersonalData.objects.create(election=self.election, label='repeated')
+        PersonalDataCandidate.objects.create(candidate=candidate, personal_data=personal_data, value='one')
+        PersonalDataCandidate.objects.create(candidate=candidate, personal_data=personal_data, value='two')
+        self.assertTrue(candidate.get_personal_data['repeated'] is None)
+
 
 class CandidateDetailViewTest(TestCase):
     def setUp(self):
@@ -1088,4 +1157,17 @@ class CandidateListAjaxViewTest(TestCase):
         self.assertEquals(candidate_names[0],{'name':'candidate one','id':self.candidate_one.pk})
         self.assertEquals(candidate_names[1],{'name':'candidate two','id':self.candidate_two.pk})
 
+    def test_get_list_is_revalidated_against_the_election_version(self):
+        url = reverse('candidate_list_json', kwargs={'username': self.user.username, 'election_slug': self.election.slug})
+        response = self.client.get(url)
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue('no-cache' in response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(response.status_code, 304)
+
+        Candidate.objects.create(name='candidate three', election=self.election)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(len(json.loads(response.content)), 3)
+
 
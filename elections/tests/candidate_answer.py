@@ -3,6 +3,7 @@ from django.test import TestCase
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
+from django.http import HttpRequest
 from django.test.client import Client
 from django.template import Template, Context
 from django.utils.translation import ugettext as _
@@ -61,6 +62,17 @@ class CandidateTagsTest(TestCase):
         context = Context({"candidate": self.candidate, "question": self.answer.question})
         self.assertEqual(template.render(context), _(u'Aún no hay respuesta'))
 
+    def test_answer_for_candidate_and_question_loads_the_answers_once_per_request(self):
+        self.candidate.associate_answer(self.answer)
+        questions = [Question.objects.create(question='Question %d' % i, category=self.categories[1]) for i in range(5)]
+        questions.append(self.answer.question)
+        template = Template('{% load election_tags %}{% for question in questions %}'
+                            '{% answer_for_candidate_and_question candidate question %},{% endfor %}')
+        context = Context({"candidate": self.candidate, "questions": questions, "request": HttpRequest()})
+        with self.assertNumQueries(1):
+            rendered = template.render(context)
+        self.assertEqual(rendered.split(',')[-2], self.answer.caption)
+
 
         
 
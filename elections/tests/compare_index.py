@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+
+from elections.compare_index import get_compare_index, get_answers_two_candidates
+from elections.models import Election, Candidate, Category, Question, Answer
+
+
+class CompareIndexTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='joe', password='joe', email='joe@doe.cl')
+        self.election = Election.objects.create(name='election', owner=self.user, slug='barbaz', published=True)
+        self.election.category_set.all().delete()
+        self.category = Category.objects.create(name='Pets', election=self.election, slug='pets')
+        self.dogs = Question.objects.create(question='Dogs?', category=self.category)
+        self.cats = Question.objects.create(question='Cats?', category=self.category)
+        self.yes_dogs = Answer.objects.create(question=self.dogs, caption='Yes')
+        self.no_dogs = Answer.objects.create(question=self.dogs, caption='No')
+        self.yes_cats = Answer.objects.create(question=self.cats, caption='Yes')
+        self.first_candidate = Candidate.objects.create(name='Juan Candidato', election=self.election)
+        self.second_candidate = Candidate.objects.create(name='Pedro Candidato', election=self.election)
+        self.first_candidate.associate_answer(self.yes_dogs)
+        self.first_candidate.associate_answer(self.yes_cats)
+        self.second_candidate.associate_answer(self.yes_dogs)
+
+    def reload_election(self):
+        return Election.objects.get(pk=self.election.pk)
+
+    def test_compare(self):
+        index = get_compare_index(self.reload_election())
+        rows, same = index.compare(self.first_candidate.pk, self.second_candidate.pk, self.category.pk)
+        self.assertEqual(rows, [(self.dogs.pk, self.yes_dogs.pk, self.yes_dogs.pk), (self.cats.pk, self.yes_cats.pk, None)])
+        self.assertEqual(same, 1)
+        self.assertEqual(index.get_agreement(self.first_candidate.pk, self.second_candidate.pk), 50.0)
+
+    def test_same_rows_as_candidate(self):
+        answers, agreement = get_answers_two_candidates(self.reload_election(), self.first_candidate, self.second_candidate, self.category)
+        self.assertEqual(answers, self.first_candidate.get_answers_two_candidates(self.second_candidate, self.category))
+        self.assertEqual(agreement, 50.0)
+
+    def test_changing_an_answer_refreshes_the_index(self):
+        index = get_compare_index(self.reload_election())
+        self.second_candidate.associate_answer(self.no_dogs)
+        self.assertFalse(get_compare_index(self.reload_election()) is index)
+        self.assertEqual(get_compare_index(self.reload_election()).get_agreement(self.first_candidate.pk, self.second_candidate.pk), 0.0)
+
+    def test_compare_view(self):
+        url = reverse('election_compare_two_candidates', kwargs={'username': self.user.username,
+                                                                 'slug': self.election.slug,
+                                                                 'first_candidate_slug': self.first_candidate.slug,
+                                                                 'second_candidate_slug': self.second_candidate.slug,
+                                                                 'category_slug': self.category.slug})
+        response = self.client.get(url)
+        self.assertEqual(response.context['agreement'], 50.0)
+        self.assertEqual(response.context['answers'][1], (self.cats, self.yes_cats, "no answer"))
+        self.assertContains(response, 'Coinciden en un 50% de las respuestas')
@@ -3,6 +3,7 @@ from django.core.files.base import File
 import json
 import os
 from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
@@ -13,10 +14,11 @@ from django.utils import simplejson as json
 from django.utils.translation import ugettext as _
 
 from elections.models import Election, Candidate, Category, PersonalData, \
-                             BackgroundCategory, Background, PersonalDataCandidate
+                             BackgroundCategory, Background, PersonalDataCandidate, CacheVersion
 from elections.forms import ElectionForm, ElectionUpdateForm, PersonalDataForm, \
                             BackgroundCategoryForm, BackgroundForm, QuestionForm, \
                             CategoryForm, ElectionLogoUpdateForm, ElectionStyleUpdateForm
+from elections.home import HOME_ELECTIONS_VERSION, HOME_ELECTIONS_VERSION_CACHE_KEY
 from elections.views import ElectionRedirectView
 
 import random
@@ -110,6 +112,18 @@ class ElectionModelTest(TestCase):
         self.assertEqual(election.custom_style, '')
         self.assertEqual(election.highlighted, False)
 
+    def test_create_election_with_explicit_pk(self):
+        user, created = User.objects.get_or_create(username='joe')
+        election = Election(pk=999, name='BarBaz', owner=user, slug='barbaz', description='esta es una descripcion')
+        election.save()
+        self.assertTrue(Election.objects.filter(pk=999).exists())
+
+        # The default questions created with it touched it since
+        version = Election.objects.get(pk=999).version
+        election.name = 'Renamed'
+        election.save()
+        self.assertEqual(Election.objects.get(pk=999).version, version + 1)
+
     def test_create_an_election_with_utf8(self):
         user, created = User.objects.get_or_create(username='joe')
         election, created = Election.objects.get_or_create(name=u'البرلمان المغربي',
@@ -581,7 +595,7 @@ class ElectionCompareViewTest(TestCase):
         election = Election.objects.create(name='elec foo', slug='elec-foo', owner=user, published=True)
         first_candidate = Candidate.objects.create(name='bar baz', election=election)
 
-        response = self.client.get(reverse('election_compare_asynchronous_call',
+        response = self.client.delete(reverse('election_compare_asynchronous_call',
                                             kwargs={
                                                 'username': user.username,
                                                 'slug': election.slug,
@@ -591,6 +605,27 @@ class ElectionCompareViewTest(TestCase):
         self.assertEqual(response.status_code, 405)
 
 
+    def test_election_compare_asynchronous_call_conditional_get(self):
+        user = User.objects.create(username='foobar')
+        election = Election.objects.create(name='elec foo', slug='elec-foo', owner=user, published=True)
+        first_candidate = Candidate.objects.create(name='bar baz', election=election)
+        url = reverse('election_compare_asynchronous_call', kwargs={'username': user.username,
+                                                                    'slug': election.slug,
+                                                                    'candidate_slug': first_candidate.slug})
+        response = self.client.get(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        # Only the election version is read
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        PersonalData.objects.create(election=election, label='bigote')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue('bigote' in json.loads(response.content)['personal_data'])
+
     def test_comparison_with_only_one_candidate_is_being_selected(self):
         user = User.objects.create(username='foobar')
         election = Election.objects.create(name='elec foo', slug='elec-foo', owner=user, published=True)
@@ -1076,7 +1111,7 @@ class HomeTemplateView(TestCase):
         response = self.client.get(self.url)
         self.assertTrue('last_elections' in response.context)
         elections = response.context['last_elections']
-        self.assertTrue(elections.count() == 5)
+        self.assertTrue(len(elections) == 5)
         self.assertTrue(elections[0] == election6)
 
         
@@ -1092,7 +1127,7 @@ class HomeTemplateView(TestCase):
         response = self.client.get(self.url)
         self.assertTrue('last_elections' in response.context)
         elections = response.context['last_elections']
-        self.assertTrue(elections.count() == 2)
+        self.assertTrue(len(elections) == 2)
         self.assertTrue(elections[0] == election2)
         
     def test_it_brings_the_just_five_highlighted_elections(self):
@@ -1107,7 +1142,56 @@ class HomeTemplateView(TestCase):
         response = self.client.get(self.url)
         self.assertTrue('highlighted_elections' in response.context)
         elections = response.context['highlighted_elections']
-        self.assertTrue(elections.count() == 5)
+        self.assertTrue(len(elections) == 5)
+
+    def test_home_page_does_not_query_the_database(self):
+        self.user = User.objects.create_user(username='joe', password=PASSWORD, email='joe@example.net')
+        highlighted = Election.objects.create(owner=self.user, name='Election', slug='election1', published=True, highlighted=True)
+        election = Election.objects.create(owner=self.user, name='Election', slug='election2', published=True)
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['highlighted_elections'], [highlighted])
+
+        election.highlighted = True
+        election.save()
+        highlighted.published = False
+        highlighted.save()
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['highlighted_elections'], [election])
+        self.assertEqual(response.context['last_elections'], [election])
+
+    def test_home_page_sees_elections_unpublished_by_other_workers(self):
+        self.user = User.objects.create_user(username='joe', password=PASSWORD, email='joe@example.net')
+        highlighted = Election.objects.create(owner=self.user, name='Election', slug='election1', published=True, highlighted=True)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['highlighted_elections'], [highlighted])
+
+        # What another worker does, without touching the cache of this one
+        Election.objects.filter(pk=highlighted.pk).update(published=False)
+        CacheVersion.bump(HOME_ELECTIONS_VERSION)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['highlighted_elections'], [highlighted])
+
+        # Once the version this worker read expires
+        cache.delete(HOME_ELECTIONS_VERSION_CACHE_KEY)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['highlighted_elections'], [])
+        self.assertEqual(response.context['last_elections'], [])
+
+    def test_home_page_reads_the_version_on_every_hit_without_timeout(self):
+        self.user = User.objects.create_user(username='joe', password=PASSWORD, email='joe@example.net')
+        highlighted = Election.objects.create(owner=self.user, name='Election', slug='election1', published=True, highlighted=True)
+        timeout = settings.HOME_ELECTIONS_VERSION_CACHE_TIMEOUT
+        settings.HOME_ELECTIONS_VERSION_CACHE_TIMEOUT = 0
+        try:
+            self.client.get(reverse('home'))
+            Election.objects.filter(pk=highlighted.pk).update(published=False)
+            CacheVersion.bump(HOME_ELECTIONS_VERSION)
+            response = self.client.get(reverse('home'))
+        finally:
+            settings.HOME_ELECTIONS_VERSION_CACHE_TIMEOUT = timeout
+        self.assertEqual(response.context['highlighted_elections'], [])
 
         
     # def test_it_brings_the_last_created_and_published_elections(self):
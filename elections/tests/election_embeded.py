@@ -107,7 +107,7 @@ class ElectionEmbededDetail(TestCase):
 		self.assertTemplateUsed(response, "elections/embeded/base_embed.html")
 
 		resolver_match = resolve(url)
-		self.assertEquals(resolver_match.func.__module__,"candidator.elections.views.medianaranja_views")
+		self.assertEquals(resolver_match.func.__module__,"elections.views.medianaranja_views")
 
 
 	def test_medianaranja_to_answer_view(self):
@@ -132,7 +132,7 @@ class ElectionEmbededDetail(TestCase):
 		self.assertTemplateUsed(response, "elections/embeded/base_embed.html")
 
 		resolver_match = resolve(url)
-		self.assertEquals(resolver_match.func.__module__,"candidator.elections.views.medianaranja_views")
+		self.assertEquals(resolver_match.func.__module__,"elections.views.medianaranja_views")
 
 	def test_medianaranja_embeded_does_not_require_csrf_token(self):
 		from django.test import Client
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import gzip
+from StringIO import StringIO
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.utils import simplejson as json
+
+from elections.embed import get_embed_bundle
+from elections.models import Election, Candidate, Category, Question, Answer, PersonalData, PersonalDataCandidate,\
+                             BackgroundCategory, Background, BackgroundCandidate, Link
+
+
+class EmbedBundleTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='joe', password='joe', email='joe@doe.cl')
+        self.election = Election.objects.create(name='election', owner=self.user, slug='barbaz', published=True)
+        self.election.category_set.all().delete()
+        self.election.personaldata_set.all().delete()
+        self.election.backgroundcategory_set.all().delete()
+        self.category = Category.objects.create(name='Pets', election=self.election, slug='pets')
+        self.question = Question.objects.create(question='Dogs?', category=self.category)
+        self.answer = Answer.objects.create(question=self.question, caption='Yes')
+        self.personal_data = PersonalData.objects.create(election=self.election, label='Bigote')
+        background_category = BackgroundCategory.objects.create(election=self.election, name='Education')
+        self.background = Background.objects.create(category=background_category, name='School')
+        self.candidate = Candidate.objects.create(name='Juan Candidato', election=self.election)
+        self.candidate.associate_answer(self.answer)
+        PersonalDataCandidate.objects.create(candidate=self.candidate, personal_data=self.personal_data, value='Frondoso')
+        BackgroundCandidate.objects.create(candidate=self.candidate, background=self.background, value='Liceo')
+        Link.objects.create(candidate=self.candidate, name='twitter', url='http://twitter.com/juan')
+        Candidate.objects.create(name='Pedro Candidato', election=self.election)
+        self.url = reverse('election_embed_bundle', kwargs={'username': self.user.username, 'slug': self.election.slug})
+
+    def test_bundle(self):
+        election = Election.objects.get(pk=self.election.pk)
+        bundle = get_embed_bundle(election)
+        self.assertEqual(bundle['election']['name'], 'election')
+        self.assertEqual(bundle['categories'], [{'id': self.category.pk, 'name': 'Pets', 'questions': [
+            {'id': self.question.pk, 'question': 'Dogs?', 'answers': [{'id': self.answer.pk, 'caption': 'Yes'}]}]}])
+        self.assertEqual(bundle['personal_data'], [{'id': self.personal_data.pk, 'label': 'Bigote'}])
+        self.assertEqual(bundle['background_categories'][0]['backgrounds'], [{'id': self.background.pk, 'name': 'School'}])
+        juan, pedro = bundle['candidates']
+        self.assertEqual(juan['answers'], {self.question.pk: self.answer.pk})
+        self.assertEqual(juan['personal_data'], {self.personal_data.pk: 'Frondoso'})
+        self.assertEqual(juan['backgrounds'], {self.background.pk: 'Liceo'})
+        self.assertEqual(juan['links'], [{'name': 'twitter', 'url': 'http://twitter.com/juan'}])
+        self.assertEqual(pedro['answers'], {})
+        self.assertEqual(pedro['photo'], None)
+
+    def test_bundle_queries_do_not_depend_on_the_candidates(self):
+        for i in range(5):
+            Candidate.objects.create(name='Candidato %d' % i, election=self.election)
+        election = Election.objects.get(pk=self.election.pk)
+        get_embed_bundle(election)
+        # Everything but the questionnaire, which is kept between requests
+        with self.assertNumQueries(8):
+            get_embed_bundle(election)
+
+    def test_view(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Access-Control-Allow-Origin'], '*')
+        self.assertTrue('public' in response['Cache-Control'])
+        bundle = json.loads(gzip.GzipFile(fileobj=StringIO(response.content)).read())
+        self.assertEqual(len(bundle['candidates']), 2)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unpublished_elections_have_no_bundle(self):
+        Election.objects.filter(pk=self.election.pk).update(published=False)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
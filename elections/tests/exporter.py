@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from django.core.files import File
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+
+from elections.exporter import export_election, get_public_urls
+from elections.models import Election, Candidate, Category
+from elections.thumbnails import generator
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+
+
+class ElectionExporterTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='joe', password='joe', email='joe@doe.cl')
+        self.election = Election.objects.create(name='election', owner=self.user, slug='barbaz', published=True)
+        self.category = Category.objects.create(name='Pets', election=self.election, slug='pets')
+        self.first_candidate = Candidate.objects.create(name='Juan Candidato', election=self.election)
+        self.second_candidate = Candidate.objects.create(name='Pedro Candidato', election=self.election)
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def read(self, file_name):
+        with open(os.path.join(self.output_dir, file_name)) as page:
+            return page.read()
+
+    def test_public_urls(self):
+        urls = get_public_urls(self.election)
+        self.assertTrue('/joe/barbaz/' in urls)
+        self.assertTrue('/joe/barbaz/about' in urls)
+        self.assertTrue('/joe/barbaz/juan-candidato/embeded' in urls)
+        self.assertTrue('/joe/barbaz/compare/juan-candidato/pedro-candidato/pets' in urls)
+        self.assertTrue('/joe/barbaz/compare/pedro-candidato/juan-candidato/pets' in urls)
+        self.assertFalse('/joe/barbaz/compare/juan-candidato/juan-candidato' in urls)
+        self.assertEqual(len(urls), len(set(urls)))
+
+    def test_export_rewrites_internal_links(self):
+        report = export_election(self.election, self.output_dir, base_url='/static-site', processes=1)
+        self.assertEqual(report['failed'], [])
+        self.assertTrue('joe/barbaz/index.html' in report['written'])
+        self.assertTrue('joe/barbaz/candidate_list.json/index.html' in report['written'])
+
+        detail = self.read('joe/barbaz/index.html')
+        self.assertTrue('/static-site/joe/barbaz/about/index.html' in detail)
+        self.assertFalse('"/joe/barbaz/about"' in detail)
+
+    def test_export_has_no_links_to_the_render_host(self):
+        export_election(self.election, self.output_dir, base_url='http://static.example.org/site',
+                        origin='http://candideit.org', processes=1)
+        for directory, directories, file_names in os.walk(self.output_dir):
+            for file_name in file_names:
+                with open(os.path.join(directory, file_name)) as page:
+                    self.assertFalse('testserver' in page.read(), os.path.join(directory, file_name))
+
+        compare = self.read('joe/barbaz/compare/index.html')
+        self.assertTrue('"http://static.example.org/site/joe/barbaz/compare/index.html"' in compare)
+        self.assertTrue('"/joe/barbaz/compare"' in compare)
+        embeded = self.read('joe/barbaz/embeded/index.html')
+        self.assertTrue('href="http://candideit.org/joe/barbaz/medianaranja/embeded"' in embeded)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'joe/barbaz/medianaranja/embeded')))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'joe/barbaz/compare-async/juan-candidato/index.html')))
+
+    def test_export_generates_the_thumbnails_it_renders(self):
+        self.first_candidate.photo.save('exported.jpg', File(open(os.path.join(dirname, 'media/dummy.jpg'), 'rb')))
+        mode = generator.mode
+        generator.mode = 'pool'
+        try:
+            export_election(self.election, self.output_dir, processes=1)
+            self.assertEqual(generator.mode, 'pool')
+        finally:
+            generator.mode = mode
+            os.unlink(self.first_candidate.photo.path)
+        detail = self.read('joe/barbaz/juan-candidato/index.html')
+        self.assertFalse(self.first_candidate.photo.name.encode('utf-8') in detail)
+
+    def test_incremental_export_only_writes_changed_pages(self):
+        export_election(self.election, self.output_dir, processes=1)
+        report = export_election(self.election, self.output_dir, processes=1, incremental=True)
+        self.assertEqual(report['written'], [])
+        self.assertFalse(report['unchanged'] == [])
+
+        self.second_candidate.delete()
+        election = Election.objects.get(pk=self.election.pk)
+        report = export_election(election, self.output_dir, processes=1, incremental=True)
+        self.assertTrue('joe/barbaz/index.html' in report['written'])
+        self.assertTrue('joe/barbaz/about/index.html' in report['unchanged'])
+        self.assertTrue('joe/barbaz/pedro-candidato/index.html' in report['deleted'])
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'joe/barbaz/pedro-candidato/index.html')))
+
+    def test_incremental_export_to_another_base_url_writes_every_page(self):
+        export_election(self.election, self.output_dir, base_url='/old', processes=1)
+        report = export_election(self.election, self.output_dir, base_url='/new', processes=1, incremental=True)
+        self.assertEqual(report['unchanged'], [])
+        self.assertTrue('joe/barbaz/about/index.html' in report['written'])
+        self.assertTrue('/new/joe/barbaz/about/index.html' in self.read('joe/barbaz/index.html'))
+
+        report = export_election(self.election, self.output_dir, base_url='/new', origin='http://candideit.org',
+                                 processes=1, incremental=True)
+        self.assertEqual(report['unchanged'], [])
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command('elections_exporter', 'joe', 'barbaz', self.output_dir, processes=1, stdout=stdout)
+        self.assertTrue('failed: 0' in stdout.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'manifest.json')))
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import os
+
+from django.core.files import File
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+
+from elections.models import Election, Candidate, PersonalData, PersonalDataCandidate
+from elections.thumbnails import generator
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+
+
+class ElectionPageCacheTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='joe', password='joe', email='joe@doe.cl')
+        self.election = Election.objects.create(name='election', owner=self.user, slug='barbaz', published=True)
+        self.candidate = Candidate.objects.create(name='Juan Candidato', election=self.election)
+        self.url = reverse('candidate_detail_embeded', kwargs={'username': self.user.username,
+                                                               'election_slug': self.election.slug,
+                                                               'slug': self.candidate.slug})
+        self.mode = generator.mode
+        generator.mode = 'immediate'
+
+    def tearDown(self):
+        generator.mode = self.mode
+
+    def test_anonymous_pages_are_cached(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        # Only the election version is read
+        with self.assertNumQueries(1):
+            cached_response = self.client.get(self.url)
+        self.assertEqual(cached_response.status_code, 200)
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(cached_response['Content-Type'], response['Content-Type'])
+
+    def test_pages_are_cached_per_host_and_scheme(self):
+        self.client.get(self.url)
+        for extra in ({'HTTP_HOST': 'other.example.org'}, {'wsgi.url_scheme': 'https'}):
+            response = self.client.get(self.url, **extra)
+            self.assertTrue(response.context is not None)
+
+    def test_editing_the_election_invalidates_its_pages(self):
+        self.client.get(self.url)
+        personal_data = PersonalData.objects.create(election=self.election, label='Bigote')
+        PersonalDataCandidate.objects.create(candidate=self.candidate, personal_data=personal_data, value='Frondoso')
+
+        response = self.client.get(self.url)
+        self.assertTrue('Frondoso' in response.content)
+
+    def test_pages_of_unpublished_elections_are_not_cached(self):
+        Election.objects.filter(pk=self.election.pk).update(published=False)
+        self.client.get(self.url)
+        self.assertTrue(self.client.get(self.url).context is not None)
+
+    def test_pages_are_not_cached_for_logged_in_users(self):
+        self.client.login(username='joe', password='joe')
+        self.client.get(self.url)
+        self.assertTrue(self.client.get(self.url).context is not None)
+
+    def test_pages_with_pending_thumbnails_are_not_cached(self):
+        self.candidate.photo.save('pending.jpg', File(open(os.path.join(dirname, 'media/dummy.jpg'), 'rb')))
+        generator.mode = 'pool'
+        generator.enqueue = lambda *args: None
+        try:
+            self.client.get(self.url)
+            self.assertTrue(self.client.get(self.url).context is not None)
+        finally:
+            del generator.enqueue
+            os.unlink(self.candidate.photo.path)
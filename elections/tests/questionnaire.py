@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+
+from elections.cache import LRUCache
+from elections.exceptions import InvalidAnswersError
+from elections.models import Election, Candidate, Category, Question, Answer
+from elections.questionnaire import get_questionnaire, AnswerVector
+
+
+class QuestionnaireTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='joe')
+        self.election = Election.objects.create(name='election', owner=self.user, slug='barbaz')
+        self.election.category_set.all().delete()
+        self.category1 = Category.objects.create(name='FooCat', election=self.election, order=1)
+        self.category2 = Category.objects.create(name='FooCat2', election=self.election, order=2)
+        self.question1 = Question.objects.create(question='FooQuestion', category=self.category1)
+        self.question2 = Question.objects.create(question='BarQuestion', category=self.category2)
+        self.question3 = Question.objects.create(question='BazQuestion', category=self.category2)
+        self.answer1_1 = Answer.objects.create(question=self.question1, caption='Yes')
+        self.answer1_2 = Answer.objects.create(question=self.question1, caption='No')
+        self.answer2_1 = Answer.objects.create(question=self.question2, caption='Yes')
+
+    def get_election(self):
+        return Election.objects.get(pk=self.election.pk)
+
+    def test_compiles_the_election_tree(self):
+        questionnaire = get_questionnaire(self.get_election())
+
+        self.assertEqual(questionnaire.categories, (self.category1, self.category2))
+        self.assertEqual(questionnaire.questions, (self.question1, self.question2, self.question3))
+        self.assertEqual(len(questionnaire), 3)
+        self.assertTrue(questionnaire.check)
+        expected_stt = (
+            (self.category1, ((0, self.question1, (self.answer1_1, self.answer1_2)),)),
+            (self.category2, ((1, self.question2, (self.answer2_1,)), (2, self.question3, ()))),
+        )
+        self.assertEqual(questionnaire.stt, expected_stt)
+
+    def test_an_election_without_questions_is_not_checked(self):
+        self.election.category_set.all().delete()
+        questionnaire = get_questionnaire(self.get_election())
+        self.assertFalse(questionnaire.check)
+        self.assertEqual(len(questionnaire), 0)
+
+    def test_questionnaire_is_compiled_once(self):
+        election = self.get_election()
+        questionnaire = get_questionnaire(election)
+        with self.assertNumQueries(0):
+            self.assertTrue(get_questionnaire(election) is questionnaire)
+            questionnaire.stt[0][1][0][1].category
+
+    def test_saving_a_question_invalidates_the_questionnaire(self):
+        questionnaire = get_questionnaire(self.get_election())
+        self.question1.question = 'Renamed'
+        self.question1.save()
+
+        new_questionnaire = get_questionnaire(self.get_election())
+        self.assertFalse(new_questionnaire is questionnaire)
+        self.assertEqual(new_questionnaire.questions[0].question, 'Renamed')
+
+    def test_deleting_an_answer_invalidates_the_questionnaire(self):
+        get_questionnaire(self.get_election())
+        self.answer1_2.delete()
+
+        questionnaire = get_questionnaire(self.get_election())
+        self.assertEqual(questionnaire.answers_by_question[self.question1.pk], (self.answer1_1,))
+
+    def test_creating_a_category_invalidates_the_questionnaire(self):
+        get_questionnaire(self.get_election())
+        category = Category.objects.create(name='FooCat3', election=self.election, order=3)
+
+        questionnaire = get_questionnaire(self.get_election())
+        self.assertEqual(questionnaire.categories[-1], category)
+
+    def test_edits_within_the_same_second_invalidate_the_questionnaire(self):
+        # MySQL stores updated_at without microseconds
+        updated_at = self.get_election().updated_at.replace(microsecond=0)
+        Election.objects.filter(pk=self.election.pk).update(updated_at=updated_at)
+        get_questionnaire(self.get_election())
+        self.question1.question = 'Renamed'
+        self.question1.save()
+        Election.objects.filter(pk=self.election.pk).update(updated_at=updated_at)
+
+        questionnaire = get_questionnaire(self.get_election())
+        self.assertEqual(questionnaire.questions[0].question, 'Renamed')
+
+    def test_saving_a_stale_election_does_not_move_its_version_back(self):
+        stale = self.get_election()
+        Question.objects.create(question='QuxQuestion', category=self.category1)
+        version = self.get_election().version
+        stale.name = 'Renamed'
+        stale.save()
+
+        self.assertEqual(stale.version, version + 1)
+        self.assertEqual(self.get_election().version, version + 1)
+
+    def test_medianaranja_form_does_not_walk_the_tree(self):
+        url = reverse('medianaranja1', kwargs={'username': self.user.username, 'election_slug': self.election.slug})
+        self.client.get(url)
+        # The election and its owner, nothing from the questionnaire
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.context['stt'], get_questionnaire(self.get_election()).stt)
+
+    def form_data(self, **kwargs):
+        data = {
+            'question-id-0': self.question1.pk, 'question-0': self.answer1_2.pk, 'importance-0': 5,
+            'question-id-1': self.question2.pk, 'question-1': -1, 'importance-1': 3,
+            'question-id-2': self.question3.pk, 'importance-2': 1,
+        }
+        data.update(kwargs)
+        return data
+
+    def test_decode(self):
+        questionnaire = get_questionnaire(self.get_election())
+        with self.assertNumQueries(0):
+            vector = questionnaire.decode(self.form_data())
+        expected = AnswerVector(question_ids=(self.question1.pk, self.question2.pk, self.question3.pk),
+                                answer_ids=(self.answer1_2.pk, None, None),
+                                importances=(5, 3, 1))
+        self.assertEqual(vector, expected)
+
+    def test_decode_rejects_answers_from_another_election(self):
+        other_election = Election.objects.create(name='other election', owner=self.user, slug='other')
+        other_answer = Answer.objects.filter(question__category__election=other_election)[0]
+        questionnaire = get_questionnaire(self.get_election())
+
+        self.assertRaises(InvalidAnswersError, questionnaire.decode, self.form_data(**{'question-0': other_answer.pk}))
+
+    def test_decode_rejects_reordered_or_repeated_questions(self):
+        questionnaire = get_questionnaire(self.get_election())
+        swapped = self.form_data(**{'question-id-1': self.question3.pk, 'question-id-2': self.question2.pk})
+        self.assertRaises(InvalidAnswersError, questionnaire.decode, swapped)
+        repeated = self.form_data(**{'question-id-1': self.question1.pk, 'question-1': self.answer1_1.pk})
+        self.assertRaises(InvalidAnswersError, questionnaire.decode, repeated)
+
+    def test_decode_rejects_answers_to_another_question(self):
+        questionnaire = get_questionnaire(self.get_election())
+        self.assertRaises(InvalidAnswersError, questionnaire.decode, self.form_data(**{'question-0': self.answer2_1.pk}))
+
+    def test_decode_rejects_questions_from_another_election(self):
+        other_election = Election.objects.create(name='other election', owner=self.user, slug='other')
+        other_question = Question.objects.filter(category__election=other_election)[0]
+        questionnaire = get_questionnaire(self.get_election())
+
+        self.assertRaises(InvalidAnswersError, questionnaire.decode, self.form_data(**{'question-id-1': other_question.pk}))
+
+    def test_decode_rejects_missing_or_malformed_fields(self):
+        questionnaire = get_questionnaire(self.get_election())
+        data = self.form_data()
+        del data['importance-2']
+
+        self.assertRaises(InvalidAnswersError, questionnaire.decode, data)
+        self.assertRaises(InvalidAnswersError, questionnaire.decode, self.form_data(**{'importance-1': 'a lot'}))
+
+    def test_tampered_medianaranja_post_is_a_bad_request(self):
+        url = reverse('medianaranja1', kwargs={'username': self.user.username, 'election_slug': self.election.slug})
+        response = self.client.post(url, self.form_data(**{'question-0': self.answer2_1.pk}))
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_medianaranja_post_shows_the_top_k(self):
+        for name in ('Candidate 1', 'Candidate 2', 'Candidate 3'):
+            Candidate.objects.create(name=name, election=self.election)
+        url = reverse('medianaranja1', kwargs={'username': self.user.username, 'election_slug': self.election.slug})
+        response = self.client.post(url, self.form_data(k=2))
+        self.assertEqual(len(response.context['others']), 1)
+
+        response = self.client.post(url, self.form_data(k='all'))
+        self.assertEqual(response.status_code, 400)
+
+
+class LRUCacheTest(TestCase):
+    def test_evicts_the_least_recently_used_entry(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertEqual(cache.get('b', 'missing'), 'missing')
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_pop_and_clear(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        self.assertEqual(cache.pop('a'), 1)
+        self.assertEqual(cache.pop('a'), None)
+        cache.set('b', 2)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from elections.models import Election, Candidate, Category, Question, Answer
+from elections.answer_index import get_answer_index, iter_bits
+from elections.scoring import ScoringMatrix, get_scores_and_candidates, rank, _results
+
+
+class ScoringTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='joe')
+        self.election = Election.objects.create(name='election', owner=self.user, slug='barbaz')
+        self.election.category_set.all().delete()
+        self.other_election = Election.objects.create(name='other election', owner=self.user, slug='other')
+
+        self.category1 = Category.objects.create(name='FooCat', election=self.election, order=1)
+        self.category2 = Category.objects.create(name='FooCat2', election=self.election, order=2)
+        self.question1 = Question.objects.create(question='FooQuestion', category=self.category1)
+        self.question2 = Question.objects.create(question='BarQuestion', category=self.category1)
+        self.question3 = Question.objects.create(question='BazQuestion', category=self.category2)
+        self.answer1_1 = Answer.objects.create(question=self.question1, caption='Yes')
+        self.answer1_2 = Answer.objects.create(question=self.question1, caption='No')
+        self.answer2_1 = Answer.objects.create(question=self.question2, caption='Yes')
+        self.answer2_2 = Answer.objects.create(question=self.question2, caption='No')
+        self.answer3_1 = Answer.objects.create(question=self.question3, caption='Yes')
+        self.answer3_2 = Answer.objects.create(question=self.question3, caption='No')
+
+        self.candidate1 = Candidate.objects.create(name='BarBaz', election=self.election)
+        self.candidate2 = Candidate.objects.create(name='FooFoo', election=self.election)
+        self.candidate3 = Candidate.objects.create(name='Silent', election=self.election)
+        self.candidate1.associate_answer(self.answer1_1)
+        self.candidate1.associate_answer(self.answer2_2)
+        self.candidate1.associate_answer(self.answer3_1)
+        self.candidate2.associate_answer(self.answer1_2)
+        self.candidate2.associate_answer(self.answer2_2)
+
+    def get_election(self):
+        return Election.objects.get(pk=self.election.pk)
+
+
+class ScoringMatrixTest(ScoringTestCase):
+    def assertMatchesGetScore(self, answers, importances):
+        matrix = ScoringMatrix(self.election)
+        scores = matrix.score(answers, importances)
+        self.assertEqual(len(scores), 3)
+        for candidate, score in zip(matrix.candidates, scores):
+            self.assertEqual(score, candidate.get_score(answers, importances))
+
+    def test_scores_match_get_score(self):
+        answers = [[self.answer1_1], [self.answer2_2], [self.answer3_2]]
+        self.assertMatchesGetScore(answers, [5, 3, 1])
+        self.assertMatchesGetScore(answers, [1, 1, 1])
+
+    def test_scores_match_get_score_with_skipped_questions(self):
+        answers = [[], [self.answer2_2], []]
+        self.assertMatchesGetScore(answers, [5, 3, 1])
+        self.assertMatchesGetScore([[], [], []], [5, 3, 1])
+
+    def test_scores_match_get_score_with_zero_importances(self):
+        answers = [[self.answer1_1], [self.answer2_2], [self.answer3_1]]
+        self.assertMatchesGetScore(answers, [0, 0, 0])
+        self.assertMatchesGetScore(answers, [4, 2, 0])
+
+    def test_scores_only_the_given_candidates(self):
+        matrix = ScoringMatrix(self.election, [self.candidate2])
+        answers = [[self.answer1_2], [self.answer2_2], [self.answer3_1]]
+        scores = matrix.score(answers, [1, 1, 1])
+        self.assertEqual(matrix.candidates, [self.candidate2])
+        self.assertEqual(scores, [self.candidate2.get_score(answers, [1, 1, 1])])
+
+    def test_number_of_queries_does_not_depend_on_candidates(self):
+        for i in range(10):
+            Candidate.objects.create(name='Candidate %d' % i, election=self.election)
+        answers = [[self.answer1_1], [self.answer2_2], [self.answer3_2]]
+        # The questionnaire, the candidates and the answer index
+        with self.assertNumQueries(6):
+            matrix = ScoringMatrix(self.election)
+            matrix.score(answers, [5, 3, 1])
+        with self.assertNumQueries(1):
+            ScoringMatrix(self.election).score(answers, [5, 3, 1])
+
+
+class AnswerIndexTest(ScoringTestCase):
+    def test_iter_bits(self):
+        self.assertEqual(list(iter_bits(0)), [])
+        self.assertEqual(list(iter_bits(0b101001)), [0, 3, 5])
+
+    def test_index(self):
+        index = get_answer_index(self.get_election())
+        self.assertEqual(index.positions, {self.candidate1.pk: 0, self.candidate2.pk: 1, self.candidate3.pk: 2})
+        self.assertEqual(index.get(self.answer2_2.pk), 0b11)
+        self.assertEqual(index.get(self.answer1_2.pk), 0b10)
+        self.assertEqual(index.get(self.answer3_2.pk), 0)
+
+    def test_associate_answer_patches_the_index(self):
+        get_answer_index(self.get_election())
+        self.candidate3.associate_answer(self.answer2_2)
+        self.candidate1.associate_answer(self.answer2_1)
+
+        election = self.get_election()
+        with self.assertNumQueries(0):
+            index = get_answer_index(election)
+        self.assertEqual(index.get(self.answer2_2.pk), 0b110)
+        self.assertEqual(index.get(self.answer2_1.pk), 0b1)
+        self.assertEqual(self.candidate1.answers.filter(question=self.question2).count(), 1)
+        answers = [[self.answer1_1], [self.answer2_2], [self.answer3_2]]
+        matrix = ScoringMatrix(election)
+        for candidate, score in zip(matrix.candidates, matrix.score(answers, [5, 3, 1])):
+            self.assertEqual(score, candidate.get_score(answers, [5, 3, 1]))
+
+    def test_patched_index_survives_updated_at_without_microseconds(self):
+        get_answer_index(self.get_election())
+        self.candidate3.associate_answer(self.answer2_2)
+        # As stored by MySQL
+        election = self.get_election()
+        Election.objects.filter(pk=election.pk).update(updated_at=election.updated_at.replace(microsecond=0))
+
+        election = self.get_election()
+        with self.assertNumQueries(0):
+            index = get_answer_index(election)
+        self.assertEqual(index.version, election.version)
+        self.assertEqual(index.get(self.answer2_2.pk), 0b111)
+
+    def test_new_candidates_rebuild_the_index(self):
+        get_answer_index(self.get_election())
+        candidate = Candidate.objects.create(name='New', election=self.election)
+        candidate.associate_answer(self.answer1_1)
+
+        index = get_answer_index(self.get_election())
+        self.assertEqual(index.get(self.answer1_1.pk), 0b1001)
+
+
+class ResultCacheTest(ScoringTestCase):
+    def test_same_answers_are_scored_once(self):
+        answers = [[self.answer1_1], [self.answer2_2], []]
+        election = self.get_election()
+        scores_and_candidates, ranking = get_scores_and_candidates(election, answers, [5, 3, 1])
+        self.assertEqual([candidate for score, by_category, candidate in scores_and_candidates],
+                         [self.candidate1, self.candidate2, self.candidate3])
+        self.assertEqual(ranking[0][2], self.candidate1)
+        self.assertEqual(ranking[0][:2], list(self.candidate1.get_score(answers, [5, 3, 1])))
+
+        hits = _results.hits
+        with self.assertNumQueries(0):
+            self.assertEqual(get_scores_and_candidates(election, answers, [5, 3, 1]), (scores_and_candidates, ranking))
+        self.assertEqual(_results.hits, hits + 1)
+        self.assertNotEqual(get_scores_and_candidates(election, answers, [1, 3, 5]), (scores_and_candidates, ranking))
+
+    def test_changing_candidate_answers_invalidates_the_results(self):
+        answers = [[self.answer1_2], [], []]
+        get_scores_and_candidates(self.get_election(), answers, [1, 1, 1])
+        self.candidate3.associate_answer(self.answer1_2)
+
+        scores_and_candidates, ranking = get_scores_and_candidates(self.get_election(), answers, [1, 1, 1])
+        self.assertEqual(scores_and_candidates[2][0], scores_and_candidates[1][0])
+        self.assertTrue(scores_and_candidates[2][0] > 0)
+
+    def test_top_k(self):
+        answers = [[self.answer1_2], [self.answer2_2], []]
+        scores_and_candidates, ranking = get_scores_and_candidates(self.get_election(), answers, [1, 1, 1], k=2)
+        self.assertEqual([candidate for score, by_category, candidate in ranking], [self.candidate2, self.candidate1])
+        self.assertEqual(rank(scores_and_candidates), ranking + [scores_and_candidates[2]])
+
+    def test_ties_are_broken_by_category_scores_and_then_by_candidate(self):
+        candidate4 = Candidate.objects.create(name='Silent too', election=self.election)
+        answers = [[self.answer1_1], [], [self.answer3_1]]
+        scores_and_candidates, ranking = get_scores_and_candidates(self.get_election(), answers, [1, 0, 1])
+        self.assertEqual([candidate for score, by_category, candidate in ranking],
+                         [self.candidate1, self.candidate2, self.candidate3, candidate4])
+        self.assertEqual(rank(scores_and_candidates, 3), ranking[:3])
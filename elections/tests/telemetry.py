@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from StringIO import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from elections.models import Election, Visitor, VisitorAnswer, VisitorScore, CategoryScore, CompactVisitor, ElectionSnapshot
+from elections.telemetry import VisitorRecord, TelemetryWriter, write_visitor_records, write_compact_visitor_records
+
+
+class TelemetryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='joe')
+        self.election = Election.objects.create(name='election', owner=self.user, slug='barbaz')
+
+    def make_record(self, election_url='/joe/barbaz/'):
+        answers = ((u'Sí', u'¿Educación gratuita?', u'Educación', 5),
+                   (u'', u'¿Desmunicipalización?', u'Educación', 3))
+        scores = ((u'Candidate 1', 62.5, ((u'Educación', 62.5), (u'Salud', 0))),
+                  (u'Candidate 2', 100.0, ((u'Educación', 100.0), (u'Salud', 0))))
+        outline = ((u'¿Educación gratuita?', u'Educación', ((7, u'Sí'), (8, u'No'))),
+                   (u'¿Desmunicipalización?', u'Educación', ((9, u'Sí'), (10, u'No'))))
+        return VisitorRecord(self.election.pk, election_url, datetime(2012, 10, 28, 20, 0), answers, scores, (7, -1), outline)
+
+    def expanded(self, compact_visitor):
+        visitor, answers, scores = compact_visitor.expand()
+        return (visitor.election_id, visitor.election_url, visitor.datestamp,
+                [(a.answer_text, a.question_text, a.question_category_text, a.answer_importance) for a in answers],
+                [(s.candidate_name, s.score, [(c.category_name, c.category_score) for c in category_scores])
+                 for s, category_scores in scores])
+
+    def test_write_visitor_records(self):
+        with self.assertNumQueries(6):
+            write_visitor_records([self.make_record(), self.make_record('/joe/barbaz/embeded')])
+
+        visitors = Visitor.objects.order_by('pk')
+        self.assertEqual(visitors.count(), 2)
+        self.assertEqual(visitors[0].election, self.election)
+        self.assertEqual(visitors[1].election_url, '/joe/barbaz/embeded')
+
+        answers = VisitorAnswer.objects.filter(visitor=visitors[0]).order_by('pk')
+        self.assertEqual([(a.answer_text, a.question_text, a.question_category_text, a.answer_importance) for a in answers],
+                         list(self.make_record().answers))
+
+        score = VisitorScore.objects.get(visitor=visitors[1], candidate_name=u'Candidate 1')
+        self.assertEqual(score.score, 62)
+        category_scores = score.categoryscore_set.order_by('pk')
+        self.assertEqual([(c.category_name, c.category_score) for c in category_scores], [(u'Educación', 62), (u'Salud', 0)])
+        self.assertEqual(CategoryScore.objects.count(), 8)
+
+    def test_buffered_writer_writes_on_flush(self):
+        writer = TelemetryWriter(mode='buffered', background=False)
+        writer.record(self.make_record())
+        writer.record(self.make_record())
+        self.assertEqual(Visitor.objects.count(), 0)
+
+        writer.flush()
+        self.assertEqual(Visitor.objects.count(), 2)
+        self.assertEqual(VisitorScore.objects.count(), 4)
+
+    def test_full_buffer_writes_in_the_calling_thread(self):
+        writer = TelemetryWriter(mode='buffered', max_pending=1, block_timeout=0, background=False)
+        writer.record(self.make_record())
+        self.assertEqual(Visitor.objects.count(), 0)
+
+        writer.record(self.make_record())
+        self.assertEqual(Visitor.objects.count(), 1)
+
+        writer.shutdown()
+        self.assertEqual(Visitor.objects.count(), 2)
+
+    def test_immediate_writer(self):
+        writer = TelemetryWriter(mode='immediate')
+        writer.record(self.make_record())
+        self.assertEqual(Visitor.objects.count(), 1)
+
+    def test_write_compact_visitor_records(self):
+        records = [self.make_record(), self.make_record('/joe/barbaz/embeded')]
+        # The snapshot lookup, its insert and the visitors
+        with self.assertNumQueries(3):
+            write_compact_visitor_records(records)
+        with self.assertNumQueries(2):
+            write_compact_visitor_records(records)
+
+        self.assertEqual(ElectionSnapshot.objects.count(), 1)
+        self.assertEqual(CompactVisitor.objects.count(), 4)
+        compact_visitor = CompactVisitor.objects.order_by('pk')[1]
+        self.assertEqual(compact_visitor.answers, u'7,-1')
+        self.assertEqual(compact_visitor.importances, u'5,3')
+        self.assertEqual(compact_visitor.scores, u'62,62,0,100,100,0')
+        expected = (self.election.pk, u'/joe/barbaz/embeded', datetime(2012, 10, 28, 20, 0),
+                    list(self.make_record().answers),
+                    [(u'Candidate 1', 62, [(u'Educación', 62), (u'Salud', 0)]),
+                     (u'Candidate 2', 100, [(u'Educación', 100), (u'Salud', 0)])])
+        self.assertEqual(self.expanded(compact_visitor), expected)
+
+    def test_compact_writer(self):
+        writer = TelemetryWriter(mode='immediate', storage='compact')
+        writer.record(self.make_record())
+        self.assertEqual(Visitor.objects.count(), 0)
+        self.assertEqual(CompactVisitor.objects.count(), 1)
+
+    def test_compact_visitors_command(self):
+        write_visitor_records([self.make_record(), self.make_record('/joe/barbaz/embeded')])
+        stdout = StringIO()
+        call_command('compact_visitors', delete=True, stdout=stdout)
+        self.assertEqual(stdout.getvalue(), 'barbaz: 2 visitors\n')
+
+        self.assertEqual(Visitor.objects.count(), 0)
+        self.assertEqual(VisitorAnswer.objects.count(), 0)
+        self.assertEqual(CategoryScore.objects.count(), 0)
+        compact_visitors = CompactVisitor.objects.order_by('pk')
+        self.assertEqual(len(compact_visitors), 2)
+        self.assertEqual(ElectionSnapshot.objects.count(), 1)
+        expected = (self.election.pk, u'/joe/barbaz/', datetime(2012, 10, 28, 20, 0),
+                    list(self.make_record().answers),
+                    [(u'Candidate 1', 62, [(u'Educación', 62), (u'Salud', 0)]),
+                     (u'Candidate 2', 100, [(u'Educación', 100), (u'Salud', 0)])])
+        self.assertEqual(self.expanded(compact_visitors[0]), expected)
+
+    def test_compact_visitors_command_skips_compacted_visitors(self):
+        write_visitor_records([self.make_record()])
+        call_command('compact_visitors', stdout=StringIO())
+        stdout = StringIO()
+        call_command('compact_visitors', stdout=stdout)
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertEqual(Visitor.objects.count(), 1)
+        self.assertEqual(CompactVisitor.objects.count(), 1)
+
+        write_visitor_records([self.make_record()])
+        stdout = StringIO()
+        call_command('compact_visitors', delete=True, stdout=stdout)
+        self.assertEqual(stdout.getvalue(), 'barbaz: 1 visitors\n')
+        self.assertEqual(CompactVisitor.objects.count(), 2)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import os
+
+from django.core.files import File
+from django.test import TestCase
+from django.contrib.auth.models import User
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from elections.forms import CandidatePhotoForm
+from elections.models import Election, Candidate
+from elections.thumbnails import generator, get_thumbnail_options, PendingThumbnail, CANDIDATE_PHOTO_THUMBNAILS
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+
+
+class ThumbnailPregenerationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='joe', password='joe', email='joe@doe.cl')
+        self.election = Election.objects.create(name='election', owner=self.user, slug='barbaz')
+        self.candidate = Candidate.objects.create(name='Juan Candidato', election=self.election)
+        self.photo = File(open(os.path.join(dirname, 'media/dummy.jpg'), 'rb'), name='dummy.jpg')
+        self.mode = generator.mode
+        generator.mode = 'immediate'
+
+    def tearDown(self):
+        generator.mode = self.mode
+        if self.candidate.photo:
+            default.kvstore.delete(ImageFile(self.candidate.photo))
+            os.unlink(self.candidate.photo.path)
+
+    def get_thumbnail_name(self, geometry_string, options):
+        return default.backend._get_thumbnail_filename(ImageFile(self.candidate.photo), geometry_string,
+                                                       get_thumbnail_options(options))
+
+    def test_uploads_generate_every_thumbnail(self):
+        form = CandidatePhotoForm(self.candidate, {}, {'photo': self.photo})
+        self.assertTrue(form.is_valid())
+        form.save()
+        for geometry_string, options in CANDIDATE_PHOTO_THUMBNAILS:
+            thumbnail = default.kvstore.get(ImageFile(self.get_thumbnail_name(geometry_string, options), default.storage))
+            self.assertTrue(thumbnail is not None)
+            self.assertEqual(list(thumbnail.size), [int(side) for side in geometry_string.split('x')])
+
+    def test_templates_do_not_resize_with_a_pool(self):
+        self.candidate.photo.save('dummy.jpg', self.photo)
+        generator.mode = 'pool'
+        queued = []
+        generator.enqueue = lambda *args: queued.append(args)
+        try:
+            thumbnail = get_thumbnail(self.candidate.photo, '115x144', crop='center')
+        finally:
+            del generator.enqueue
+        self.assertTrue(isinstance(thumbnail, PendingThumbnail))
+        self.assertEqual(thumbnail.url, self.candidate.photo.url)
+        self.assertEqual(list(thumbnail.size), [115, 144])
+        self.assertEqual(queued, [(self.candidate.photo.name, '115x144', get_thumbnail_options({'crop': 'center'}))])
+        self.assertFalse(default.storage.exists(self.get_thumbnail_name('115x144', {'crop': 'center'})))
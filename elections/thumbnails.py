@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import atexit
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+from django.db import connection
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings as thumbnail_settings, defaults as thumbnail_defaults
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.parsers import parse_geometry
+
+
+logger = logging.getLogger(__name__)
+
+# Every {% thumbnail %} the templates render, as (geometry, options)
+CANDIDATE_PHOTO_THUMBNAILS = (
+    ('32x40', {'crop': 'center'}),
+    ('36x36', {'crop': 'center'}),
+    ('80x100', {'crop': 'center'}),
+    ('100x129', {'crop': 'center'}),
+    ('115x144', {'crop': 'center'}),
+    ('160x200', {'crop': 'center'}),
+)
+ELECTION_LOGO_THUMBNAILS = (
+    ('680x64', {}),
+    ('850x80', {}),
+)
+
+
+def get_thumbnail_options(options):
+    '''
+    options with the defaults ThumbnailBackend adds, which are part of the
+    name of the thumbnail.
+    '''
+    options = dict(options)
+    for key, value in ThumbnailBackend.default_options.iteritems():
+        options.setdefault(key, value)
+    for key, attr in ThumbnailBackend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(thumbnail_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+# Set when the current thread renders a PendingThumbnail, so that the
+# page is not cached with it, see cache_election_page
+_rendering = threading.local()
+
+
+def reset_pending_thumbnails():
+    _rendering.pending = False
+
+
+def rendered_pending_thumbnails():
+    return getattr(_rendering, 'pending', False)
+
+
+class PendingThumbnail(ImageFile):
+    '''
+    Stands in for a thumbnail that is still being generated: the source
+    image, shown at the size of the thumbnail.
+    '''
+
+    def __init__(self, name, source, geometry_string):
+        super(PendingThumbnail, self).__init__(name, default.storage)
+        self.source = source
+        self.set_size(parse_geometry(geometry_string, None))
+
+    @property
+    def url(self):
+        return self.source.url
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    '''
+    sorl-thumbnail backend that never resizes while rendering a template
+    when the generator runs a worker pool: missing thumbnails are queued
+    and a PendingThumbnail is returned until they are ready.
+    '''
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if generator.mode != 'pool':
+            return super(PregeneratedThumbnailBackend, self).get_thumbnail(file_, geometry_string, **options)
+        source = ImageFile(file_)
+        options = get_thumbnail_options(options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        cached = default.kvstore.get(ImageFile(name, default.storage))
+        if cached:
+            return cached
+        generator.enqueue(source.name, geometry_string, options)
+        _rendering.pending = True
+        return PendingThumbnail(name, source, geometry_string)
+
+
+class ThumbnailGenerator(object):
+    '''
+    Generates the thumbnails of uploaded images.
+
+    In 'immediate' mode thumbnails are generated right away, inside the
+    request that uploads the image. In 'pool' mode they are queued for a
+    pool of worker threads, and the same thumbnail is never queued twice.
+    '''
+
+    def __init__(self, mode='immediate', workers=4):
+        self.mode = mode
+        self.workers = workers
+        self.pending = set()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def generate(self, name, geometry_string, options):
+        try:
+            ThumbnailBackend().get_thumbnail(name, geometry_string, **options)
+        except Exception:
+            logger.exception(u"Could not generate the %s thumbnail of %s", geometry_string, name)
+        finally:
+            with self._lock:
+                self.pending.discard(self.get_key(name, geometry_string, options))
+            if self.mode == 'pool':
+                connection.close()
+
+    def get_key(self, name, geometry_string, options):
+        return name, geometry_string, tuple(sorted(options.items()))
+
+    def enqueue(self, name, geometry_string, options):
+        options = get_thumbnail_options(options)
+        if self.mode != 'pool':
+            self.generate(name, geometry_string, options)
+            return
+        key = self.get_key(name, geometry_string, options)
+        with self._lock:
+            if key in self.pending:
+                return
+            self.pending.add(key)
+            if self._pool is None:
+                self._pool = ThreadPool(self.workers)
+                atexit.register(self.shutdown)
+            pool = self._pool
+        pool.apply_async(self.generate, (name, geometry_string, options))
+
+    def enqueue_thumbnails(self, image, thumbnails):
+        '''
+        Queues every thumbnail of image, a FieldFile, in thumbnails.
+        '''
+        if not image:
+            return
+        for geometry_string, options in thumbnails:
+            self.enqueue(image.name, geometry_string, options)
+
+    def shutdown(self):
+        '''
+        Waits for every queued thumbnail.
+        '''
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+generator = ThumbnailGenerator(mode=settings.THUMBNAIL_PREGENERATION_MODE,
+                               workers=settings.THUMBNAIL_PREGENERATION_WORKERS)
+
+
+def enqueue_candidate_thumbnails(candidate):
+    generator.enqueue_thumbnails(candidate.photo, CANDIDATE_PHOTO_THUMBNAILS)
+
+
+def enqueue_election_thumbnails(election):
+    generator.enqueue_thumbnails(election.logo, ELECTION_LOGO_THUMBNAILS)
@@ -0,0 +1,3 @@
+-- Run once on databases created before elections_election.version
+-- existed. syncdb creates new tables but never alters existing ones.
+ALTER TABLE elections_election ADD COLUMN version bigint NOT NULL DEFAULT 0;
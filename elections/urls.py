@@ -18,7 +18,10 @@ from views import associate_answer_to_candidate, ElectionCreateView,\
                   PrePersonalDataView, AnswerDeleteAjaxView, ElectionLogoUpdateView, \
                   ElectionShareView, ElectionRedirectView, HomeTemplateView, CompareView, \
                   ElectionAboutView, ElectionStyleUpdateView, EmbededTemplateView, \
-                  UserElectionsView, TogglePublishView
+                  UserElectionsView, TogglePublishView, medianaranja1_embed, \
+                  election_compare_asynchronous_call, election_embed_bundle
+from django.views.decorators.gzip import gzip_page
+from page_cache import cache_election_page, condition_on_election_version
 
 
 urlpatterns = patterns('',
@@ -28,25 +31,27 @@ urlpatterns = patterns('',
 
     #frontend embed
     # Election detail view embeded
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/embeded/?$', ElectionDetailView.as_view(template_name="elections/embeded/election_detail_profiles.html"), name='election_detail_embeded'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/embeded/?$', cache_election_page(ElectionDetailView.as_view(template_name="elections/embeded/election_detail_profiles.html")), name='election_detail_embeded'),
+    # Whole election as one JSON document for the javascript embed
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/embeded/bundle\.json$', gzip_page(condition_on_election_version(cache_election_page(election_embed_bundle))), name='election_embed_bundle'),
     # Election candidates profiles
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/profiles/embeded/?$', ElectionDetailView.as_view(template_name='elections/embeded/election_detail_profiles.html'), name='election_detail_profiles_embeded'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/profiles/embeded/?$', cache_election_page(ElectionDetailView.as_view(template_name='elections/embeded/election_detail_profiles.html')), name='election_detail_profiles_embeded'),
     # Media Naranja
-    url(r'^(?P<username>[a-zA-Z0-9-]+)/(?P<election_slug>[a-zA-Z0-9-]+)/medianaranja/embeded/?$', 'candidator.elections.views.medianaranja1_embed',name='medianaranja1_embeded'),
+    url(r'^(?P<username>[a-zA-Z0-9-]+)/(?P<election_slug>[a-zA-Z0-9-]+)/medianaranja/embeded/?$', cache_election_page(medianaranja1_embed),name='medianaranja1_embeded'),
 
     # Election compare view
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/embeded/?$', CompareView.as_view(template_name='elections/embeded/election_compare.html'), name='election_compare_embeded'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/embeded/?$', cache_election_page(CompareView.as_view(template_name='elections/embeded/election_compare.html')), name='election_compare_embeded'),
 
     # Election compare view with both candidates (and considering one category)
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/(?P<second_candidate_slug>[-\w]+)/(?P<category_slug>[-\w]+)/embeded/?$', CompareView.as_view(template_name='elections/embeded/election_compare.html'), name='election_compare_two_candidates_embeded'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/(?P<second_candidate_slug>[-\w]+)/(?P<category_slug>[-\w]+)/embeded/?$', cache_election_page(CompareView.as_view(template_name='elections/embeded/election_compare.html')), name='election_compare_two_candidates_embeded'),
 
     # Election compare view with both candidates (and NO category)
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/(?P<second_candidate_slug>[-\w]+)/embeded/?$', CompareView.as_view(template_name='elections/embeded/election_compare.html'), name='election_compare_two_candidates_and_no_category_embeded'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/(?P<second_candidate_slug>[-\w]+)/embeded/?$', cache_election_page(CompareView.as_view(template_name='elections/embeded/election_compare.html')), name='election_compare_two_candidates_and_no_category_embeded'),
 
     # Election compare view with 1 candidate
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/embeded?$', CompareView.as_view(template_name='elections/embeded/election_compare.html'), name='election_compare_one_candidate_embeded'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/embeded?$', cache_election_page(CompareView.as_view(template_name='elections/embeded/election_compare.html')), name='election_compare_one_candidate_embeded'),
      # Election description
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/about/embeded?$', ElectionAboutView.as_view(template_name="elections/embeded/about.html"), name='election_about_embeded'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/about/embeded?$', cache_election_page(ElectionAboutView.as_view(template_name="elections/embeded/about.html")), name='election_about_embeded'),
 
     #frontend
     # Election candidates profiles
@@ -55,27 +60,27 @@ urlpatterns = patterns('',
 
 
 
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/profiles/?$', ElectionDetailView.as_view(template_name='elections/election_detail_profiles.html'), name='election_detail_profiles'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/profiles/?$', cache_election_page(ElectionDetailView.as_view(template_name='elections/election_detail_profiles.html')), name='election_detail_profiles'),
 
     # Election compare view
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/?$', CompareView.as_view(template_name='elections/election_compare.html'), name='election_compare'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/?$', cache_election_page(CompareView.as_view(template_name='elections/election_compare.html')), name='election_compare'),
 
     # Election compare view with both candidates (and considering one category)
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/(?P<second_candidate_slug>[-\w]+)/(?P<category_slug>[-\w]+)/?$', CompareView.as_view(template_name='elections/election_compare.html'), name='election_compare_two_candidates'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/(?P<second_candidate_slug>[-\w]+)/(?P<category_slug>[-\w]+)/?$', cache_election_page(CompareView.as_view(template_name='elections/election_compare.html')), name='election_compare_two_candidates'),
 
     # Election compare view with both candidates (and NO category)
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/(?P<second_candidate_slug>[-\w]+)/?$', CompareView.as_view(template_name='elections/election_compare.html'), name='election_compare_two_candidates_and_no_category'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/(?P<second_candidate_slug>[-\w]+)/?$', cache_election_page(CompareView.as_view(template_name='elections/election_compare.html')), name='election_compare_two_candidates_and_no_category'),
 
     # Election compare view with 1 candidate
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/?$', CompareView.as_view(template_name='elections/election_compare.html'), name='election_compare_one_candidate'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare/(?P<first_candidate_slug>[-\w]+)/?$', cache_election_page(CompareView.as_view(template_name='elections/election_compare.html')), name='election_compare_one_candidate'),
 
     # Asynchronous call for compare view
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare-async/(?P<candidate_slug>[-\w]+)/?$', 'candidator.elections.views.election_compare_asynchronous_call', name='election_compare_asynchronous_call'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/compare-async/(?P<candidate_slug>[-\w]+)/?$', condition_on_election_version(cache_election_page(election_compare_asynchronous_call)), name='election_compare_asynchronous_call'),
 
     # Election description
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/about/?$', ElectionAboutView.as_view(), name='election_about'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/about/?$', cache_election_page(ElectionAboutView.as_view()), name='election_about'),
     # Election detail view
-    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/$', ElectionDetailView.as_view(template_name='elections/election_detail_profiles.html'), name='election_detail'),
+    url(r'^(?P<username>[-\w]+)/(?P<slug>[-\w]+)/$', cache_election_page(ElectionDetailView.as_view(template_name='elections/election_detail_profiles.html')), name='election_detail'),
 
     # Root: login_required (por ahora pues no se ha definido un index)
     url(r'^$', HomeTemplateView.as_view(), name="home"),
@@ -231,11 +236,11 @@ urlpatterns = patterns('',
     
 
     # Candidate detail view
-    url(r'^(?P<username>[-\w]+)/(?P<election_slug>[-\w]+)/(?P<slug>[-\w]+)$', CandidateDetailView.as_view(), name='candidate_detail'),
+    url(r'^(?P<username>[-\w]+)/(?P<election_slug>[-\w]+)/(?P<slug>[-\w]+)$', cache_election_page(CandidateDetailView.as_view()), name='candidate_detail'),
     #embeded
 
     # Candidate detail view
-    url(r'^(?P<username>[-\w]+)/(?P<election_slug>[-\w]+)/(?P<slug>[-\w]+)/embeded/?$', CandidateDetailView.as_view(template_name="elections/embeded/candidate_detail.html"), name='candidate_detail_embeded'),
+    url(r'^(?P<username>[-\w]+)/(?P<election_slug>[-\w]+)/(?P<slug>[-\w]+)/embeded/?$', cache_election_page(CandidateDetailView.as_view(template_name="elections/embeded/candidate_detail.html")), name='candidate_detail_embeded'),
 
 
 
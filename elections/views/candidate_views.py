@@ -12,6 +12,7 @@ from django.utils import simplejson as json, simplejson
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_POST, require_GET
 from django.views.decorators.http import require_http_methods
+from django.views.decorators.cache import cache_control
 from django.views.generic import CreateView, DetailView, UpdateView, ListView
 from django.utils.translation import ugettext_lazy as _
 
@@ -24,6 +25,7 @@ from elections.models import Election, Candidate, PersonalData, Link
 
 # Import exceptions
 from elections.exceptions import NoCandidateError
+from elections.page_cache import condition_on_election_version
 
 # Candidate views
 class CandidateDetailView(DetailView):
@@ -32,6 +34,8 @@ class CandidateDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context = super(CandidateDetailView, self).get_context_data(**kwargs)
         context['election'] = self.object.election
+        # The templates read the personal data and backgrounds many times
+        self.object.load_profile()
         return context
 
     def get_queryset(self):
@@ -151,7 +155,9 @@ def async_delete_candidate(request):
     return HttpResponse(json.dumps(json_dictionary),content_type='application/json')
 
 
-@require_POST
+@require_http_methods(["GET", "POST"])
+@cache_control(no_cache=True)
+@condition_on_election_version
 def get_candidate_list_as_json(request,username,election_slug):
     election = get_object_or_404(Election, owner__username=username, slug=election_slug)
     candidates = election.candidate_set.all()
@@ -13,7 +13,8 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_http_methods
 from django.views.generic import CreateView, DetailView, UpdateView, ListView, TemplateView, RedirectView
 from django.contrib.sites.models import Site
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET
+from django.views.decorators.cache import cache_control
 from django.db.models import Q
 
 
@@ -26,6 +27,10 @@ from elections.forms import ElectionForm, ElectionUpdateForm, PersonalDataForm,\
 from elections.forms.candidate_form import CandidateForm
 from elections.forms.election_form import AnswerForm, ElectionLogoUpdateForm
 from elections.models import Election, Candidate, Category
+from elections.compare_index import get_answers_two_candidates
+from elections.embed import get_embed_bundle
+from elections.home import get_home_elections, get_highlighted_elections
+from elections.thumbnails import enqueue_election_thumbnails
 
 from django.conf import settings
 
@@ -92,6 +97,12 @@ class ElectionUpdateView(UpdateView):
     def get_queryset(self):
         return super(ElectionUpdateView, self).get_queryset().filter(owner=self.request.user)
 
+    def form_valid(self, form):
+        response = super(ElectionUpdateView, self).form_valid(form)
+        if 'logo' in form.changed_data:
+            enqueue_election_thumbnails(self.object)
+        return response
+
     @method_decorator(login_required)
     def dispatch(self, request, *args, **kwargs):
         election = get_object_or_404(Election, slug=kwargs['slug'], owner=request.user)
@@ -141,7 +152,9 @@ class ElectionCreateView(CreateView):
         self.object.set_slug()
         self.object.full_clean()
 
-        return super(ElectionCreateView, self).form_valid(form)
+        response = super(ElectionCreateView, self).form_valid(form)
+        enqueue_election_thumbnails(self.object)
+        return response
 
 # Election views
 class CompareView(DetailView):
@@ -165,10 +178,12 @@ class CompareView(DetailView):
             first_candidate_slug = self.kwargs['first_candidate_slug']
 
             first_candidate = get_object_or_404(Candidate, election=election, slug=first_candidate_slug)
+            first_candidate.load_profile()
             context['first_candidate'] = first_candidate
             if('second_candidate_slug' in self.kwargs):
                 second_candidate_slug = self.kwargs['second_candidate_slug']
                 second_candidate = get_object_or_404(Candidate, election=election, slug=second_candidate_slug)
+                second_candidate.load_profile()
                 context['second_candidate'] = second_candidate
 
                 if first_candidate == second_candidate:
@@ -176,11 +191,10 @@ class CompareView(DetailView):
                 if 'category_slug' in self.kwargs:
                     category_slug = self.kwargs['category_slug']
                     selected_category = get_object_or_404(Category, election=election, slug=category_slug)
-                    first_candidate_answers = first_candidate.get_all_answers_by_category(selected_category)
-                    second_candidate_answers = second_candidate.get_all_answers_by_category(selected_category)
-                    answers = first_candidate.get_answers_two_candidates(second_candidate,selected_category)
+                    answers, agreement = get_answers_two_candidates(election, first_candidate, second_candidate, selected_category)
                     context['selected_category'] = selected_category
                     context['answers'] = answers
+                    context['agreement'] = agreement
                 else:
                     return context
 
@@ -199,7 +213,17 @@ class CompareView(DetailView):
         context['facebook_link'] = facebook_link
         return context
 
-@require_POST
+@require_GET
+@cache_control(public=True, max_age=settings.ELECTION_EMBED_BUNDLE_MAX_AGE)
+def election_embed_bundle(request, username, slug):
+    election = get_object_or_404(Election, owner__username=username, slug=slug, published=True)
+    response = HttpResponse(json.dumps(get_embed_bundle(election)), content_type='application/json')
+    # Embeds load it from the sites they are embedded in
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+@require_http_methods(["GET", "POST"])
+@cache_control(no_cache=True)
 def election_compare_asynchronous_call(request, username, slug, candidate_slug):
     election = get_object_or_404(Election, slug=slug, owner__username=username)
     candidate = get_object_or_404(Candidate, slug=candidate_slug, election=election)
@@ -284,9 +308,9 @@ class HomeTemplateView(TemplateView):
 
 
     def get_context_data(self,**kwargs):
-        last_five_elections = Election.objects.filter(published=True).order_by('-created_at')[:5]
-        kwargs['last_elections'] = last_five_elections
-        kwargs['highlighted_elections'] = Election.objects.filter(highlighted=True).filter(published=True).order_by('?')[:5]
+        home_elections = get_home_elections()
+        kwargs['last_elections'] = home_elections['last']
+        kwargs['highlighted_elections'] = get_highlighted_elections(home_elections)
 
         return kwargs
 
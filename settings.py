@@ -232,6 +232,71 @@ DEFAULT_QUESTIONS = [{
 USERVOICE_CLIENT_KEY = 'THIS IS JUST AN EXAMPLE YOU SHOLD CHANGE THIS'
 GOOGLE_ANALYTICS_ACCOUNT_ID = "GOOGLE ANALYTICS ACCOUNT ID"
 
+# Maximum number of compiled media naranja questionnaires kept by each worker
+QUESTIONNAIRE_CACHE_SIZE = 500
+
+# Maximum number of media naranja results kept by each worker for visitors
+# that send the same answers
+MEDIANARANJA_RESULT_CACHE_SIZE = 5000
+
+# Maximum number of answer -> candidates indexes kept by each worker
+ANSWER_INDEX_CACHE_SIZE = 500
+
+# Maximum number of candidate comparison indexes kept by each worker
+COMPARE_INDEX_CACHE_SIZE = 500
+
+# Maximum number of accepted API keys kept by each worker, and seconds they
+# are trusted without looking them up again. Changing a user or their key
+# only forgets it in the worker that made the change, the others accept a
+# revoked key for up to API_KEY_CACHE_TIMEOUT seconds
+API_KEY_CACHE_SIZE = 10000
+API_KEY_CACHE_TIMEOUT = 60 * 5
+
+# Seconds the pages of published elections rendered for anonymous visitors
+# are kept in the cache. Entries are keyed by the election version, so edits
+# show up right away; 0 disables the page cache
+ELECTION_PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Seconds the elections listed on the home page are cached. They are
+# recomputed on the next hit after any election is saved or deleted
+HOME_ELECTIONS_CACHE_TIMEOUT = 60 * 60
+
+# Seconds each worker trusts its copy of the version of the home page
+# elections before reading it from the database again: how long an
+# election changed through another worker can look unchanged on the home
+# page. 0 reads it on every hit
+HOME_ELECTIONS_VERSION_CACHE_TIMEOUT = 5
+
+# Seconds browsers and proxies may reuse the embed bundle of an election
+# before revalidating it
+ELECTION_EMBED_BUNDLE_MAX_AGE = 60 * 5
+
+# Rows read per query while streaming an election from the v2 export API
+ELECTION_STREAM_CHUNK_SIZE = 500
+
+# Maximum number of answer sets scored by one call to the media naranja batch API
+MEDIANARANJA_BATCH_MAX_SIZE = 10000
+
+# How media naranja visitors are stored: 'immediate' writes them inside the
+# request, 'buffered' queues them and writes them in batches from a
+# background thread of each worker
+MEDIANARANJA_TELEMETRY_MODE = 'immediate'
+MEDIANARANJA_TELEMETRY_MAX_PENDING = 10000
+MEDIANARANJA_TELEMETRY_BATCH_SIZE = 200
+MEDIANARANJA_TELEMETRY_FLUSH_INTERVAL = 1.0
+# 'rows' stores every visitor as Visitor, VisitorAnswer, VisitorScore and
+# CategoryScore rows, 'compact' as a single CompactVisitor row
+MEDIANARANJA_VISITOR_STORAGE = 'rows'
+
+# Thumbnails of candidate photos and election logos are generated when they
+# are uploaded. 'immediate' generates them inside the upload request, 'pool'
+# in WORKERS background threads of each worker, and then templates never
+# resize images: they show the original until its thumbnail is ready.
+# Backfill existing elections with the elections_thumbnails command
+THUMBNAIL_BACKEND = 'elections.thumbnails.PregeneratedThumbnailBackend'
+THUMBNAIL_PREGENERATION_MODE = 'pool'
+THUMBNAIL_PREGENERATION_WORKERS = 4
+
 
 #EMBEDED WEBPAGE FOR TESTING
 